@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Recherche dans les logs des jobs de la campagne LoRaWAN ADR.
+
+run_campaign.py écrit la sortie de chaque job dans
+resultsfinal/logs/<scénario>/<job>.log.gz et l'ajoute à l'index
+resultsfinal/logs/index.tsv (job, code de retour, durée, log). Ce script
+lit l'index (la dernière exécution de chaque job) et cherche dans les logs
+sélectionnés en parallèle, sur autant de processus que de coeurs.
+
+Usage:
+    python3 campaign_logs.py grep "Segmentation fault" --failed
+    python3 campaign_logs.py grep -i "pdr=0\\.00" --job "scen1_dev1000_.*_ADR-Lite"
+    python3 campaign_logs.py show scen1_dev100_mob0.0_traf72_sig0.00_No-ADR_run1
+    python3 campaign_logs.py list --failed
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import gzip
+import itertools
+import os
+import re
+import sys
+
+import run_campaign
+
+IndexEntry = collections.namedtuple("IndexEntry", "job returncode duration log")
+
+
+def load_index(workdir):
+    """Dernière entrée de l'index pour chaque job; sans index, les logs présents
+    sur le disque (code de retour et durée inconnus)"""
+    logs_dir = os.path.join(workdir, run_campaign.RESULTS_DIR, run_campaign.LOGS_DIR)
+    entries = {}
+    try:
+        with open(os.path.join(logs_dir, run_campaign.LOG_INDEX_NAME), encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 4:
+                    continue  # ligne tronquée par un arrêt brutal
+                job, returncode, duration, log = fields
+                entries[job] = IndexEntry(
+                    job,
+                    int(returncode) if returncode.lstrip("-").isdigit() else None,
+                    float(duration) if duration else None,
+                    log,
+                )
+    except FileNotFoundError:
+        for path in sorted(glob.glob(os.path.join(logs_dir, "*", "*.log.gz"))):
+            job = os.path.basename(path)[: -len(".log.gz")]
+            entries[job] = IndexEntry(job, None, None, os.path.relpath(path, workdir))
+    return entries
+
+
+def select(entries, job_pattern=None, failed=False):
+    """Entrées dont l'identifiant contient job_pattern (expression régulière), en erreur si failed"""
+    regex = re.compile(job_pattern) if job_pattern else None
+    return [
+        entry
+        for entry in entries.values()
+        if (regex is None or regex.search(entry.job))
+        and (not failed or entry.returncode not in (0, None))
+    ]
+
+
+def grep_log(path, pattern, flags, max_count):
+    """Lignes (numéro, texte) d'un log compressé qui correspondent à pattern"""
+    regex = re.compile(pattern, flags)
+    matches = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8", errors="replace") as f:
+            for number, line in enumerate(f, 1):
+                if regex.search(line):
+                    matches.append((number, line.rstrip("\n")))
+                    if max_count and len(matches) >= max_count:
+                        break
+    except (OSError, EOFError) as error:
+        matches.append((0, f"<log illisible: {error}>"))
+    return matches
+
+
+def grep_logs(entries, workdir, pattern, flags=0, max_count=0, max_workers=None):
+    """Cherche pattern dans les logs des entrées en parallèle; produit (entrée, correspondances)
+    dans l'ordre des entrées"""
+    paths = [os.path.join(workdir, entry.log) for entry in entries]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            grep_log,
+            paths,
+            itertools.repeat(pattern),
+            itertools.repeat(flags),
+            itertools.repeat(max_count),
+            chunksize=max(1, len(paths) // (4 * (max_workers or os.cpu_count() or 1))),
+        )
+        for entry, matches in zip(entries, results):
+            if matches:
+                yield entry, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logs des jobs de la campagne LoRaWAN ADR")
+    parser.add_argument(
+        "--workdir",
+        default=run_campaign.NS3_DIR,
+        help="dossier de travail de run_campaign.py, qui contient resultsfinal/",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    grep_parser = commands.add_parser("grep", help="chercher une expression dans les logs")
+    grep_parser.add_argument("pattern", help="expression régulière (syntaxe Python)")
+    grep_parser.add_argument("-i", "--ignore-case", action="store_true")
+    grep_parser.add_argument(
+        "-l", "--files-with-matches", action="store_true", help="n'afficher que les jobs"
+    )
+    grep_parser.add_argument(
+        "-m", "--max-count", type=int, default=0, help="correspondances au plus par log"
+    )
+    grep_parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="processus (défaut: coeurs)"
+    )
+
+    list_parser = commands.add_parser("list", help="lister les jobs de l'index")
+    show_parser = commands.add_parser("show", help="afficher le log d'un job")
+    show_parser.add_argument("job", help="identifiant du job")
+    for command in (grep_parser, list_parser):
+        command.add_argument("--job", help="expression régulière sur l'identifiant des jobs")
+        command.add_argument("--failed", action="store_true", help="seulement les jobs en erreur")
+    args = parser.parse_args()
+
+    entries = load_index(args.workdir)
+    if args.command == "show":
+        if args.job not in entries:
+            print(f"Job inconnu: {args.job}", file=sys.stderr)
+            return 1
+        with gzip.open(os.path.join(args.workdir, entries[args.job].log), "rb") as f:
+            sys.stdout.flush()
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sys.stdout.buffer.write(chunk)
+        return 0
+
+    selected = select(entries, args.job, args.failed)
+    if args.command == "list":
+        for entry in selected:
+            duration = "" if entry.duration is None else f"{entry.duration:.1f}s"
+            print(f"{entry.job}\t{entry.returncode}\t{duration}\t{entry.log}")
+        return 0
+
+    found = False
+    flags = re.IGNORECASE if args.ignore_case else 0
+    for entry, matches in grep_logs(
+        selected, args.workdir, args.pattern, flags, args.max_count, args.jobs
+    ):
+        found = True
+        if args.files_with_matches:
+            print(entry.job)
+            continue
+        for number, line in matches:
+            print(f"{entry.job}:{number}:{line}")
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
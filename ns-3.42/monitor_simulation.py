@@ -1,115 +1,371 @@
 #!/usr/bin/env python3
 """
 Script de monitoring pour suivre le progrès des simulations LoRaWAN
+
+Deux organisations des résultats sont suivies:
+  - results.csv (run_lorawan_simulations.sh): une ligne par simulation, lue à
+    partir du dernier octet déjà lu;
+  - resultsfinal/summaries/<scénario>/summary_scen*_run*.csv (run_campaign.py
+    et scripts scratch/run_s*.sh): un fichier par simulation; seuls les
+    dossiers modifiés depuis le passage précédent sont relus.
+
+Les totaux attendus viennent de campaign.ini (ou de --total). Le journal de
+run_campaign.py, lu lui aussi à partir du dernier octet, donne les jobs en
+cours, les échecs et la durée des simulations par configuration.
+
+Usage:
+    python3 monitor_simulation.py                  # suivi en continu
+    python3 monitor_simulation.py status           # état actuel
+    python3 monitor_simulation.py --results results.csv --total 408
 """
 
-import time
+import argparse
+import collections
+import json
 import os
-import pandas as pd
-from datetime import datetime
+import re
 import sys
+import time
+
+import run_campaign
+
+SUMMARY_NAME = re.compile(
+    r"summary_(?P<config>scen\d+_dev\d+_mob[\d.]+_traf\d+_sig[\d.]+)_(?P<alg>.+)_run\d+\.csv$"
+)
+# colonnes de résultats de results.csv; les autres décrivent la configuration
+CSV_METRICS = ("PDR", "EC")
+RATE_WINDOW = 3600.0  # secondes sur lesquelles le débit est mesuré
+
+
+def job_configuration(key):
+    """Configuration (point du scénario) d'un identifiant de job de run_campaign"""
+    return key.rsplit("_", 2)[0]
+
+
+class FileFollower:
+    """Lit les lignes complètes ajoutées à un fichier depuis l'appel précédent"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self._partial = b""
+
+    def read_lines(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self.inode or stat.st_size < self.offset:  # fichier recréé
+            self.inode, self.offset, self._partial = stat.st_ino, 0, b""
+        if stat.st_size == self.offset:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode("utf-8", "replace") for line in lines]
+
+
+class CampaignProgress:
+    """Agrégats tenus à jour au fil des résultats"""
+
+    def __init__(self, total=None, expected_by_alg=None, expected_by_config=None):
+        self.total = total
+        self.expected_by_alg = expected_by_alg or {}
+        self.expected_by_config = expected_by_config or {}
+        self.reset()
+
+    def reset(self):
+        """Oublie les résultats comptés (fichier de résultats recréé)"""
+        self.by_alg = collections.Counter()
+        self.by_config = collections.Counter()
+        self.completion_times = []  # fins de simulation récentes, pour le débit
+        self.first_completion = None
+        self.runtimes = collections.defaultdict(lambda: [0.0, 0])  # configuration -> [somme, n]
+        self.running = set()
+        self.failed = set()  # jobs dont la dernière exécution a échoué
+        self.latest = None
+
+    @property
+    def done(self):
+        return sum(self.by_alg.values())
+
+    def add_completion(self, alg, config, when=None):
+        self.by_alg[alg] += 1
+        self.by_config[config] += 1
+        if when is not None:
+            if self.first_completion is None or when < self.first_completion:
+                self.first_completion = when
+            if when >= time.time() - RATE_WINDOW:
+                self.completion_times.append(when)
+
+    def add_runtime(self, config, duration):
+        runtime = self.runtimes[config]
+        runtime[0] += duration
+        runtime[1] += 1
+
+    def rate(self, now):
+        """Simulations terminées par heure, sur la dernière heure"""
+        cutoff = now - RATE_WINDOW
+        self.completion_times = [t for t in self.completion_times if t >= cutoff]
+        if self.first_completion is None:
+            return 0.0
+        span = max(60.0, min(RATE_WINDOW, now - self.first_completion))
+        return len(self.completion_times) * 3600.0 / span
 
-def monitor_simulation_progress():
+    def report(self, top=5):
+        now = time.time()
+        done = self.done
+        rate = self.rate(now)
+        line = f"📈 Progress: {done}"
+        if self.total:
+            line += f"/{self.total} ({100.0 * done / self.total:.1f}%)"
+        line += f" | {rate:.1f} runs/h"
+        if self.total:
+            remaining = max(self.total - done, 0)
+            line += f" | ETA: {remaining / rate:.1f}h" if rate else " | ETA: ?"
+        if self.running:
+            line += f" | running: {len(self.running)}"
+        if self.failed:
+            line += f" | failed: {len(self.failed)}"
+        lines = [time.strftime("%H:%M:%S ") + line, "📊 Algorithm Progress:"]
+        for alg in sorted(set(self.by_alg) | set(self.expected_by_alg)):
+            count = self.by_alg[alg]
+            expected = self.expected_by_alg.get(alg)
+            if expected:
+                lines.append(f"   {alg:12}: {count}/{expected} ({100.0 * count / expected:.1f}%)")
+            else:
+                lines.append(f"   {alg:12}: {count}")
+        if self.expected_by_config:
+            completed = sum(
+                1
+                for config, expected in self.expected_by_config.items()
+                if self.by_config[config] >= expected
+            )
+            lines.append(f"   Configurations completed: {completed}/{len(self.expected_by_config)}")
+        else:
+            lines.append(f"   Configurations with results: {len(self.by_config)}")
+        if self.runtimes:
+            lines.append(f"⏱️  Mean runtime per configuration (slowest {top}):")
+            slowest = sorted(self.runtimes.items(), key=lambda item: -item[1][0] / item[1][1])
+            for config, (total, count) in slowest[:top]:
+                lines.append(f"   {config:40} {total / count:9.1f} s ({count} runs)")
+        if self.latest:
+            lines.append(f"🔍 Latest: {self.latest}")
+        return "\n".join(lines)
+
+
+class CsvSource:
+    """results.csv: une ligne par simulation, les durées sont estimées par
+    l'écart entre deux arrivées (simulations séquentielles, à --interval près)"""
+
+    def __init__(self, path, progress):
+        self.follower = FileFollower(path)
+        self.progress = progress
+        self.columns = None
+        self.last_arrival = (
+            None  # date de lecture de la dernière ligne, None avant le premier passage
+        )
+
+    def update(self):
+        now = time.time()
+        rows = []
+        for line in self.follower.read_lines():
+            if not line.strip():
+                continue
+            fields = line.strip().split(",")
+            if self.columns is None or fields == self.columns:
+                # en-tête: début du fichier, ou nouvelle campagne dans un fichier recréé
+                if self.columns is not None:
+                    self.progress.reset()
+                    rows = []
+                self.columns = fields
+                continue
+            rows.append(dict(zip(self.columns, fields)))
+        live = self.last_arrival is not None
+        if not live:
+            self.last_arrival = now
+        for row in rows:
+            config = ",".join(
+                f"{column}={value}"
+                for column, value in row.items()
+                if column not in CSV_METRICS and column != "algorithm"
+            )
+            self.progress.add_completion(row.get("algorithm", "?"), config, now if live else None)
+            if live and len(rows) == 1:
+                self.progress.add_runtime(config, now - self.last_arrival)
+        if rows:
+            self.last_arrival = now
+            latest = rows[-1]
+            self.progress.latest = (
+                f"{latest.get('algorithm', '?')} | {latest.get('nDevices', '?')}d | "
+                f"PDR: {latest.get('PDR', '?')}% | Energy: {latest.get('EC', '?')}J"
+            )
+        return bool(rows)
+
+
+class SummarySource:
+    """resultsfinal/summaries/*/summary_scen*_run*.csv et journal de run_campaign.py"""
+
+    def __init__(self, results_dir, progress):
+        self.summaries_dir = os.path.join(results_dir, "summaries")
+        self.journal = FileFollower(os.path.join(results_dir, run_campaign.JOURNAL_NAME))
+        self.progress = progress
+        self.seen = collections.defaultdict(set)  # dossier -> fichiers déjà comptés
+        self.scans = {}  # dossier -> (date de modification, date du dernier passage)
+
+    def update(self):
+        changed = self._read_journal()
+        try:
+            directories = [entry.path for entry in os.scandir(self.summaries_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return changed
+        newest = None
+        for directory in directories:
+            mtime = os.stat(directory).st_mtime_ns
+            previous = self.scans.get(directory)
+            # un dossier modifié peu avant le dernier passage est relu: des fichiers
+            # ajoutés dans la même résolution d'horloge ne changeraient pas sa date
+            if previous and previous[0] == mtime and mtime < previous[1] - 2 * 10**9:
+                continue
+            self.scans[directory] = (mtime, time.time_ns())
+            seen = self.seen[directory]
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name in seen:
+                        continue
+                    match = SUMMARY_NAME.match(entry.name)
+                    if not match:
+                        continue
+                    seen.add(entry.name)
+                    when = entry.stat().st_mtime
+                    self.progress.add_completion(match.group("alg"), match.group("config"), when)
+                    if newest is None or when > newest[0]:
+                        newest = (when, entry.path, match)
+                    changed = True
+        if newest is not None:
+            self._show_latest(newest[1], newest[2])
+        return changed
+
+    def _read_journal(self):
+        changed = False
+        for line in self.journal.read_lines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            key, event = record.get("job"), record.get("event")
+            if event == "started":
+                # comme run_campaign.py --status, seule la dernière exécution compte
+                self.progress.running.add(key)
+                self.progress.failed.discard(key)
+            elif event == "requeued":
+                self.progress.running.discard(key)
+            elif event == "finished":
+                self.progress.running.discard(key)
+                if record.get("returncode") == 0:
+                    self.progress.failed.discard(key)
+                    if "duration" in record:
+                        self.progress.add_runtime(job_configuration(key), record["duration"])
+                else:
+                    self.progress.failed.add(key)
+            changed = True
+        return changed
+
+    def _show_latest(self, path, match):
+        try:
+            with open(path, encoding="utf-8") as f:
+                row = dict(zip(f.readline().strip().split(","), f.readline().strip().split(",")))
+            self.progress.latest = (
+                f"{match.group('alg')} | {match.group('config')} | "
+                f"PDR: {float(row['PDR_Percent']):.1f}% | "
+                f"Energy: {float(row['AvgEnergy_mJ']):.3f} mJ"
+            )
+        except (OSError, KeyError, ValueError):
+            pass
+
+
+def expected_totals(config_path, scenarios=None):
+    """Totaux attendus d'après le fichier de campagne: (total, par algorithme, par configuration)"""
+    campaign = run_campaign.load_campaign(config_path)
+    jobs = run_campaign.expand_jobs(campaign, scenarios)
+    by_alg = collections.Counter(job.adr_algo for job in jobs)
+    by_config = collections.Counter(job_configuration(run_campaign.job_key(job)) for job in jobs)
+    return len(jobs), by_alg, by_config
+
+
+def make_source(args):
+    """Choisit l'organisation des résultats et les totaux attendus"""
+    results_dir = os.path.join(args.workdir, run_campaign.RESULTS_DIR)
+    layout = args.layout
+    if layout == "auto":
+        layout = "csv" if args.results or not os.path.isdir(results_dir) else "summaries"
+    if layout == "csv":
+        progress = CampaignProgress(total=args.total)
+        return CsvSource(args.results or "results.csv", progress), progress
+    total, by_alg, by_config = args.total, {}, {}
+    if os.path.exists(args.config):
+        total, by_alg, by_config = expected_totals(args.config, args.scenarios)
+        total = args.total or total
+    progress = CampaignProgress(total, by_alg, by_config)
+    return SummarySource(results_dir, progress), progress
+
+
+def monitor_simulation_progress(source, progress, interval):
     """Surveille le progrès de la simulation"""
     print("LoRaWAN Simulation Monitor")
     print("=" * 40)
-    
-    results_file = "results.csv"
-    
-    if not os.path.exists(results_file):
-        print("⚠️  Results file not found yet. Waiting for simulation to start...")
-    
-    last_count = 0
-    start_time = time.time()
-    
+    first = True
     while True:
         try:
-            if os.path.exists(results_file):
-                # Lire le nombre de lignes (sans compter l'en-tête)
-                with open(results_file, 'r') as f:
-                    lines = f.readlines()
-                    current_count = len(lines) - 1  # -1 pour l'en-tête
-                
-                if current_count > last_count:
-                    elapsed = time.time() - start_time
-                    progress = (current_count / 408) * 100  # 408 simulations au total
-                    
-                    # Estimer le temps restant
-                    if current_count > 0:
-                        time_per_sim = elapsed / current_count
-                        remaining_sims = 408 - current_count
-                        eta_seconds = remaining_sims * time_per_sim
-                        eta_hours = eta_seconds / 3600
-                    else:
-                        eta_hours = 0
-                    
-                    print(f"\r🔄 Progress: {current_count}/408 ({progress:.1f}%) | "
-                          f"Elapsed: {elapsed/3600:.1f}h | ETA: {eta_hours:.1f}h", end="")
-                    
-                    last_count = current_count
-                    
-                    # Afficher les derniers résultats si disponibles
-                    if current_count >= 5:
-                        try:
-                            df = pd.read_csv(results_file)
-                            latest = df.tail(1).iloc[0]
-                            print(f"\n📊 Latest: {latest['algorithm']} | "
-                                  f"PDR: {latest['PDR']:.1f}% | "
-                                  f"Energy: {latest['EC']:.3f}J")
-                        except:
-                            pass
-                
-                if current_count >= 408:
-                    print("\n🎉 Simulation completed!")
-                    break
-            
-            time.sleep(30)  # Vérifier toutes les 30 secondes
-            
+            if source.update() or first:
+                print(progress.report(), flush=True)
+                print()
+                first = False
+            if progress.total and progress.done >= progress.total:
+                print("🎉 Simulation completed!")
+                break
+            time.sleep(interval)
         except KeyboardInterrupt:
-            print("\n\n⏹️  Monitoring stopped by user")
+            print("\n⏹️  Monitoring stopped by user")
             break
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            time.sleep(10)
-
-def show_current_status():
-    """Affiche le statut actuel"""
-    results_file = "results.csv"
-    
-    if not os.path.exists(results_file):
-        print("❌ No results file found. Simulation may not have started yet.")
-        return
-    
-    try:
-        df = pd.read_csv(results_file)
-        total_sims = len(df)
-        
-        print(f"📈 Current Status:")
-        print(f"   Total simulations completed: {total_sims}/408")
-        print(f"   Progress: {(total_sims/408)*100:.1f}%")
-        
-        if total_sims > 0:
-            print(f"\n🔍 Recent Results:")
-            recent = df.tail(5)
-            for _, row in recent.iterrows():
-                print(f"   {row['algorithm']:12} | {row['nDevices']:4}d | "
-                      f"PDR: {row['PDR']:5.1f}% | Energy: {row['EC']:.3f}J")
-            
-            print(f"\n📊 Algorithm Progress:")
-            algo_counts = df['algorithm'].value_counts()
-            expected_per_algo = 408 // 6  # 6 algorithmes
-            for algo, count in algo_counts.items():
-                progress = (count / expected_per_algo) * 100
-                print(f"   {algo:12}: {count:3}/{expected_per_algo} ({progress:.1f}%)")
-    
-    except Exception as e:
-        print(f"❌ Error reading results: {e}")
+
 
 def main():
-    if len(sys.argv) > 1 and sys.argv[1] == "status":
-        show_current_status()
+    parser = argparse.ArgumentParser(description="Suivi des simulations LoRaWAN")
+    parser.add_argument("command", nargs="?", choices=("monitor", "status"), default="monitor")
+    parser.add_argument(
+        "--layout",
+        choices=("auto", "csv", "summaries"),
+        default="auto",
+        help="results.csv ou resultsfinal/summaries (défaut: selon --results et le dossier)",
+    )
+    parser.add_argument("--results", help="fichier results.csv à suivre")
+    parser.add_argument(
+        "--workdir", default=".", help="dossier contenant resultsfinal/ (défaut: courant)"
+    )
+    parser.add_argument(
+        "--config",
+        default=os.path.join(run_campaign.NS3_DIR, "campaign.ini"),
+        help="fichier de campagne, pour les totaux attendus",
+    )
+    parser.add_argument("--scenarios", type=int, nargs="+", help="scénarios suivis (défaut: tous)")
+    parser.add_argument("--total", type=int, help="nombre total de simulations attendues")
+    parser.add_argument(
+        "--interval", type=float, default=30, help="secondes entre deux lectures (défaut: 30)"
+    )
+    args = parser.parse_args()
+
+    source, progress = make_source(args)
+    if args.command == "status":
+        source.update()
+        print(progress.report())
     else:
-        monitor_simulation_progress()
+        monitor_simulation_progress(source, progress, args.interval)
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
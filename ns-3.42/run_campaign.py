@@ -0,0 +1,1081 @@
+#!/usr/bin/env python3
+"""
+Orchestrateur de la campagne de simulations LoRaWAN ADR.
+
+Remplace les scripts générés scratch/run_s*.sh : les axes des scénarios sont
+lus dans campaign.ini, développés en jobs (un par point, run et algorithme
+ADR), et le binaire compilé de lorawan-adr-simulationfinal est lancé
+directement, sans passer par ./ns3 run, sur autant de processus que de
+coeurs. Les résultats sont écrits dans resultsfinal/ comme avec les scripts,
+puis agrégés par run.
+
+Usage:
+    ./ns3 build scratch/lorawan-adr-simulationfinal
+    python3 run_campaign.py                  # tous les scénarios
+    python3 run_campaign.py --scenarios 1 3 --jobs 8
+    python3 run_campaign.py --dry-run        # affiche les commandes
+    python3 run_campaign.py --status         # jobs terminés, en erreur, manquants
+    python3 run_campaign.py --resume         # relance les jobs manquants ou en erreur
+    python3 run_campaign.py --adaptive       # runs arrêtés à la convergence ([ADAPTIVE])
+
+    # campagne répartie: un coordinateur, puis un worker par machine, tous
+    # dans la même arborescence partagée (NFS) passée par --workdir
+    python3 run_campaign.py --serve 0.0.0.0:8765 --resume
+    python3 run_campaign.py --worker http://coordinateur:8765 --job-timeout 7200
+
+Chaque job est noté dans un journal (resultsfinal/campaign_journal.jsonl, une
+ligne JSON par événement, écrite avec fsync) : début, puis fin avec le code de
+retour, la durée et les fichiers produits. Un job est terminé quand son
+summary_scen*_run*.csv existe et est valide, et que sa dernière exécution
+notée n'a pas échoué; --resume ne relance que les autres, par exemple après le
+redémarrage d'une machine au milieu d'une campagne.
+"""
+
+import argparse
+import ast
+import collections
+import concurrent.futures
+import configparser
+import functools
+import glob
+import gzip
+import http.server
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+NS3_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = "resultsfinal"  # écrit par le binaire, relatif au dossier de travail
+AXES = ("DENSITIES", "MOBILITIES", "TRAFFIC_INTERVALS", "SIGMAS")
+JOURNAL_NAME = "campaign_journal.jsonl"
+LOGS_DIR = "logs"  # sortie de chaque job, compressée, dans resultsfinal/
+LOG_INDEX_NAME = "index.tsv"  # dans resultsfinal/logs: job, code de retour, durée, log
+ADAPTIVE_REPORT_NAME = "adaptive_runs.csv"
+WORKER_POLL_INTERVAL = 5  # secondes entre deux demandes d'un worker sans job
+SUMMARY_HEADER = (
+    "NumDevices,MobilitySpeed,TrafficInterval,Sigma,RunNumber,"
+    "TotalPackets,SuccessfulPackets,PDR_Percent,AvgEnergy_mJ"
+)
+
+Job = collections.namedtuple(
+    "Job",
+    "scenario scenario_name density mobility traffic sigma run adr_algo max_messages simulation_time",
+)
+
+
+def load_campaign(path):
+    """Lit le fichier de campagne (format de config.ini, valeurs en syntaxe Python)"""
+    parser = configparser.ConfigParser(inline_comment_prefixes=("#",), interpolation=None)
+    parser.optionxform = str  # garder les noms en majuscules
+    if not parser.read(path, encoding="utf-8"):
+        raise FileNotFoundError(f"Fichier de campagne introuvable: {path}")
+
+    def values(section):
+        return {key: ast.literal_eval(value) for key, value in parser.items(section)}
+
+    campaign = values("CAMPAIGN")
+    if parser.has_section("ADAPTIVE"):
+        campaign["ADAPTIVE"] = values("ADAPTIVE")
+    campaign["SCENARIOS"] = {}
+    for section in parser.sections():
+        match = re.fullmatch(r"SCENARIO_(\d+)", section)
+        if not match:
+            continue
+        scenario = int(match.group(1))
+        settings = values(section)
+        # ordre des axes = ordre des boucles des scripts; suffixe _S<n> facultatif
+        axes = []
+        for key, axis_values in settings.items():
+            axis = re.sub(r"_S\d+$", "", key)
+            if axis in AXES:
+                axes.append((axis, list(axis_values)))
+        missing = set(AXES) - {axis for axis, _ in axes}
+        if missing:
+            raise ValueError(f"[{section}]: axes manquants: {', '.join(sorted(missing))}")
+        campaign["SCENARIOS"][scenario] = {
+            "NAME": settings.get("NAME", f"scenario{scenario}"),
+            "AXES": axes,
+        }
+    return campaign
+
+
+def simulation_time(max_messages, traffic, margin):
+    """Durée simulée, arrondie comme le faisaient les scripts (awk printf "%.0f")"""
+    return int("%.0f" % (max_messages * traffic + margin))
+
+
+def expand_jobs(campaign, scenarios=None):
+    """Développe la campagne en jobs, dans l'ordre d'exécution des scripts"""
+    jobs = []
+    for scenario, settings in sorted(campaign["SCENARIOS"].items()):
+        if scenarios and scenario not in scenarios:
+            continue
+        names = [axis for axis, _ in settings["AXES"]]
+        for point in itertools.product(*(values for _, values in settings["AXES"])):
+            point = dict(zip(names, point))
+            for run in range(1, campaign["NUM_RUNS"] + 1):
+                for adr_algo in campaign["ADR_ALGOS"]:
+                    jobs.append(
+                        Job(
+                            scenario=scenario,
+                            scenario_name=settings["NAME"],
+                            density=point["DENSITIES"],
+                            mobility=point["MOBILITIES"],
+                            traffic=point["TRAFFIC_INTERVALS"],
+                            sigma=point["SIGMAS"],
+                            run=run,
+                            adr_algo=adr_algo,
+                            max_messages=campaign["MAX_MESSAGES"],
+                            simulation_time=simulation_time(
+                                campaign["MAX_MESSAGES"],
+                                point["TRAFFIC_INTERVALS"],
+                                campaign["SIMULATION_TIME_MARGIN"],
+                            ),
+                        )
+                    )
+    return jobs
+
+
+def job_arguments(job):
+    """Arguments de ligne de commande du simulateur pour un job"""
+    return [
+        f"--scenario={job.scenario}",
+        f"--numDevices={job.density}",
+        f"--mobilitySpeed={job.mobility}",
+        f"--trafficInterval={job.traffic}",
+        f"--sigma={job.sigma}",
+        f"--adrAlgo={job.adr_algo}",
+        f"--maxMessages={job.max_messages}",
+        f"--runNumber={job.run}",
+        f"--simulationTime={job.simulation_time}",
+    ]
+
+
+def describe_job(job):
+    return (
+        f"S{job.scenario} Density={job.density}, Mobility={job.mobility} km/h, "
+        f"Traffic={job.traffic} s, Sigma={job.sigma}, ADR={job.adr_algo}, Run={job.run}"
+    )
+
+
+def job_key(job):
+    """Identifiant d'un job, formaté comme les noms de fichiers du simulateur
+    (mobilité avec 1 décimale, intervalle tronqué à l'entier, sigma avec 2 décimales)"""
+    return (
+        f"scen{job.scenario}_dev{job.density}_mob{float(job.mobility):.1f}"
+        f"_traf{int(job.traffic)}_sig{float(job.sigma):.2f}_{job.adr_algo}_run{job.run}"
+    )
+
+
+def output_paths(job):
+    """Fichiers écrits par le simulateur pour un job (résumé, détail), relatifs au dossier de travail"""
+    key = job_key(job)
+    return (
+        os.path.join(RESULTS_DIR, "summaries", job.scenario_name, f"summary_{key}.csv"),
+        os.path.join(RESULTS_DIR, f"sim_{key}.csv"),
+    )
+
+
+def read_summary(path, job):
+    """Valeurs du résumé d'un job, par colonne, ou None s'il est absent ou invalide
+    (en-tête inattendu, ligne incomplète ou non numérique, autre job)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if len(lines) != 2 or lines[0] != SUMMARY_HEADER:
+        return None
+    fields = lines[1].split(",")
+    columns = SUMMARY_HEADER.split(",")
+    if len(fields) != len(columns):
+        return None
+    try:
+        values = dict(zip(columns, (float(field) for field in fields)))
+    except ValueError:
+        return None
+    if values["NumDevices"] != job.density or values["RunNumber"] != job.run:
+        return None
+    return values
+
+
+def log_path(job):
+    """Log compressé d'un job, relatif au dossier de travail"""
+    return os.path.join(RESULTS_DIR, LOGS_DIR, job.scenario_name, f"{job_key(job)}.log.gz")
+
+
+def summary_is_valid(path, job):
+    """Vrai si le résumé a l'en-tête attendu et une ligne numérique complète pour ce job"""
+    return read_summary(path, job) is not None
+
+
+class Journal:
+    """Journal de campagne en ajout seul: une ligne JSON par événement, avec fsync.
+
+    Après un arrêt brutal, seule la dernière ligne peut être incomplète; elle
+    est ignorée à la lecture. Les fins de job sont aussi ajoutées à l'index des
+    logs (resultsfinal/logs/index.tsv), plus compact, lu par campaign_logs.py."""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.join(os.path.dirname(path), LOGS_DIR, LOG_INDEX_NAME)
+        self._file = None
+        self._index = None
+        self._lock = threading.Lock()
+        self._host = socket.gethostname()
+
+    def load(self):
+        """Renvoie le dernier événement de chaque job, par identifiant"""
+        records = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # ligne tronquée par un arrêt brutal
+                    records[record["job"]] = record
+        except FileNotFoundError:
+            pass
+        return records
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a+b")
+        # terminer une ligne tronquée, pour que l'événement suivant reste lisible
+        if self._file.tell() > 0:
+            self._file.seek(-1, os.SEEK_END)
+            if self._file.read(1) != b"\n":
+                self._file.write(b"\n")
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        return self
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, event, job, **fields):
+        """Ajoute un événement ("started", "finished", "requeued") et le force sur le disque"""
+        record = dict(event=event, job=job_key(job), time=time.time(), host=self._host)
+        record.update(fields)
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if event == "finished" and "log" in fields:
+                # l'index se reconstruit à partir du journal: pas de fsync
+                self._index.write(
+                    f"{record['job']}\t{fields.get('returncode')}\t"
+                    f"{fields.get('duration', '')}\t{fields['log']}\n"
+                )
+                self._index.flush()
+
+
+def job_states(jobs, workdir, records):
+    """État de chaque job: "done", "failed" (dernière exécution en erreur),
+    "interrupted" (commencé, jamais fini) ou "missing"; renvoie une liste alignée sur jobs.
+
+    Un résumé dont la taille et la date correspondent à celles notées à la fin
+    du job n'est pas relu; les autres sont validés par leur contenu."""
+    listings = {}
+    states = []
+    for job in jobs:
+        summary = os.path.join(workdir, output_paths(job)[0])
+        directory, name = os.path.split(summary)
+        if directory not in listings:
+            try:
+                with os.scandir(directory) as entries:
+                    listings[directory] = {entry.name: entry for entry in entries}
+            except FileNotFoundError:
+                listings[directory] = {}
+        entry = listings[directory].get(name)
+        record = records.get(job_key(job), {})
+        finished = record.get("event") == "finished"
+        if finished and record.get("returncode") != 0:
+            states.append("failed")
+            continue
+        if entry is not None:
+            stat = entry.stat()
+            if (
+                finished
+                and record.get("summary_size") == stat.st_size
+                and record.get("summary_mtime_ns") == stat.st_mtime_ns
+            ) or summary_is_valid(summary, job):
+                states.append("done")
+                continue
+        states.append("interrupted" if record.get("event") == "started" else "missing")
+    return states
+
+
+def find_binary(simulation_name):
+    """Trouve l'exécutable compilé par ./ns3 build (build/scratch/ns3.*-<nom>-<profil>)"""
+    candidates = [
+        path
+        for path in glob.glob(
+            os.path.join(NS3_DIR, "build", "scratch", f"ns3*-{simulation_name}-*")
+        )
+        if os.path.isfile(path) and os.access(path, os.X_OK)
+    ]
+    if not candidates:
+        raise FileNotFoundError(
+            f"Binaire de {simulation_name} introuvable dans build/scratch; "
+            f"compiler d'abord avec: ./ns3 build scratch/{simulation_name}"
+        )
+    return max(candidates, key=os.path.getmtime)
+
+
+def simulation_environment():
+    """Environnement du simulateur: bibliothèques ns-3 comme avec ./ns3 run"""
+    env = dict(os.environ)
+    lib_dir = os.path.join(NS3_DIR, "build", "lib")
+    env["LD_LIBRARY_PATH"] = os.pathsep.join(filter(None, [lib_dir, env.get("LD_LIBRARY_PATH")]))
+    return env
+
+
+def run_job(binary, job, workdir, env, journal, timeout=None):
+    """Lance un job en le notant dans le journal; renvoie (code de retour, fin de la sortie).
+
+    La sortie (stdout et stderr) est écrite dans le log du job, compressé à la
+    fin. Un simulateur qui dépasse timeout secondes est tué (code -9, timeout noté)."""
+    journal.record("started", job, pid=os.getpid())
+    log = os.path.join(workdir, log_path(job))
+    raw_log = log[: -len(".gz")]
+    os.makedirs(os.path.dirname(log), exist_ok=True)
+    start = time.monotonic()
+    extra = {}
+    with open(raw_log, "wb") as out:
+        try:
+            returncode = subprocess.run(
+                [binary] + job_arguments(job),
+                cwd=workdir,
+                env=env,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+                timeout=timeout,
+            ).returncode
+        except subprocess.TimeoutExpired:
+            returncode = -signal.SIGKILL
+            out.write(f"Timeout after {timeout} s\n".encode("utf-8"))
+            extra["timeout"] = True
+    duration = time.monotonic() - start
+    output = compress_log(raw_log, log)
+    outputs = output_paths(job)
+    try:
+        stat = os.stat(os.path.join(workdir, outputs[0]))
+        summary_stat = dict(summary_size=stat.st_size, summary_mtime_ns=stat.st_mtime_ns)
+    except FileNotFoundError:
+        summary_stat = {}
+    journal.record(
+        "finished",
+        job,
+        returncode=returncode,
+        duration=round(duration, 3),
+        outputs=list(outputs),
+        log=log_path(job),
+        **summary_stat,
+        **extra,
+    )
+    return returncode, output
+
+
+def compress_log(raw_log, log, tail_bytes=4096):
+    """Compresse le log brut d'un job en log (remplacé atomiquement); renvoie sa fin"""
+    with open(raw_log, "rb") as src:
+        src.seek(max(os.fstat(src.fileno()).st_size - tail_bytes, 0))
+        tail = src.read().decode("utf-8", "replace")
+        src.seek(0)
+        with gzip.open(log + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    os.replace(log + ".tmp", log)
+    os.remove(raw_log)
+    return tail
+
+
+def aggregate_by_run(workdir, scenario, scenario_name, num_runs):
+    """Fusionne les résumés d'un scénario par run (summary_<nom>_run<N>.csv),
+    avec les colonnes alg et scenario, comme aggregate_by_run des scripts"""
+    scenario_dir = os.path.join(workdir, RESULTS_DIR, "summaries", scenario_name)
+    created = 0
+    for run in range(1, num_runs + 1):
+        files = sorted(
+            glob.glob(os.path.join(scenario_dir, f"summary_scen{scenario}_*_run{run}.csv"))
+        )
+        if not files:
+            continue
+        with open(files[0], encoding="utf-8") as f:
+            header = f.readline().rstrip("\n")
+        if not header:
+            continue
+        out_file = os.path.join(scenario_dir, f"summary_{scenario_name}_run{run}.csv")
+        with open(out_file, "w", encoding="utf-8") as out:
+            out.write(f"{header},alg,scenario\n")
+            for path in files:
+                match = re.match(
+                    r".*_(No-ADR|ADR-MAX|ADR-AVG|ADR-Lite)_run\d+\.csv$", os.path.basename(path)
+                )
+                alg = match.group(1) if match else os.path.basename(path)[: -len(".csv")]
+                with open(path, encoding="utf-8") as f:
+                    next(f, None)
+                    for line in f:
+                        out.write(f"{line.rstrip(chr(10))},{alg},{scenario_name}\n")
+        created += 1
+    return created
+
+
+def run_campaign(campaign, rounds, binary, workdir, max_workers, job_timeout=None):
+    """Exécute en parallèle les listes de jobs de rounds, l'une après l'autre
+    (une seule liste, ou les tours de adaptive_rounds); renvoie le nombre d'échecs"""
+    os.makedirs(os.path.join(workdir, RESULTS_DIR), exist_ok=True)
+    journal = Journal(os.path.join(workdir, RESULTS_DIR, JOURNAL_NAME))
+    env = simulation_environment()
+    failures = 0
+    start = time.time()
+
+    # Les processus du pool sont les simulateurs; les threads ne font qu'attendre.
+    # Les jobs sont soumis au fur et à mesure, pour ne pas créer un Future par job.
+    all_jobs = []
+    done = 0
+    with journal, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for jobs in rounds:
+            all_jobs.extend(jobs)
+            pending_jobs = iter(jobs)
+            running = {}
+            while True:
+                for job in itertools.islice(pending_jobs, 2 * max_workers - len(running)):
+                    running[
+                        executor.submit(run_job, binary, job, workdir, env, journal, job_timeout)
+                    ] = job
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    job = running.pop(future)
+                    returncode, output = future.result()
+                    done += 1
+                    print_progress(done, len(all_jobs), start, job, returncode)
+                    if returncode != 0:
+                        failures += 1
+                        print(output, file=sys.stderr)
+
+    aggregate_campaign(campaign, all_jobs, workdir)
+    return failures
+
+
+def print_progress(done, total, start, job, returncode):
+    elapsed = time.time() - start
+    eta = elapsed / done * (total - done)
+    status = "OK" if returncode == 0 else f"ERREUR (code {returncode})"
+    print(
+        f"[{done}/{total} {100.0 * done / total:.2f}% | ETA {eta / 3600:.1f}h] "
+        f"{describe_job(job)}: {status}",
+        flush=True,
+    )
+
+
+def aggregate_campaign(campaign, jobs, workdir):
+    for scenario in sorted({job.scenario for job in jobs}):
+        name = campaign["SCENARIOS"][scenario]["NAME"]
+        created = aggregate_by_run(workdir, scenario, name, campaign["NUM_RUNS"])
+        print(f"Scénario {scenario} ({name}): {created} fichiers agrégés par run")
+
+
+def student_t_central(t, df):
+    """P(|T| < t) pour la loi de Student à df (entier) degrés de liberté,
+    formules exactes d'Abramowitz et Stegun 26.7.3 et 26.7.4"""
+    theta = math.atan(t / math.sqrt(df))
+    cos2 = math.cos(theta) ** 2
+    term = total = 1.0
+    if df % 2:
+        for j in range(1, (df - 1) // 2):
+            term *= 2 * j / (2 * j + 1) * cos2
+            total += term
+        series = math.sin(theta) * math.cos(theta) * total if df > 1 else 0.0
+        return 2 / math.pi * (theta + series)
+    for j in range(1, df // 2):
+        term *= (2 * j - 1) / (2 * j) * cos2
+        total += term
+    return math.sin(theta) * total
+
+
+@functools.lru_cache(maxsize=None)
+def student_t_quantile(p, df):
+    """Quantile p > 0.5 de la loi de Student à df degrés de liberté, par dichotomie"""
+    target = 2 * p - 1
+    low, high = 0.0, 1.0
+    while student_t_central(high, df) < target:
+        low, high = high, 2 * high
+    for _ in range(100):
+        middle = (low + high) / 2
+        if student_t_central(middle, df) < target:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def confidence_interval(values, level):
+    """(moyenne, demi-largeur de l'intervalle de confiance de Student); il faut au moins 2 valeurs"""
+    mean = statistics.fmean(values)
+    half_width = (
+        student_t_quantile(0.5 + level / 2, len(values) - 1)
+        * statistics.stdev(values, mean)
+        / math.sqrt(len(values))
+    )
+    return mean, half_width
+
+
+def target_half_width(target, mean):
+    """Demi-largeur visée: absolue, ou relative à la moyenne si target est une chaîne 'x%'"""
+    if isinstance(target, str) and target.endswith("%"):
+        return float(target[:-1]) / 100.0 * abs(mean)
+    return float(target)
+
+
+def adaptive_rounds(campaign, jobs, workdir):
+    """Tours de jobs du mode --adaptive, à exécuter l'un après l'autre.
+
+    Chaque configuration (point et algorithme ADR) commence par les runs
+    1..MIN_RUNS; après chaque tour, l'intervalle de confiance des métriques de
+    CI_HALF_WIDTH est calculé sur les résumés, et les configurations dont une
+    demi-largeur dépasse sa cible reçoivent les runs suivants. Leur nombre est
+    estimé en n * (demi-largeur / cible)^2, sans plus que doubler les runs
+    d'un tour à l'autre ni dépasser NUM_RUNS. Les runs sont numérotés comme en
+    mode fixe, donc avec les mêmes graines, et les jobs déjà terminés ne sont
+    pas relancés. Le nombre de runs de chaque configuration est écrit dans
+    resultsfinal/adaptive_runs.csv à la fin."""
+    settings = campaign["ADAPTIVE"]
+    num_runs = campaign["NUM_RUNS"]
+    level = settings.get("CI_LEVEL", 0.95)
+    targets = settings["CI_HALF_WIDTH"]
+    journal = Journal(os.path.join(workdir, RESULTS_DIR, JOURNAL_NAME))
+
+    groups = {}  # configuration (job de run 0) -> {run: job}
+    for job in jobs:
+        groups.setdefault(job._replace(run=0), {})[job.run] = job
+    planned = dict.fromkeys(groups, min(settings["MIN_RUNS"], num_runs))
+    values = {group: {} for group in groups}  # configuration -> {run: résumé}
+    results = {}
+    batch = [runs[run] for group, runs in groups.items() for run in range(1, planned[group] + 1)]
+    while batch:
+        states = job_states(batch, workdir, journal.load())
+        todo = [job for job, state in zip(batch, states) if state != "done"]
+        print(
+            f"Tour adaptatif: {len(todo)} simulations à lancer, {len(batch) - len(todo)} déjà faites"
+        )
+        if todo:
+            yield todo
+
+        # seuls les runs terminés comptent: le résumé d'un run en échec ou
+        # interrompu peut être celui d'une exécution précédente, ou partiel
+        pending = [
+            (group, run)
+            for group in groups
+            for run in range(1, planned[group] + 1)
+            if run not in values[group]
+        ]
+        states = job_states([groups[group][run] for group, run in pending], workdir, journal.load())
+        for (group, run), state in zip(pending, states):
+            if state == "done":
+                job = groups[group][run]
+                summary = read_summary(os.path.join(workdir, output_paths(job)[0]), job)
+                if summary is not None:
+                    values[group][run] = summary
+
+        batch = []
+        for group, runs in groups.items():
+            samples = list(values[group].values())
+            needed = 2 * planned[group]
+            converged = False
+            stats = dict.fromkeys(targets, (math.nan, math.inf))
+            if len(samples) >= 2:
+                needed = planned[group]
+                converged = True
+                for metric, target in targets.items():
+                    mean, half_width = confidence_interval([v[metric] for v in samples], level)
+                    stats[metric] = (mean, half_width)
+                    goal = target_half_width(target, mean)
+                    if half_width > goal:
+                        converged = False
+                        needed = max(
+                            needed,
+                            (
+                                math.ceil(len(samples) * (half_width / goal) ** 2)
+                                if goal > 0
+                                else 2 * planned[group]
+                            ),
+                        )
+            results[group] = (len(samples), converged, stats)
+            if not converged and planned[group] < num_runs:
+                new = min(num_runs, 2 * planned[group], max(needed, planned[group] + 1))
+                batch.extend(runs[run] for run in range(planned[group] + 1, new + 1))
+                planned[group] = new
+
+    write_adaptive_report(campaign, results, targets, workdir)
+
+
+def write_adaptive_report(campaign, results, metrics, workdir):
+    """Écrit le nombre de runs et l'intervalle de confiance obtenus par configuration,
+    et affiche leur répartition par scénario"""
+    path = os.path.join(workdir, RESULTS_DIR, ADAPTIVE_REPORT_NAME)
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(
+            "Scenario,NumDevices,MobilitySpeed,TrafficInterval,Sigma,alg,Runs,Converged,"
+            + ",".join(f"{metric}_Mean,{metric}_HalfWidth" for metric in metrics)
+            + "\n"
+        )
+        for group, (runs, converged, stats) in results.items():
+            out.write(
+                f"{group.scenario},{group.density},{group.mobility},{group.traffic},"
+                f"{group.sigma},{group.adr_algo},{runs},{int(converged)},"
+                + ",".join(f"{stats[metric][0]:.6f},{stats[metric][1]:.6f}" for metric in metrics)
+                + "\n"
+            )
+    for scenario in sorted({group.scenario for group in results}):
+        runs = [n for group, (n, _, _) in results.items() if group.scenario == scenario]
+        unconverged = sum(
+            1
+            for group, (_, converged, _) in results.items()
+            if group.scenario == scenario and not converged
+        )
+        print(
+            f"Scénario {scenario} ({campaign['SCENARIOS'][scenario]['NAME']}): "
+            f"{min(runs)} à {max(runs)} runs par configuration (médiane {statistics.median(runs):g}), "
+            f"{sum(runs)} simulations au lieu de {len(runs) * campaign['NUM_RUNS']}, "
+            f"{unconverged} configuration(s) sans convergence"
+        )
+    print(f"Runs par configuration: {path}")
+
+
+class Coordinator:
+    """File de jobs partagée entre plusieurs machines (mode --serve).
+
+    Chaque job distribué est loué à un worker jusqu'à une échéance, prolongée
+    par ses heartbeats; un job dont la location expire (machine arrêtée,
+    worker tué) ou dont le simulateur a dépassé le timeout est remis en tête
+    de file, au plus max_attempts fois. Le coordinateur est le seul à écrire
+    le journal, les workers écrivent les résultats dans l'arborescence commune.
+
+    Les jobs sont ajoutés par tours (add); all_done est levé à la fin de chaque
+    tour, et les workers ne s'arrêtent qu'après close()."""
+
+    def __init__(self, journal, lease_timeout, max_attempts, on_finish=None):
+        self.jobs = {}
+        self.pending = collections.deque()
+        self.leases = {}  # identifiant -> (worker, échéance)
+        self.attempts = collections.Counter()
+        self.finished = set()
+        self.journal = journal
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.on_finish = on_finish
+        self.all_done = threading.Event()
+        self.all_done.set()
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def add(self, jobs):
+        """Met en file un nouveau tour de jobs"""
+        with self._lock:
+            for job in jobs:
+                key = job_key(job)
+                if key not in self.jobs:
+                    self.jobs[key] = job
+                    self.pending.append(key)
+            if len(self.finished) < len(self.jobs):
+                self.all_done.clear()
+
+    def close(self):
+        """Plus aucun tour: les workers sans job peuvent s'arrêter"""
+        with self._lock:
+            self.closed = True
+
+    def claim(self, worker, host):
+        """Attribue le prochain job à un worker; renvoie (job ou None, campagne finie)"""
+        with self._lock:
+            self._requeue_expired()
+            if not self.pending:
+                return None, self.closed and not self.leases
+            key = self.pending.popleft()
+            self.attempts[key] += 1
+            self.leases[key] = (worker, time.monotonic() + self.lease_timeout)
+            job = self.jobs[key]
+            self.journal.record(
+                "started", job, host=host, worker=worker, attempt=self.attempts[key]
+            )
+            return job, False
+
+    def heartbeat(self, worker, keys):
+        """Prolonge les locations des jobs en cours d'un worker"""
+        with self._lock:
+            deadline = time.monotonic() + self.lease_timeout
+            for key in keys:
+                if self.leases.get(key, (None,))[0] == worker:
+                    self.leases[key] = (worker, deadline)
+
+    def finish(self, worker, host, key, fields):
+        """Enregistre la fin d'un job; un job déjà terminé ailleurs est ignoré"""
+        with self._lock:
+            if key not in self.jobs or key in self.finished:
+                return
+            job = self.jobs[key]
+            self.leases.pop(key, None)
+            self.journal.record("finished", job, host=host, worker=worker, **fields)
+            if fields.get("timeout") and self.attempts[key] < self.max_attempts:
+                if key not in self.pending:
+                    self.pending.appendleft(key)
+                return
+            if key in self.pending:  # remis en file après expiration, mais fini entre-temps
+                self.pending.remove(key)
+            self._done(job, fields.get("returncode"), "")
+
+    def _requeue_expired(self):
+        now = time.monotonic()
+        for key, (worker, deadline) in list(self.leases.items()):
+            if deadline > now:
+                continue
+            del self.leases[key]
+            job = self.jobs[key]
+            if self.attempts[key] < self.max_attempts:
+                self.journal.record("requeued", job, worker=worker)
+                self.pending.appendleft(key)
+            else:
+                self.journal.record("finished", job, worker=worker, returncode=None, lost=True)
+                self._done(job, None, f"Job perdu après {self.attempts[key]} tentatives\n")
+
+    def _done(self, job, returncode, output):
+        self.finished.add(job_key(job))
+        if self.on_finish is not None:
+            self.on_finish(job, returncode, output)
+        if len(self.finished) == len(self.jobs):
+            self.all_done.set()
+
+    def status(self):
+        with self._lock:
+            return dict(
+                total=len(self.jobs),
+                finished=len(self.finished),
+                running=len(self.leases),
+                pending=len(self.pending),
+            )
+
+
+class _CoordinatorHandler(http.server.BaseHTTPRequestHandler):
+    """API JSON du coordinateur: GET /campaign, GET /status, POST /claim, /heartbeat, /finish"""
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/campaign":
+            self._reply(
+                dict(
+                    simulation_name=server.simulation_name,
+                    heartbeat_interval=server.coordinator.lease_timeout / 4.0,
+                )
+            )
+        elif self.path == "/status":
+            self._reply(server.coordinator.status())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            worker, host = request["worker"], request.get("host", "?")
+            if self.path == "/claim":
+                job, finished = coordinator.claim(worker, host)
+                self._reply(dict(job=job._asdict() if job else None, finished=finished))
+            elif self.path == "/heartbeat":
+                coordinator.heartbeat(worker, request["jobs"])
+                self._reply({})
+            elif self.path == "/finish":
+                coordinator.finish(worker, host, request["job"], request["fields"])
+                self._reply({})
+            else:
+                self.send_error(404)
+        except (ValueError, KeyError, TypeError) as error:
+            self.send_error(400, str(error))
+
+    def _reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_campaign(campaign, rounds, workdir, address, lease_timeout, max_attempts):
+    """Distribue aux workers les listes de jobs de rounds, l'une après l'autre,
+    jusqu'à la fin de la campagne; renvoie le nombre d'échecs"""
+    os.makedirs(os.path.join(workdir, RESULTS_DIR), exist_ok=True)
+    start = time.time()
+    failures = []
+
+    def on_finish(job, returncode, output):
+        print_progress(len(coordinator.finished), len(coordinator.jobs), start, job, returncode)
+        if returncode != 0:
+            failures.append(job)
+            if output:
+                print(output, file=sys.stderr)
+
+    host, _, port = address.rpartition(":")
+    with Journal(os.path.join(workdir, RESULTS_DIR, JOURNAL_NAME)) as journal:
+        coordinator = Coordinator(journal, lease_timeout, max_attempts, on_finish)
+        server = http.server.ThreadingHTTPServer(
+            (host or "127.0.0.1", int(port)), _CoordinatorHandler
+        )
+        server.daemon_threads = True
+        server.coordinator = coordinator
+        server.simulation_name = campaign["SIMULATION_NAME"]
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        print(
+            f"Coordinateur sur http://{host or '127.0.0.1'}:{server.server_address[1]}/", flush=True
+        )
+        try:
+            for jobs in rounds:
+                coordinator.add(jobs)
+                coordinator.all_done.wait()
+            coordinator.close()
+            # laisser aux workers en attente le temps d'apprendre que la campagne est finie
+            time.sleep(WORKER_POLL_INTERVAL + 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+    aggregate_campaign(campaign, coordinator.jobs.values(), workdir)
+    return len(failures)
+
+
+class CoordinatorClient:
+    """Accès d'un worker au coordinateur; remplace le journal dans run_job"""
+
+    def __init__(self, url, retry_time=300):
+        self.url = url.rstrip("/")
+        self.worker = uuid.uuid4().hex
+        self.host = socket.gethostname()
+        self.retry_time = retry_time
+
+    def request(self, path, payload=None):
+        """Requête JSON, réessayée tant que le coordinateur reste injoignable moins de retry_time"""
+        data = None
+        if payload is not None:
+            data = json.dumps(dict(payload, worker=self.worker, host=self.host)).encode("utf-8")
+        give_up = time.monotonic() + self.retry_time
+        while True:
+            try:
+                with urllib.request.urlopen(
+                    urllib.request.Request(
+                        self.url + path, data=data, headers={"Content-Type": "application/json"}
+                    ),
+                    timeout=60,
+                ) as response:
+                    return json.load(response)
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as error:
+                if isinstance(error, urllib.error.HTTPError) or time.monotonic() > give_up:
+                    raise
+                time.sleep(WORKER_POLL_INTERVAL)
+
+    def claim(self):
+        reply = self.request("/claim", {})
+        return (Job(**reply["job"]) if reply["job"] else None), reply["finished"]
+
+    def record(self, event, job, **fields):
+        # le coordinateur note le début du job quand il l'attribue
+        if event == "finished":
+            self.request("/finish", dict(job=job_key(job), fields=fields))
+
+
+def run_worker(url, binary, workdir, max_workers, job_timeout=None):
+    """Exécute les jobs du coordinateur sur max_workers coeurs; renvoie le nombre d'échecs"""
+    client = CoordinatorClient(url)
+    campaign = client.request("/campaign")
+    binary = binary or find_binary(campaign["simulation_name"])
+    os.makedirs(os.path.join(workdir, RESULTS_DIR), exist_ok=True)
+    env = simulation_environment()
+    running = set()
+    failures = []
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def heartbeats():
+        while not stop.wait(campaign["heartbeat_interval"]):
+            with lock:
+                keys = list(running)
+            if keys:
+                try:
+                    client.request("/heartbeat", dict(jobs=keys))
+                except (urllib.error.URLError, ConnectionError, TimeoutError) as error:
+                    print(f"Heartbeat impossible: {error}", file=sys.stderr)
+
+    def work():
+        while True:
+            job, finished = client.claim()
+            if job is None:
+                if finished:
+                    return
+                time.sleep(WORKER_POLL_INTERVAL)
+                continue
+            with lock:
+                running.add(job_key(job))
+            try:
+                returncode, output = run_job(binary, job, workdir, env, client, job_timeout)
+            finally:
+                with lock:
+                    running.discard(job_key(job))
+            status = "OK" if returncode == 0 else f"ERREUR (code {returncode})"
+            print(f"{describe_job(job)}: {status}", flush=True)
+            if returncode != 0:
+                failures.append(job)
+
+    heartbeat_thread = threading.Thread(target=heartbeats, daemon=True)
+    heartbeat_thread.start()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for future in [executor.submit(work) for _ in range(max_workers)]:
+                future.result()
+    finally:
+        stop.set()
+    return len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Campagne de simulations LoRaWAN ADR")
+    parser.add_argument(
+        "--config", default=os.path.join(NS3_DIR, "campaign.ini"), help="fichier de campagne"
+    )
+    parser.add_argument(
+        "--scenarios", type=int, nargs="+", help="scénarios à exécuter (défaut: tous)"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=os.cpu_count(), help="simulations en parallèle (défaut: coeurs)"
+    )
+    parser.add_argument("--binary", help="exécutable du simulateur (défaut: build/scratch)")
+    parser.add_argument(
+        "--workdir", default=NS3_DIR, help="dossier de travail, qui contiendra resultsfinal/"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="afficher les commandes seulement")
+    parser.add_argument(
+        "--resume", action="store_true", help="ne lancer que les jobs manquants ou en erreur"
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="afficher l'état des jobs d'après le journal"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="runs ajoutés tant que l'intervalle de confiance dépasse sa cible ([ADAPTIVE])",
+    )
+    parser.add_argument(
+        "--job-timeout", type=float, help="tuer un simulateur après ce nombre de secondes"
+    )
+    distributed = parser.add_argument_group("campagne répartie sur plusieurs machines")
+    distributed.add_argument(
+        "--serve",
+        metavar="[HOTE:]PORT",
+        help="distribuer les jobs aux workers au lieu de les exécuter (ex. 0.0.0.0:8765)",
+    )
+    distributed.add_argument(
+        "--worker", metavar="URL", help="exécuter les jobs du coordinateur (ex. http://hote:8765)"
+    )
+    distributed.add_argument(
+        "--lease-timeout",
+        type=float,
+        default=120,
+        help="secondes sans heartbeat avant de remettre un job en file (défaut: 120)",
+    )
+    distributed.add_argument(
+        "--max-attempts",
+        type=int,
+        default=3,
+        help="tentatives par job perdu ou en timeout (défaut: 3)",
+    )
+    args = parser.parse_args()
+
+    if args.worker:
+        failures = run_worker(args.worker, args.binary, args.workdir, args.jobs, args.job_timeout)
+        print(f"Worker terminé, {failures} simulation(s) en erreur")
+        return 1 if failures else 0
+
+    campaign = load_campaign(args.config)
+    jobs = expand_jobs(campaign, args.scenarios)
+    print(f"Total configurations: {len(jobs)}")
+
+    if args.resume or args.status:
+        journal = Journal(os.path.join(args.workdir, RESULTS_DIR, JOURNAL_NAME))
+        states = job_states(jobs, args.workdir, journal.load())
+        if args.status:
+            for scenario in sorted({job.scenario for job in jobs}):
+                counts = collections.Counter(
+                    state for job, state in zip(jobs, states) if job.scenario == scenario
+                )
+                print(
+                    f"Scénario {scenario} ({campaign['SCENARIOS'][scenario]['NAME']}): "
+                    + ", ".join(
+                        f"{state} {counts[state]}"
+                        for state in ("done", "failed", "interrupted", "missing")
+                    )
+                )
+            return 0
+        if not args.adaptive:
+            jobs = [job for job, state in zip(jobs, states) if state != "done"]
+            print(f"Reprise: {len(states) - len(jobs)} jobs déjà terminés, {len(jobs)} à relancer")
+
+    if args.adaptive:
+        if "ADAPTIVE" not in campaign:
+            parser.error(f"--adaptive: section [ADAPTIVE] absente de {args.config}")
+        rounds = adaptive_rounds(campaign, jobs, args.workdir)
+    else:
+        rounds = [jobs]
+
+    if args.dry_run:
+        # en mode adaptatif, seul le premier tour est connu d'avance
+        binary = args.binary or campaign["SIMULATION_NAME"]
+        for job in next(iter(rounds), []):
+            print(" ".join([binary] + job_arguments(job)))
+        return 0
+
+    if args.serve:
+        address = args.serve if ":" in args.serve else f":{args.serve}"
+        failures = serve_campaign(
+            campaign, rounds, args.workdir, address, args.lease_timeout, args.max_attempts
+        )
+    else:
+        binary = args.binary or find_binary(campaign["SIMULATION_NAME"])
+        failures = run_campaign(campaign, rounds, binary, args.workdir, args.jobs, args.job_timeout)
+    if failures:
+        print(f"{failures} simulation(s) en erreur", file=sys.stderr)
+        return 1
+    print("Campagne terminée!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -124,6 +124,12 @@ struct OngoingTransmission {
 
 class LoRaGateway : public Object {
 public:
+    static TypeId GetTypeId() {
+        static TypeId tid = TypeId("LoRaGateway")
+            .SetParent<Object>()
+            .SetGroupName("Lorawan");
+        return tid;
+    }
 
     LoRaGateway() {
         m_position = Vector(0, 0, 15);
@@ -135,6 +141,8 @@ public:
     }
 
     void SetPosition(Vector pos) { m_position = pos; }
+    Vector GetPosition() const { return m_position; }
+    bool LastReceptionCollided() const { return m_lastCollision; }
     
     void SetChannelSaturation(double sigma) {
         m_shadowingRng->SetAttribute("Mean", DoubleValue(0.0));
@@ -213,6 +221,7 @@ public:
         snr = rssi - noisePower;
         
         bool basicReception = (rssi > m_sfSensitivity[cfg.sf]) && (snr > m_sfMinSNR[cfg.sf]);
+        m_lastCollision = false;
         
         if (!basicReception) {
             return false;
@@ -264,6 +273,7 @@ public:
         newTx.position = pos;
         m_currentTransmissions.push_back(newTx);
         
+        m_lastCollision = collision;
         return !collision;
     }
 
@@ -448,6 +458,7 @@ private:
     Ptr<UniformRandomVariable> m_randomVar;
     LoRaConfiguration m_globalNoAdrConfig;
     bool m_globalNoAdrConfigInitialized = false;
+    bool m_lastCollision = false;
 
     double CalculateDistance(const Vector& a, const Vector& b) const {
         return std::sqrt(std::pow(a.x - b.x, 2) + std::pow(a.y - b.y, 2) + std::pow(a.z - b.z, 2));
@@ -461,10 +472,24 @@ public:
     static TypeId GetTypeId() {
         static TypeId tid = TypeId("LoRaEndDevice")
             .SetParent<Application>()
-            .SetGroupName("Application");
+            .SetGroupName("Application")
+            .AddTraceSource("Transmission",
+                            "An uplink transmission: spreading factor, TX power (dBm) and outcome "
+                            "at the gateway (0 received, 1 lost, 2 collided)",
+                            MakeTraceSourceAccessor(&LoRaEndDevice::m_transmissionTrace),
+                            "ns3::LoRaEndDevice::TransmissionTracedCallback");
         return tid;
     }
 
+    /**
+     * TracedCallback signature for uplink transmissions.
+     *
+     * \param [in] sf The spreading factor.
+     * \param [in] txPower The transmission power, in dBm.
+     * \param [in] outcome 0 if received, 1 if lost, 2 if collided.
+     */
+    typedef void (*TransmissionTracedCallback)(uint8_t sf, double txPower, uint8_t outcome);
+
     LoRaEndDevice() : m_deviceId(0), m_packetInterval(30.0), m_maxMessages(100), m_sentMessages(0) {}
 
     void Setup(uint32_t deviceId, Ptr<LoRaGateway> gateway, ADRAlgorithm algo, int payloadSize, double mobility_speed) {
@@ -529,6 +554,8 @@ public:
         log.snr = snr;
         log.config = m_lastConfig;
         m_packetLogs.push_back(log);
+        m_transmissionTrace(m_lastConfig.sf, m_lastConfig.txPower,
+                            success ? 0 : (m_gateway->LastReceptionCollided() ? 2 : 1));
 
         if (m_adrAlgorithm != ADRAlgorithm::NO_ADR) {
             m_gateway->UpdateDeviceState(m_deviceId, success, snr, m_lastConfig, isMobile);
@@ -571,6 +598,7 @@ private:
     double m_packetInterval;
     uint32_t m_maxMessages;
     uint32_t m_sentMessages;
+    TracedCallback<uint8_t, double, uint8_t> m_transmissionTrace;
 };
 
 // --- Main Simulation ---
@@ -657,6 +685,14 @@ int main(int argc, char *argv[]) {
     }
     mobility.Install(endDevices);
 
+    // Gateway node, created after the end devices so that their node IDs are
+    // unchanged; it lets the visualizer show the gateway
+    Ptr<Node> gatewayNode = CreateObject<Node>();
+    Ptr<ConstantPositionMobilityModel> gatewayMobility = CreateObject<ConstantPositionMobilityModel>();
+    gatewayMobility->SetPosition(gateway->GetPosition());
+    gatewayNode->AggregateObject(gatewayMobility);
+    gatewayNode->AggregateObject(gateway);
+
     std::vector<Ptr<LoRaEndDevice>> deviceApps(numDevices);
 
     for (uint32_t i = 0; i < static_cast<uint32_t>(numDevices); ++i) {
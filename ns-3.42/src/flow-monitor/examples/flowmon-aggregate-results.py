@@ -0,0 +1,427 @@
+"""
+Aggregate the FlowMonitor XML files of several runs.
+
+Every XML file found under a directory is parsed with the streaming parser
+of flowmon-parse-results.py, in a process pool.  Each file is one run; its
+configuration and run number are taken from its path, relative to the
+directory, with a regular expression (see --pattern), e.g.
+'load-0.5/run3.xml' is run 3 of configuration 'load-0.5'.  Flows are joined
+across runs on their five-tuple, and the mean, 95% confidence interval and
+percentiles of the mean delay, loss ratio and received bitrate
+(throughput) are computed per configuration and flow, and per
+configuration over all the flows.
+
+Parsed files are cached next to the results (see --cache), keyed by path,
+size and modification time, so that aggregating again after adding a few
+runs only parses the new files.
+
+  python3 flowmon-aggregate-results.py results/ --output stats.csv --flows flows.csv
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import functools
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import re
+import sys
+
+import numpy
+
+_spec = importlib.util.spec_from_file_location(
+    "flowmon_parse_results",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "flowmon-parse-results.py"),
+)
+flowmon_parse_results = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(flowmon_parse_results)
+
+## default regular expression giving the configuration and run of a file, from its relative path
+DEFAULT_PATTERN = r"^(?P<config>.+?)[-_/.]*(?:run|seed)[-_]?(?P<run>\d+)\.xml$"
+FIVE_TUPLE = ["protocol", "sourceAddress", "sourcePort", "destinationAddress", "destinationPort"]
+## aggregated metrics: (output name, flow column)
+METRICS = [("delay", "delayMean"), ("loss", "lossRatio"), ("throughput", "rxThroughput")]
+PERCENTILES = (5, 50, 95)
+CACHE_VERSION = 1
+
+
+def student_t_central(t, dof):
+    """! Probability P(|T| < t) of the Student t distribution, with the exact
+    formulas 26.7.3 and 26.7.4 of Abramowitz and Stegun.
+    @param t The (non-negative) value.
+    @param dof Degrees of freedom (a positive integer).
+    @return The probability.
+    """
+    theta = math.atan(t / math.sqrt(dof))
+    cos2 = math.cos(theta) ** 2
+    term = total = 1.0
+    if dof % 2:
+        for j in range(1, (dof - 1) // 2):
+            term *= 2 * j / (2 * j + 1) * cos2
+            total += term
+        series = math.sin(theta) * math.cos(theta) * total if dof > 1 else 0.0
+        return 2 / math.pi * (theta + series)
+    for j in range(1, dof // 2):
+        term *= (2 * j - 1) / (2 * j) * cos2
+        total += term
+    return math.sin(theta) * total
+
+
+@functools.lru_cache(maxsize=None)
+def student_t_quantile(p, dof):
+    """! Quantile of the Student t distribution, by bisection.
+    @param p The probability, above 0.5.
+    @param dof Degrees of freedom (a positive integer).
+    @return The quantile.
+    """
+    target = 2 * p - 1
+    low, high = 0.0, 1.0
+    while student_t_central(high, dof) < target:
+        low, high = high, 2 * high
+    for _ in range(100):
+        middle = (low + high) / 2
+        if student_t_central(middle, dof) < target:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def t_quantile_95(dof):
+    """! Two-sided 95% quantile of the Student t distribution.
+    @param dof Array of degrees of freedom (at least 1).
+    @return Array of quantiles.
+    """
+    dof = numpy.asarray(dof, dtype=int)
+    unique_dof, inverse = numpy.unique(dof, return_inverse=True)
+    quantiles = numpy.array([student_t_quantile(0.975, int(d)) for d in unique_dof])
+    return quantiles[inverse].reshape(dof.shape)
+
+
+def parse_file(file_name):
+    """! Parse a FlowMonitor XML file into per-flow rows.
+    @param file_name The XML file name.
+    @return dict mapping the column names of FLOW_COLUMNS to lists of values
+    """
+    columns = flowmon_parse_results.FLOW_COLUMNS
+    with open(file_name, "rb") as file_obj:
+        rows = [
+            [get(sim_index, flow) for name, get in columns]
+            for sim_index, sim in enumerate(flowmon_parse_results.parse_flowmon(file_obj))
+            for flow in sim.flows
+        ]
+    return dict((name, [row[i] for row in rows]) for i, (name, get) in enumerate(columns))
+
+
+## FileCache
+class FileCache(object):
+    """! On-disk cache of parsed files, one JSON file per XML file."""
+
+    ## class variables
+    ## @var directory
+    #  cache directory, or None if caching is disabled
+    def __init__(self, directory):
+        """! The initializer.
+        @param self The object pointer.
+        @param directory The cache directory, or None to disable caching.
+        """
+        self.directory = directory
+
+    def _path(self, file_name):
+        stat = os.stat(file_name)
+        key = "%s\n%i\n%i\n%i" % (
+            os.path.abspath(file_name),
+            stat.st_size,
+            stat.st_mtime_ns,
+            CACHE_VERSION,
+        )
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+    def load(self, file_name):
+        """! Load the parsed rows of a file.
+        @param self The object pointer.
+        @param file_name The XML file name.
+        @return The columns, or None if the file is not cached or changed since.
+        """
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(file_name)) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, file_name, columns):
+        """! Save the parsed rows of a file; failures are ignored.
+        @param self The object pointer.
+        @param file_name The XML file name.
+        @param columns The columns.
+        @return none
+        """
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(file_name)
+            with open(path + ".tmp", "w") as cache_file:
+                json.dump(columns, cache_file)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+
+def find_runs(directory, pattern):
+    """! Find the XML files of a directory and their run metadata.
+    @param directory The directory.
+    @param pattern Compiled regular expression with 'config' and 'run' groups,
+    matched against the path of each file relative to the directory.
+    @return List of (file name, configuration, run), sorted by file name.
+    """
+    runs = []
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".xml"):
+                continue
+            path = os.path.join(dir_path, file_name)
+            relative = os.path.relpath(path, directory).replace(os.sep, "/")
+            match = pattern.match(relative)
+            if match:
+                runs.append((path, match.group("config"), int(match.group("run"))))
+            else:
+                runs.append((path, relative[: -len(".xml")], 0))
+    return runs
+
+
+def load_runs(runs, cache, jobs):
+    """! Parse the files of the runs, in a process pool, and join them in one table.
+    @param runs List of (file name, configuration, run).
+    @param cache The FileCache.
+    @param jobs Number of worker processes.
+    @return dict mapping column names to NumPy arrays: configuration, run,
+    file, the FLOW_COLUMNS, then lossRatio and rxThroughput.
+    """
+    parsed = dict((file_name, cache.load(file_name)) for file_name, config, run in runs)
+    missing = [file_name for file_name, columns in parsed.items() if columns is None]
+    if missing:
+        print("Parsing %i of %i files" % (len(missing), len(runs)), file=sys.stderr)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            for file_name, columns in zip(missing, executor.map(parse_file, missing)):
+                cache.save(file_name, columns)
+                parsed[file_name] = columns
+
+    names = [name for name, get in flowmon_parse_results.FLOW_COLUMNS]
+    table = dict((name, []) for name in ["configuration", "run", "file"] + names)
+    for file_name, config, run in runs:
+        columns = parsed[file_name]
+        count = len(columns["flowId"])
+        table["configuration"].extend([config] * count)
+        table["run"].extend([run] * count)
+        table["file"].extend([file_name] * count)
+        for name in names:
+            table[name].extend(columns[name])
+
+    arrays = {}
+    for name, values in table.items():
+        if name in FIVE_TUPLE or name in ("configuration", "file"):
+            arrays[name] = numpy.array(["" if v is None else str(v) for v in values], dtype=object)
+        else:
+            arrays[name] = numpy.array([numpy.nan if v is None else v for v in values], dtype=float)
+
+    # packetLossRatio is None for the flows that received nothing, which would
+    # leave the worst flows out of the loss statistics: the ratio is computed
+    # again here for every flow that sent packets, lost ones included
+    accounted = arrays["rxPackets"] + arrays["lostPackets"]
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        arrays["lossRatio"] = numpy.where(
+            (arrays["txPackets"] > 0) & (accounted > 0),
+            arrays["lostPackets"] / accounted,
+            numpy.nan,
+        )
+
+    # rxBitrate is None for the flows that received fewer than 2 packets, for
+    # the same reason: their received bytes are taken over the transmission
+    # time instead, so that a starved flow has a throughput of 0
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        tx_duration = arrays["txBytes"] * 8 / arrays["txBitrate"]
+        arrays["rxThroughput"] = numpy.where(
+            numpy.isnan(arrays["rxBitrate"]),
+            numpy.where(tx_duration > 0, arrays["rxBytes"] * 8 / tx_duration, numpy.nan),
+            arrays["rxBitrate"],
+        )
+    return arrays
+
+
+def group_statistics(keys, values):
+    """! Compute statistics of values per group, vectorized over the groups.
+    @param keys Array of group indices, 0 to number of groups - 1.
+    @param values Array of values; NaN values are ignored.
+    @return dict of arrays, one value per group: n, mean, ci95 (half width),
+    and p<N> for the PERCENTILES.
+    """
+    n_groups = int(keys.max()) + 1 if len(keys) else 0
+    valid = ~numpy.isnan(values)
+    keys = keys[valid]
+    values = values[valid]
+    n = numpy.bincount(keys, minlength=n_groups)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        mean = numpy.bincount(keys, weights=values, minlength=n_groups) / n
+        deviation = values - mean[keys]
+        variance = numpy.bincount(keys, weights=deviation**2, minlength=n_groups) / (n - 1)
+        ci95 = t_quantile_95(numpy.maximum(n - 1, 1)) * numpy.sqrt(variance / n)
+    ci95[n < 2] = numpy.nan
+    statistics = {"n": n, "mean": mean, "ci95": ci95}
+
+    # percentiles, with linear interpolation, from the values sorted per group
+    order = numpy.lexsort((values, keys))
+    sorted_values = values[order]
+    first = numpy.concatenate(([0], numpy.cumsum(n)[:-1]))
+    for percentile in PERCENTILES:
+        position = (n - 1) * percentile / 100.0
+        lower = numpy.floor(position).astype(int)
+        upper = numpy.minimum(lower + 1, numpy.maximum(n - 1, 0))
+        fraction = position - lower
+        result = numpy.full(n_groups, numpy.nan)
+        has_values = n > 0
+        low_values = sorted_values[(first + lower)[has_values]]
+        high_values = sorted_values[(first + upper)[has_values]]
+        result[has_values] = low_values + (high_values - low_values) * fraction[has_values]
+        statistics["p%i" % percentile] = result
+    return statistics
+
+
+def aggregate(table):
+    """! Compute the statistics of the metrics per configuration and flow,
+    and per configuration over all the flows.
+    @param table The joined table, from load_runs().
+    @return List of rows (dicts), sorted by configuration and five-tuple; the
+    five-tuple fields are '*' in the per-configuration rows.
+    """
+    rows = []
+    # a run is one file; runs are counted per group from the (group, file) pairs
+    files = numpy.unique(table["file"].astype(str), return_inverse=True)[1]
+    n_files = int(files.max()) + 1 if len(files) else 1
+    for by_flow in (True, False):
+        key_names = ["configuration"] + (FIVE_TUPLE if by_flow else [])
+        key_strings = ["\0".join(values) for values in zip(*[table[name] for name in key_names])]
+        unique_keys, keys = numpy.unique(numpy.array(key_strings, dtype=str), return_inverse=True)
+        pairs = numpy.unique(keys * n_files + files)
+        run_counts = numpy.bincount(pairs // n_files, minlength=len(unique_keys))
+        metrics = dict((name, group_statistics(keys, table[column])) for name, column in METRICS)
+        for index, key in enumerate(unique_keys):
+            fields = key.split("\0")
+            row = {"configuration": fields[0]}
+            for position, name in enumerate(FIVE_TUPLE):
+                row[name] = fields[position + 1] if by_flow else "*"
+            row["runs"] = int(run_counts[index])
+            for name, statistics in metrics.items():
+                for statistic, values in statistics.items():
+                    row["%s_%s" % (name, statistic)] = values[index]
+            rows.append(row)
+    rows.sort(key=lambda row: (row["configuration"], row["sourceAddress"] != "*"))
+    return rows
+
+
+def write_table(rows, names, file_name):
+    """! Write rows to a CSV file, or to a Parquet file (which needs pyarrow)
+    if the name ends in '.parquet'.
+    @param rows List of rows, as dicts or lists.
+    @param names Column names.
+    @param file_name Output file name.
+    @return none
+    """
+    rows = [[row[name] for name in names] if isinstance(row, dict) else row for row in rows]
+    rows = [[None if isinstance(v, float) and numpy.isnan(v) else v for v in row] for row in rows]
+    if file_name.endswith(".parquet"):
+        import pyarrow
+        import pyarrow.parquet
+
+        columns = list(zip(*rows)) if rows else [[] for name in names]
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(list(column)) for column in columns], names=names
+        )
+        pyarrow.parquet.write_table(table, file_name)
+    else:
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(names)
+            writer.writerows(rows)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Aggregate FlowMonitor XML results of several runs"
+    )
+    parser.add_argument("directory", help="directory searched recursively for XML files")
+    parser.add_argument(
+        "--pattern",
+        default=DEFAULT_PATTERN,
+        help="regular expression with 'config' and 'run' groups, matched against the path of"
+        " each file relative to the directory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--output", help="write the statistics to a CSV file, or Parquet if it ends in '.parquet'"
+    )
+    parser.add_argument("--flows", help="write the joined per-flow table to a CSV or Parquet file")
+    parser.add_argument(
+        "--cache",
+        help="cache directory for parsed files (default: DIRECTORY/.flowmon-cache; '' disables)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="worker processes (default: %(default)s)",
+    )
+    args = parser.parse_args(argv[1:])
+
+    runs = find_runs(args.directory, re.compile(args.pattern))
+    if not runs:
+        print("No XML files found in %s" % args.directory, file=sys.stderr)
+        return 1
+    cache_directory = args.cache
+    if cache_directory is None:
+        cache_directory = os.path.join(args.directory, ".flowmon-cache")
+    table = load_runs(runs, FileCache(cache_directory or None), args.jobs)
+    rows = aggregate(table)
+
+    names = ["configuration"] + FIVE_TUPLE + ["runs"]
+    for name, column in METRICS:
+        names += ["%s_%s" % (name, statistic) for statistic in ["n", "mean", "ci95"]]
+        names += ["%s_p%i" % (name, percentile) for percentile in PERCENTILES]
+    if args.flows:
+        flow_names = list(table)
+        write_table(
+            [list(values) for values in zip(*[table[name].tolist() for name in flow_names])],
+            flow_names,
+            args.flows,
+        )
+    if args.output:
+        write_table(rows, names, args.output)
+        return 0
+
+    for row in rows:
+        if row["sourceAddress"] != "*":
+            continue
+        print("Configuration %s (%i runs)" % (row["configuration"], row["runs"]))
+        for name, column in METRICS:
+            print(
+                "\t%s: mean %g +/- %g, p5 %g, median %g, p95 %g"
+                % (
+                    name,
+                    row[name + "_mean"],
+                    row[name + "_ci95"],
+                    row[name + "_p5"],
+                    row[name + "_p50"],
+                    row[name + "_p95"],
+                )
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
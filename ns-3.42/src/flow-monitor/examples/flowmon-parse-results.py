@@ -1,4 +1,5 @@
-import os
+import argparse
+import csv
 import sys
 
 try:
@@ -26,9 +27,9 @@ class FiveTuple(object):
     #  source port
     ## @var destinationPort
     #  destination port
-    ## @var __slots_
+    ## @var __slots__
     #  class variable list
-    __slots_ = ["sourceAddress", "destinationAddress", "protocol", "sourcePort", "destinationPort"]
+    __slots__ = ["sourceAddress", "destinationAddress", "protocol", "sourcePort", "destinationPort"]
 
     def __init__(self, el):
         """! The initializer.
@@ -47,9 +48,9 @@ class Histogram(object):
     ## class variables
     ## @var bins
     #  histogram bins
-    ## @var __slots_
+    ## @var __slots__
     #  class variable list
-    __slots_ = "bins", "nbins", "number_of_flows"
+    __slots__ = "bins", "nbins", "number_of_flows"
 
     def __init__(self, el=None):
         """! The initializer.
@@ -70,8 +71,20 @@ class Flow(object):
     ## class variables
     ## @var flowId
     #  delay ID
+    ## @var txPackets
+    #  transmitted packets
+    ## @var rxPackets
+    #  received packets
+    ## @var lostPackets
+    #  lost packets
+    ## @var txBytes
+    #  transmitted bytes
+    ## @var rxBytes
+    #  received bytes
     ## @var delayMean
     #  mean delay
+    ## @var jitterMean
+    #  mean jitter
     ## @var packetLossRatio
     #  packet loss ratio
     ## @var rxBitrate
@@ -88,11 +101,19 @@ class Flow(object):
     #  flow histogram
     ## @var rx_duration
     #  receive duration
-    ## @var __slots_
+    ## @var fiveTuple
+    #  five-tuple, or None if the classifier did not list the flow
+    ## @var __slots__
     #  class variable list
-    __slots_ = [
+    __slots__ = [
         "flowId",
+        "txPackets",
+        "rxPackets",
+        "lostPackets",
+        "txBytes",
+        "rxBytes",
         "delayMean",
+        "jitterMean",
         "packetLossRatio",
         "rxBitrate",
         "txBitrate",
@@ -112,6 +133,11 @@ class Flow(object):
         self.flowId = int(flow_el.get("flowId"))
         rxPackets = float(flow_el.get("rxPackets"))
         txPackets = float(flow_el.get("txPackets"))
+        self.txPackets = int(txPackets)
+        self.rxPackets = int(rxPackets)
+        self.txBytes = int(flow_el.get("txBytes"))
+        self.rxBytes = int(flow_el.get("rxBytes"))
+        self.fiveTuple = None
 
         tx_duration = (
             parse_time_ns(flow_el.get("timeLastTxPacket"))
@@ -133,6 +159,10 @@ class Flow(object):
         else:
             self.delayMean = None
             self.packetSizeMean = None
+        if rxPackets > 1:
+            self.jitterMean = parse_time_ns(flow_el.get("jitterSum")) / (rxPackets - 1) * 1e-9
+        else:
+            self.jitterMean = None
         if rx_duration > 0:
             self.rxBitrate = float(flow_el.get("rxBytes")) * 8 / rx_duration
         else:
@@ -142,6 +172,7 @@ class Flow(object):
         else:
             self.txBitrate = None
         lost = float(flow_el.get("lostPackets"))
+        self.lostPackets = int(lost)
         # print "rxBytes: %s; txPackets: %s; rxPackets: %s; lostPackets: %s" % (flow_el.get('rxBytes'), txPackets, rxPackets, lost)
         if rxPackets == 0:
             self.packetLossRatio = None
@@ -162,9 +193,9 @@ class ProbeFlowStats(object):
     #  network packets
     ## @var bytes
     #  bytes
-    ## @var __slots_
+    ## @var __slots__
     #  class variable list
-    __slots_ = ["probeId", "packets", "bytes", "delayFromFirstProbe"]
+    __slots__ = ["probeId", "packets", "bytes", "delayFromFirstProbe"]
 
 
 ## Simulation
@@ -172,59 +203,176 @@ class Simulation(object):
     ## class variables
     ## @var flows
     #  list of flows
-    def __init__(self, simulation_el):
+    ## @var flow_map
+    #  flow ID -> flow
+    def __init__(self):
         """! The initializer.
         @param self The object pointer.
-        @param simulation_el The element.
         """
         self.flows = []
-        (FlowClassifier_el,) = simulation_el.findall("Ipv4FlowClassifier")
-        flow_map = {}
-        for flow_el in simulation_el.findall("FlowStats/Flow"):
-            flow = Flow(flow_el)
-            flow_map[flow.flowId] = flow
-            self.flows.append(flow)
-        for flow_cls in FlowClassifier_el.findall("Flow"):
-            flowId = int(flow_cls.get("flowId"))
-            flow_map[flowId].fiveTuple = FiveTuple(flow_cls)
-
-        for probe_elem in simulation_el.findall("FlowProbes/FlowProbe"):
-            probeId = int(probe_elem.get("index"))
-            for stats in probe_elem.findall("FlowStats"):
-                flowId = int(stats.get("flowId"))
+        self.flow_map = {}
+
+    def add_flow(self, flow):
+        """! Add a flow.
+        @param self The object pointer.
+        @param flow The Flow.
+        @return none
+        """
+        self.flow_map[flow.flowId] = flow
+        self.flows.append(flow)
+
+
+def parse_flowmon(file_obj):
+    """! Parse a FlowMonitor XML file, streaming.
+
+    Each Flow, classifier Flow and probe FlowStats element is turned into a
+    record as soon as it has been read, then cleared and removed from the
+    tree, so memory use depends on the number of flows, not on the size of
+    the file (histograms, probes, DSCP lists).
+    @param file_obj The XML file, opened in binary mode.
+    @return generator of Simulation objects, one per FlowMonitor element.
+    """
+    elements = []
+    sim = None
+    probe_id = None
+    for event, elem in ElementTree.iterparse(file_obj, events=("start", "end")):
+        if event == "start":
+            elements.append(elem)
+            if elem.tag == "FlowMonitor":
+                sim = Simulation()
+            elif elem.tag == "FlowProbe":
+                probe_id = int(elem.get("index"))
+            continue
+
+        elements.pop()
+        parent = elements[-1].tag if elements else None
+        tag = elem.tag
+        if tag == "Flow" and parent == "FlowStats":
+            sim.add_flow(Flow(elem))
+        elif tag == "Flow" and parent in ("Ipv4FlowClassifier", "Ipv6FlowClassifier"):
+            flow = sim.flow_map.get(int(elem.get("flowId")))
+            if flow is not None:
+                flow.fiveTuple = FiveTuple(elem)
+        elif tag == "FlowStats" and parent == "FlowProbe":
+            flow = sim.flow_map.get(int(elem.get("flowId")))
+            if flow is not None:
                 s = ProbeFlowStats()
-                s.packets = int(stats.get("packets"))
-                s.bytes = float(stats.get("bytes"))
-                s.probeId = probeId
+                s.packets = int(elem.get("packets"))
+                s.bytes = float(elem.get("bytes"))
+                s.probeId = probe_id
                 if s.packets > 0:
                     s.delayFromFirstProbe = parse_time_ns(
-                        stats.get("delayFromFirstProbeSum")
+                        elem.get("delayFromFirstProbeSum")
                     ) / float(s.packets)
                 else:
                     s.delayFromFirstProbe = 0
-                flow_map[flowId].probe_stats_unsorted.append(s)
+                flow.probe_stats_unsorted.append(s)
+        elif tag == "FlowMonitor":
+            yield sim
+            sim = None
+        elif tag not in (
+            "FlowStats",
+            "Ipv4FlowClassifier",
+            "Ipv6FlowClassifier",
+            "FlowProbe",
+            "FlowProbes",
+        ):
+            # children of the elements above, e.g. histograms, are read with them
+            continue
+        elem.clear()
+        if elements:
+            elements[-1].remove(elem)
+
+
+## per-flow metrics exported by export_flows(): (column name, function of (simulation index, flow))
+FLOW_COLUMNS = [
+    ("simulation", lambda sim_index, flow: sim_index),
+    ("flowId", lambda sim_index, flow: flow.flowId),
+    ("protocol", lambda sim_index, flow: flow.fiveTuple and flow.fiveTuple.protocol),
+    ("sourceAddress", lambda sim_index, flow: flow.fiveTuple and flow.fiveTuple.sourceAddress),
+    ("sourcePort", lambda sim_index, flow: flow.fiveTuple and flow.fiveTuple.sourcePort),
+    (
+        "destinationAddress",
+        lambda sim_index, flow: flow.fiveTuple and flow.fiveTuple.destinationAddress,
+    ),
+    ("destinationPort", lambda sim_index, flow: flow.fiveTuple and flow.fiveTuple.destinationPort),
+    ("txPackets", lambda sim_index, flow: flow.txPackets),
+    ("rxPackets", lambda sim_index, flow: flow.rxPackets),
+    ("lostPackets", lambda sim_index, flow: flow.lostPackets),
+    ("txBytes", lambda sim_index, flow: flow.txBytes),
+    ("rxBytes", lambda sim_index, flow: flow.rxBytes),
+    ("txBitrate", lambda sim_index, flow: flow.txBitrate),
+    ("rxBitrate", lambda sim_index, flow: flow.rxBitrate),
+    ("delayMean", lambda sim_index, flow: flow.delayMean),
+    ("jitterMean", lambda sim_index, flow: flow.jitterMean),
+    ("packetLossRatio", lambda sim_index, flow: flow.packetLossRatio),
+    ("packetSizeMean", lambda sim_index, flow: flow.packetSizeMean),
+    ("hopCount", lambda sim_index, flow: flow.hopCount if flow.rxPackets else None),
+]
+
+
+def export_flows(sim_list, file_name):
+    """! Export the per-flow metrics, one row per flow, to a CSV file, or to
+    a Parquet file (which needs pyarrow) if the name ends in '.parquet'.
+    Times are in seconds and bitrates in bit/s; missing values are empty.
+    @param sim_list List of Simulation objects.
+    @param file_name Output file name.
+    @return the number of rows written
+    """
+    rows = [
+        [get(sim_index, flow) for name, get in FLOW_COLUMNS]
+        for sim_index, sim in enumerate(sim_list)
+        for flow in sim.flows
+    ]
+    names = [name for name, get in FLOW_COLUMNS]
+    if file_name.endswith(".parquet"):
+        import pyarrow
+        import pyarrow.parquet
+
+        table = pyarrow.Table.from_arrays(
+            (
+                [pyarrow.array(list(column)) for column in zip(*rows)]
+                if rows
+                else [pyarrow.array([]) for name in names]
+            ),
+            names=names,
+        )
+        pyarrow.parquet.write_table(table, file_name)
+    else:
+        with open(file_name, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(names)
+            writer.writerows(rows)
+    return len(rows)
 
 
 def main(argv):
-    with open(argv[1], encoding="utf-8") as file_obj:
+    parser = argparse.ArgumentParser(description="Parse FlowMonitor XML results")
+    parser.add_argument("file", help="FlowMonitor XML file")
+    parser.add_argument(
+        "--export",
+        metavar="OUTPUT",
+        help="write the per-flow metrics to a CSV file, or a Parquet file if OUTPUT ends in"
+        " '.parquet', instead of printing them",
+    )
+    args = parser.parse_args(argv[1:])
+
+    with open(args.file, "rb") as file_obj:
         print("Reading XML file ", end=" ")
 
         sys.stdout.flush()
-        level = 0
         sim_list = []
-        for event, elem in ElementTree.iterparse(file_obj, events=("start", "end")):
-            if event == "start":
-                level += 1
-            if event == "end":
-                level -= 1
-                if level == 0 and elem.tag == "FlowMonitor":
-                    sim = Simulation(elem)
-                    sim_list.append(sim)
-                    elem.clear()  # won't need this any more
-                    sys.stdout.write(".")
-                    sys.stdout.flush()
+        for sim in parse_flowmon(file_obj):
+            sim_list.append(sim)
+            sys.stdout.write(".")
+            sys.stdout.flush()
     print(" done.")
 
+    if args.export:
+        rows = export_flows(sim_list, args.export)
+        print("Wrote %i flows to %s" % (rows, args.export))
+        return
+
     for sim in sim_list:
         for flow in sim.flows:
             t = flow.fiveTuple
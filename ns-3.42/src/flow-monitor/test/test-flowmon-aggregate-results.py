@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+"""! Unit tests of flowmon-aggregate-results.py, on small generated FlowMonitor XML files.
+
+python3 src/flow-monitor/test/test-flowmon-aggregate-results.py
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+_spec = importlib.util.spec_from_file_location(
+    "flowmon_aggregate_results",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        os.pardir,
+        "examples",
+        "flowmon-aggregate-results.py",
+    ),
+)
+flowmon_aggregate_results = importlib.util.module_from_spec(_spec)
+# registered so that the process pool of load_runs() can pickle parse_file()
+sys.modules[_spec.name] = flowmon_aggregate_results
+_spec.loader.exec_module(flowmon_aggregate_results)
+
+FLOW_TEMPLATE = (
+    '<Flow flowId="%(flow_id)i" timeFirstTxPacket="+0ns" timeFirstRxPacket="+%(first_rx)ins"'
+    ' timeLastTxPacket="+1000000000ns" timeLastRxPacket="+%(last_rx)ins"'
+    ' delaySum="+%(delay_sum)ins" jitterSum="+0ns" lastDelay="+0ns" txBytes="%(tx_bytes)i"'
+    ' rxBytes="%(rx_bytes)i" txPackets="%(tx)i" rxPackets="%(rx)i" lostPackets="%(lost)i"'
+    ' timesForwarded="0"/>'
+)
+CLASSIFIER_TEMPLATE = (
+    '<Flow flowId="%(flow_id)i" sourceAddress="10.0.0.%(flow_id)i" destinationAddress="10.0.1.1"'
+    ' protocol="17" sourcePort="49153" destinationPort="9"/>'
+)
+
+
+def flowmon_xml(flows):
+    """! Build the text of a FlowMonitor XML file.
+    @param flows List of (transmitted, received, lost) packet counts, one per flow.
+    @return The XML text.
+    """
+    stats = []
+    classifier = []
+    for flow_id, (tx, rx, lost) in enumerate(flows, 1):
+        values = {
+            "flow_id": flow_id,
+            "first_rx": 1000000 if rx else 0,
+            "last_rx": 1001000000 if rx > 1 else (1000000 if rx else 0),
+            "delay_sum": 1000000 * rx,
+            "tx_bytes": 100 * tx,
+            "rx_bytes": 100 * rx,
+            "tx": tx,
+            "rx": rx,
+            "lost": lost,
+        }
+        stats.append(FLOW_TEMPLATE % values)
+        classifier.append(CLASSIFIER_TEMPLATE % values)
+    return (
+        '<?xml version="1.0" ?>\n<FlowMonitor>\n<FlowStats>\n%s\n</FlowStats>\n'
+        "<Ipv4FlowClassifier>\n%s\n</Ipv4FlowClassifier>\n</FlowMonitor>\n"
+        % ("\n".join(stats), "\n".join(classifier))
+    )
+
+
+class TestFlowmonAggregateResults(unittest.TestCase):
+    """! Tests of the loss ratio and confidence intervals of the aggregated statistics."""
+
+    def setUp(self):
+        """! Create a results directory.
+        @param self The object pointer.
+        @return none
+        """
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """! Remove the results directory.
+        @param self The object pointer.
+        @return none
+        """
+        shutil.rmtree(self.directory)
+
+    def aggregate(self, runs):
+        """! Write one XML file per run of configuration 'a' and aggregate them.
+        @param self The object pointer.
+        @param runs List of runs, each a list of flows as taken by flowmon_xml().
+        @return The per-configuration row, over all the flows.
+        """
+        for run, flows in enumerate(runs, 1):
+            with open(os.path.join(self.directory, "a-run%i.xml" % run), "w") as xml_file:
+                xml_file.write(flowmon_xml(flows))
+        module = flowmon_aggregate_results
+        found = module.find_runs(self.directory, module.re.compile(module.DEFAULT_PATTERN))
+        table = module.load_runs(found, module.FileCache(None), 1)
+        rows = module.aggregate(table)
+        return [row for row in rows if row["sourceAddress"] == "*"][0]
+
+    def test_loss_includes_flows_without_received_packets(self):
+        """! A flow that lost all its packets counts in the loss statistics.
+        @param self The object pointer.
+        @return none
+        """
+        row = self.aggregate([[(10, 9, 1), (10, 0, 10)]])
+        self.assertEqual(row["loss_n"], 2)
+        self.assertAlmostEqual(row["loss_mean"], 0.55)
+        self.assertAlmostEqual(row["loss_p95"], 0.955)
+        # the delay is still only defined for the flow that received packets
+        self.assertEqual(row["delay_n"], 1)
+
+    def test_throughput_includes_flows_without_received_packets(self):
+        """! A flow that received nothing, or a single packet, counts in the throughput statistics.
+        @param self The object pointer.
+        @return none
+        """
+        row = self.aggregate([[(10, 9, 1), (10, 0, 10)]])
+        self.assertEqual(row["throughput_n"], 2)
+        self.assertAlmostEqual(row["throughput_mean"], 3600)
+        # one packet of 100 bytes received over the 1 s of transmission
+        row = self.aggregate([[(10, 1, 9)]])
+        self.assertEqual(row["throughput_n"], 1)
+        self.assertAlmostEqual(row["throughput_mean"], 800)
+
+    def test_loss_ignores_flows_without_transmitted_packets(self):
+        """! A flow that sent nothing has no loss ratio.
+        @param self The object pointer.
+        @return none
+        """
+        row = self.aggregate([[(10, 8, 2), (0, 0, 0)]])
+        self.assertEqual(row["loss_n"], 1)
+        self.assertAlmostEqual(row["loss_mean"], 0.2)
+
+    def test_t_quantile_95(self):
+        """! The Student t quantiles match the tables, beyond 30 degrees of freedom too.
+        @param self The object pointer.
+        @return none
+        """
+        quantiles = flowmon_aggregate_results.t_quantile_95([1, 2, 10, 30, 40, 60, 120, 1000])
+        expected = [12.706, 4.303, 2.228, 2.042, 2.021, 2.000, 1.980, 1.962]
+        for quantile, value in zip(quantiles, expected):
+            self.assertAlmostEqual(quantile, value, places=3)
+
+    def test_ci95_with_many_runs(self):
+        """! The confidence interval over 41 runs uses the t quantile with 40 degrees of freedom.
+        @param self The object pointer.
+        @return none
+        """
+        runs = [[(10, 10 - run % 2, run % 2)] for run in range(41)]
+        row = self.aggregate(runs)
+        losses = [run % 2 / 10.0 for run in range(41)]
+        mean = sum(losses) / len(losses)
+        variance = sum((loss - mean) ** 2 for loss in losses) / (len(losses) - 1)
+        self.assertAlmostEqual(row["loss_ci95"], 2.021 * (variance / len(losses)) ** 0.5, places=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
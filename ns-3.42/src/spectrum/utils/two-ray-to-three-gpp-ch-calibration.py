@@ -21,6 +21,10 @@ this program. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse as argp
 import contextlib
+import hashlib
+import json
+import os
+import time
 from itertools import product
 from pathlib import Path
 
@@ -29,6 +33,8 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 from matplotlib import pyplot as plt
+from scipy.optimize import minimize
+from scipy.special import gammaincinv
 from tqdm import tqdm
 
 # Command line arguments
@@ -41,6 +47,31 @@ parser.add_argument(
 parser.add_argument(
     "--num_refinements", default=1, help="Number of refinement local search runs to be carried out"
 )
+parser.add_argument(
+    "--search_mode",
+    default="grid",
+    choices=["grid", "adaptive"],
+    help="Search used by the fit: exhaustive grids ('grid'), or a coarse grid followed by a Nelder-Mead"
+    + " optimization with common random numbers ('adaptive')",
+)
+parser.add_argument(
+    "--num_adaptive_grid_params",
+    default=6,
+    help="Number of values for each parameter of the coarse grid of the adaptive search",
+)
+parser.add_argument(
+    "--ad_rel_tolerance",
+    default=1e-4,
+    help="Anderson-Darling improvement, relative to the spread of the measures of the coarse grid, below"
+    + " which the adaptive search stops",
+)
+parser.add_argument("--n_jobs", default=os.cpu_count(), help="Number of fits to be run in parallel")
+parser.add_argument(
+    "--cache_folder",
+    default="TwoRayCalibrationCache/",
+    help="Folder where each fit result is cached as soon as it is available, so that reruns skip the"
+    + " combinations already fitted with the same reference data and search settings; empty to disable",
+)
 parser.add_argument(
     "--ref_data_fname",
     default="two-ray-to-three-gpp-splm-calibration.csv",
@@ -59,6 +90,16 @@ parser.add_argument(
     default="FiguresTwoRayThreeGppChCalibration/",
     help="Output folder for the fit results figures",
 )
+parser.add_argument(
+    "--batch_max_samples",
+    default=2**20,
+    help="Maximum number of FTR samples generated at once when evaluating a batch of the search grid",
+)
+parser.add_argument(
+    "--benchmark",
+    default=False,
+    help="Whether to benchmark the batched search grid evaluation against the one-at-a-time evaluation",
+)
 parser.add_argument("--epsilon", default=1e-7, help="Tolerance value for the preliminary tests")
 parser.add_argument(
     "--preliminary_fit_test",
@@ -86,6 +127,17 @@ args = parser.parse_args()
 num_search_grid_params = int(args.num_search_grid_params)
 # Number of refinement local search runs to be carried out
 num_refinements = int(args.num_refinements)
+# Search used by the fit
+search_mode = args.search_mode
+# Number of values for each parameter of the coarse grid of the adaptive search
+num_adaptive_grid_params = int(args.num_adaptive_grid_params)
+# Anderson-Darling improvement, relative to the spread of the coarse grid measures, below which the
+# adaptive search stops
+ad_rel_tolerance = float(args.ad_rel_tolerance)
+# Number of fits to be run in parallel
+n_jobs = int(args.n_jobs)
+# Folder where each fit result is cached as soon as it is available
+cache_folder = args.cache_folder
 # Filename of the fit reference data, obtained from ns-3
 ref_data_fname = args.ref_data_fname
 # Filename of the fit results
@@ -94,6 +146,10 @@ fit_out_fname = args.fit_out_fname
 c_plus_plus_out_fname = args.c_plus_plus_out_fname
 # Output folder for the fit results figures
 figs_folder = args.figs_folder
+# Maximum number of FTR samples generated at once when evaluating a batch of the search grid
+batch_max_samples = int(args.batch_max_samples)
+# Whether to benchmark the batched search grid evaluation against the one-at-a-time evaluation
+benchmark = bool(args.benchmark)
 # Tolerance value for the preliminary tests
 epsilon = float(args.epsilon)
 # Whether to run preliminary tests which check the correctness of the script functions
@@ -172,6 +228,102 @@ class FtrParams:
         return f"m: {self.m}, sigma: {self.sigma}, k: {self.k}, delta: {self.delta}"
 
 
+def get_ftr_ecdf_batch(
+    m: np.ndarray,
+    sigma: np.ndarray,
+    k: np.ndarray,
+    delta: np.ndarray,
+    n_samples: int,
+    db=False,
+    rng=None,
+    base_samples=None,
+) -> np.ndarray:
+    """!  Returns the ECDFs for the FTR fading model, for a batch of parameter sets at once.
+    @param m: The m parameter of each set.
+    @param sigma: The sigma parameter of each set.
+    @param k: The K parameter of each set.
+    @param delta: The delta parameter of each set.
+    @param n_samples: The number of samples of each output ECDF
+    @param db: Whether to return the ECDFs with the gain expressed in dB
+    @param rng: The np.random.Generator to sample from, or None to use the global NumPy generator
+    @param base_samples: The base random draws, from draw_ftr_base_samples, to be transformed into the
+                         samples of every parameter set (common random numbers), or None to draw new
+                         samples for each parameter set
+    @returns An array of shape (number of parameter sets, n_samples), whose rows are the sorted samples
+             of the FTR fading model for each parameter set
+    """
+
+    if rng is None:
+        rng = np.random
+    if base_samples is not None:
+        assert len(base_samples["x"]) == n_samples
+    m, sigma, k, delta = (
+        np.asarray(param, dtype=float).reshape(-1, 1) for param in (m, sigma, k, delta)
+    )
+    assert np.all((delta >= 0) & (delta <= 1.0))
+    size = (m.shape[0], n_samples)
+
+    # Compute the specular components amplitudes from the FTR parameters
+    cmn_sqrt_term = np.sqrt(1 - delta**2)
+    v1 = np.sqrt(sigma) * np.sqrt(k * (1 - cmn_sqrt_term))
+    v2 = np.sqrt(sigma) * np.sqrt(k * (1 + cmn_sqrt_term))
+
+    if base_samples is None:
+        sqrt_gamma = np.sqrt(rng.gamma(shape=m, scale=1 / m, size=size))
+
+        # Sample the random phases of the specular components, which are uniformly distributed in [0, 2*PI]
+        phi1 = rng.uniform(low=0, high=1.0, size=size)
+        phi2 = rng.uniform(low=0, high=1.0, size=size)
+
+        # Sample the normal-distributed real and imaginary parts of the diffuse components
+        x = rng.normal(scale=np.sqrt(sigma), size=size)
+        y = rng.normal(scale=np.sqrt(sigma), size=size)
+    else:
+        # Transform the base draws: the Gamma variable by inverse transform sampling, so that
+        # nearby parameters yield nearby samples, and the normal variables by scaling
+        sqrt_gamma = np.sqrt(gammaincinv(m, base_samples["gamma"]) / m)
+        phi1 = base_samples["phi1"]
+        phi2 = base_samples["phi2"]
+        x = np.sqrt(sigma) * base_samples["x"]
+        y = np.sqrt(sigma) * base_samples["y"]
+
+    # Compute the channel response by combining the above terms
+    h = sqrt_gamma * (v1 * np.exp(1j * phi1) + v2 * np.exp(1j * phi2)) + (x + 1j * y)
+
+    # Compute the squared norms
+    power = np.square(h.real) + np.square(h.imag)
+
+    if db:
+        power = 10 * np.log10(power)
+
+    power.sort(axis=1)
+    return power
+
+
+def draw_ftr_base_samples(n_samples: int, rng=None) -> dict:
+    """!  Draws the base random variables of the FTR fading model, to be shared by all the parameter sets
+      evaluated with get_ftr_ecdf_batch (common random numbers). The objective of the fit then becomes a
+      deterministic function of the parameters, which optimizers can descend and stop on.
+    @param n_samples: The number of samples of the ECDFs
+    @param rng: The np.random.Generator to sample from, or None to use the global NumPy generator
+    @returns A dict with the uniform draws of the Gamma variable ("gamma") and of the phases ("phi1",
+             "phi2"), and the standard normal draws of the diffuse components ("x", "y")
+    """
+
+    if rng is None:
+        rng = np.random
+
+    # Keep the Gamma draws away from 0 and 1, where its inverse CDF is 0 and infinite
+    tiny = np.finfo(float).eps
+    return {
+        "gamma": np.clip(rng.uniform(low=0, high=1.0, size=n_samples), tiny, 1 - tiny),
+        "phi1": rng.uniform(low=0, high=1.0, size=n_samples),
+        "phi2": rng.uniform(low=0, high=1.0, size=n_samples),
+        "x": rng.normal(size=n_samples),
+        "y": rng.normal(size=n_samples),
+    }
+
+
 def get_ftr_ecdf(params: FtrParams, n_samples: int, db=False):
     """!  Returns the ECDF for the FTR fading model, for a given parameter grid.
     @param params: The FTR parameters grid.
@@ -193,33 +345,7 @@ def get_ftr_ecdf(params: FtrParams, n_samples: int, db=False):
     else:
         assert v1 == v2 == params.k
 
-    sqrt_gamma = np.sqrt(np.random.gamma(shape=params.m, scale=1 / params.m, size=n_samples))
-
-    # Sample the random phases of the specular components, which are uniformly distributed in [0, 2*PI]
-    phi1 = np.random.uniform(low=0, high=1.0, size=n_samples)
-    phi2 = np.random.uniform(low=0, high=1.0, size=n_samples)
-
-    # Sample the normal-distributed real and imaginary parts of the diffuse components
-    x = np.random.normal(scale=np.sqrt(params.sigma), size=n_samples)
-    y = np.random.normal(scale=np.sqrt(params.sigma), size=n_samples)
-
-    # Compute the channel response by combining the above terms
-    compl_phi1 = np.vectorize(complex)(np.cos(phi1), np.sin(phi1))
-    compl_phi2 = np.vectorize(complex)(np.cos(phi2), np.sin(phi2))
-    compl_xy = np.vectorize(complex)(x, y)
-    h = (
-        np.multiply(sqrt_gamma, compl_phi1) * v1
-        + np.multiply(sqrt_gamma, compl_phi2) * v2
-        + compl_xy
-    )
-
-    # Compute the squared norms
-    power = np.square(np.absolute(h))
-
-    if db:
-        power = 10 * np.log10(power)
-
-    return np.sort(power)
+    return get_ftr_ecdf_batch(params.m, params.sigma, params.k, params.delta, n_samples, db=db)[0]
 
 
 def compute_ftr_mean(params: FtrParams):
@@ -245,47 +371,57 @@ def compute_ftr_th_mean(params: FtrParams):
     return 2 * params.sigma * (1 + params.k)
 
 
-def compute_anderson_darling_measure(ref_ecdf: list, target_ecdf: list) -> float:
-    """!  Computes the Anderson-Darling measure for the specified reference and targets distributions.
-      In particular, the Anderson-Darling measure is defined as:
-      \f$A^2 = -N -S\f$, where \f$S = \sum_{i=1}^N \frac{2i - 1}{N} \left[ ln F(Y_i) + ln F(Y_{N + 1 - i}) \right]\f$.
-
-      See https://www.itl.nist.gov/div898/handbook/eda/section3/eda35e.htm for further details.
+def compute_anderson_darling_measure_batch(
+    ref_ecdf: np.ndarray, target_ecdfs: np.ndarray
+) -> np.ndarray:
+    """!  Computes the Anderson-Darling measure for the specified reference distribution and
+      a batch of target distributions at once. See compute_anderson_darling_measure.
 
-    @param ref_ecdf: The reference ECDF.
-    @param target_ecdf: The target ECDF we wish to match the reference distribution to.
-    @returns The Anderson-Darling measure for the specified reference and targets distributions.
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
+    @param target_ecdfs: The target ECDFs, represented as an array whose rows are sorted samples.
+    @returns The Anderson-Darling measure of each target distribution.
     """
 
-    assert len(ref_ecdf) == len(target_ecdf)
+    target_ecdfs = np.atleast_2d(target_ecdfs)
+    assert len(ref_ecdf) == target_ecdfs.shape[1]
 
     n = len(ref_ecdf)
     mult_factors = np.linspace(start=1, stop=n, num=n) * 2 + 1
-    ecdf_values = compute_ecdf_value(ref_ecdf, target_ecdf)
+    ecdf_values = compute_ecdf_value(ref_ecdf, target_ecdfs)
 
     # First and last elements of the ECDF may lead to NaNs
     with np.errstate(divide="ignore"):
-        log_a_plus_b = np.log(ecdf_values) + np.log(1 - np.flip(ecdf_values))
+        log_a_plus_b = np.log(ecdf_values) + np.log(1 - np.flip(ecdf_values, axis=-1))
 
-    valid_idxs = np.isfinite(log_a_plus_b)
-    A_sq = -np.dot(mult_factors[valid_idxs], log_a_plus_b[valid_idxs])
+    log_a_plus_b[~np.isfinite(log_a_plus_b)] = 0
+    A_sq = -(log_a_plus_b @ mult_factors)
 
     return A_sq
 
 
+def compute_anderson_darling_measure(ref_ecdf: list, target_ecdf: list) -> float:
+    """!  Computes the Anderson-Darling measure for the specified reference and targets distributions.
+      In particular, the Anderson-Darling measure is defined as:
+      \f$A^2 = -N -S\f$, where \f$S = \sum_{i=1}^N \frac{2i - 1}{N} \left[ ln F(Y_i) + ln F(Y_{N + 1 - i}) \right]\f$.
+
+      See https://www.itl.nist.gov/div898/handbook/eda/section3/eda35e.htm for further details.
+
+    @param ref_ecdf: The reference ECDF.
+    @param target_ecdf: The target ECDF we wish to match the reference distribution to.
+    @returns The Anderson-Darling measure for the specified reference and targets distributions.
+    """
+
+    return compute_anderson_darling_measure_batch(np.asarray(ref_ecdf), np.asarray(target_ecdf))[0]
+
+
 def compute_ecdf_value(ecdf: list, data_points: float) -> np.ndarray:
     """!  Given an ECDF and data points belonging to its domain, returns their associated EDCF value.
     @param ecdf: The ECDF, represented as a sorted list of samples.
-    @param data_points: A list of data points belonging to the same domain as the samples.
-    @returns The ECDF value of the domain points of the specified ECDF
+    @param data_points: An array of data points belonging to the same domain as the samples, of any shape.
+    @returns The ECDF value of the domain points of the specified ECDF, with the shape of data_points
     """
 
-    ecdf_values = []
-    for point in data_points:
-        idx = np.searchsorted(ecdf, point) / len(ecdf)
-        ecdf_values.append(idx)
-
-    return np.asarray(ecdf_values)
+    return np.searchsorted(ecdf, data_points) / len(ecdf)
 
 
 def get_sigma_from_k(k: float) -> float:
@@ -298,10 +434,185 @@ def get_sigma_from_k(k: float) -> float:
     return 1 / (2 + 2 * k)
 
 
-def fit_ftr_to_reference(
-    ref_data: pd.DataFrame, ref_params_combo: tuple, num_params: int, num_refinements: int
-) -> str:
-    """!  Estimate the FTR parameters yielding the closest ECDF to the reference one.
+def search_ftr_grid(
+    ref_ecdf: np.ndarray,
+    search_grid: dict,
+    batch_max_samples: int,
+    rng=None,
+    base_samples=None,
+    return_measures: bool = False,
+) -> tuple:
+    """!  Finds the FTR parameters of a search grid yielding the closest ECDF to the reference one.
+
+      The combinations of the grid are evaluated in batches, with get_ftr_ecdf_batch and
+      compute_anderson_darling_measure_batch, instead of one at a time.
+
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
+    @param search_grid: The values of the "m", "k" and "delta" parameters; all their combinations are evaluated,
+                        and sigma is determined from k, due to the unit-mean constraint.
+    @param batch_max_samples: The maximum number of FTR samples generated at once, which bounds the memory usage.
+    @param rng: The np.random.Generator to sample from, or None to use the global NumPy generator
+    @param base_samples: The common base random draws, or None to draw new samples for each combination,
+                         see get_ftr_ecdf_batch
+    @param return_measures: Whether to also return the Anderson-Darling measures of all the combinations.
+
+    @returns The best parameters, as an FtrParams object, and their Anderson-Darling measure.
+             The first best combination, in the order of itertools.product, is returned.
+             If return_measures is True, the array of the measures of all the combinations, in the order
+             of itertools.product, is returned as well.
+    """
+
+    m, k, delta = (
+        param.ravel()
+        for param in np.meshgrid(
+            search_grid["m"], search_grid["k"], search_grid["delta"], indexing="ij"
+        )
+    )
+    sigma = get_sigma_from_k(k)
+    n_samples = len(ref_ecdf)
+    batch_size = max(1, batch_max_samples // n_samples)
+
+    best_idx = None
+    best_ad = np.inf
+    all_ad_meas = []
+    for start in range(0, len(m), batch_size):
+        batch = slice(start, start + batch_size)
+        ftr_ecdfs = get_ftr_ecdf_batch(
+            m[batch],
+            sigma[batch],
+            k[batch],
+            delta[batch],
+            n_samples,
+            db=True,
+            rng=rng,
+            base_samples=base_samples,
+        )
+        ad_meas = compute_anderson_darling_measure_batch(ref_ecdf, ftr_ecdfs)
+        if return_measures:
+            all_ad_meas.append(ad_meas)
+        idx = np.argmin(ad_meas)
+        if ad_meas[idx] < best_ad:
+            best_idx = start + idx
+            best_ad = ad_meas[idx]
+
+    best_params = FtrParams()
+    if best_idx is not None:
+        best_params.m = m[best_idx]
+        best_params.k = k[best_idx]
+        best_params.delta = delta[best_idx]
+        best_params.sigma = sigma[best_idx]
+
+    if return_measures:
+        return best_params, best_ad, np.concatenate(all_ad_meas) if all_ad_meas else np.empty(0)
+    return best_params, best_ad
+
+
+def search_ftr_adaptive(
+    ref_ecdf: np.ndarray,
+    num_grid_params: int,
+    ad_rel_tolerance: float,
+    batch_max_samples: int,
+    rng=None,
+) -> tuple:
+    """!  Finds the FTR parameters yielding the closest ECDF to the reference one with few ECDF evaluations.
+
+      All the candidates are evaluated with the same base random draws (common random numbers), making the
+      Anderson-Darling measure a deterministic function of the parameters. A coarse grid locates the best
+      region, then a Nelder-Mead search over log10(m), log10(k) and delta, starting from a simplex of the
+      size of a grid cell, refines it until the Anderson-Darling measures of the simplex vertices differ by
+      less than ad_rel_tolerance times the spread of the measures of the grid, i.e., the difference between
+      their median and their minimum. The measure itself has a large offset, which depends on the number of
+      samples and not on the quality of the fit, so the tolerance cannot be relative to the measure.
+
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
+    @param num_grid_params: The number of values of each parameter in the coarse grid.
+    @param ad_rel_tolerance: The Anderson-Darling improvement, relative to the spread of the measures of the
+                             coarse grid, below which the search stops.
+    @param batch_max_samples: The maximum number of FTR samples generated at once, see search_ftr_grid.
+    @param rng: The np.random.Generator to draw the base samples from, or None to use the global NumPy generator
+
+    @returns The best parameters, as an FtrParams object, their Anderson-Darling measure, and the number of
+             evaluated parameter combinations.
+    """
+
+    n_samples = len(ref_ecdf)
+    base_samples = draw_ftr_base_samples(n_samples, rng)
+
+    # Same ranges as the grid search: log10(m) and log10(k) in [0.001, 4], delta in [0, 1]
+    bounds = [(0.001, 4), (0.001, 4), (0.0, 1.0)]
+    coarse_search_grid = {
+        "m": np.power(10, np.linspace(*bounds[0], num=num_grid_params)),
+        "k": np.power(10, np.linspace(*bounds[1], num=num_grid_params)),
+        "delta": np.linspace(*bounds[2], num=num_grid_params),
+    }
+    best_params, best_ad, grid_ad_meas = search_ftr_grid(
+        ref_ecdf,
+        coarse_search_grid,
+        batch_max_samples,
+        base_samples=base_samples,
+        return_measures=True,
+    )
+    num_evaluations = num_grid_params**3
+    ad_spread = np.median(grid_ad_meas) - best_ad
+
+    # The simplex may leave the bounds: clip its vertices to them instead of constraining the
+    # optimizer, whose simplex would otherwise collapse on the bounds
+    lower_bounds, upper_bounds = np.array(bounds).T
+
+    def objective(x):
+        x = np.clip(x, lower_bounds, upper_bounds)
+        m, k = np.power(10, x[:2])
+        ftr_ecdf = get_ftr_ecdf_batch(
+            m,
+            get_sigma_from_k(k),
+            k,
+            x[2],
+            n_samples,
+            db=True,
+            base_samples=base_samples,
+        )
+        return compute_anderson_darling_measure_batch(ref_ecdf, ftr_ecdf)[0]
+
+    # Initial simplex: the best grid point, and its neighbors along each axis, inside the bounds
+    x0 = np.clip(
+        [np.log10(best_params.m), np.log10(best_params.k), best_params.delta],
+        lower_bounds,
+        upper_bounds,
+    )
+    simplex = [x0]
+    for i, (lb, ub) in enumerate(bounds):
+        vertex = x0.copy()
+        step = (ub - lb) / max(1, num_grid_params - 1)
+        vertex[i] = x0[i] + step if x0[i] + step <= ub else x0[i] - step
+        simplex.append(vertex)
+
+    res = minimize(
+        objective,
+        x0,
+        method="Nelder-Mead",
+        options={
+            "initial_simplex": np.array(simplex),
+            "fatol": ad_rel_tolerance * ad_spread,
+            "xatol": np.inf,
+        },
+    )
+    num_evaluations += res.nfev
+
+    if res.fun < best_ad:
+        x = np.clip(res.x, lower_bounds, upper_bounds)
+        best_params = FtrParams()
+        best_params.m, best_params.k = np.power(10, x[:2])
+        best_params.delta = x[2]
+        best_params.sigma = get_sigma_from_k(best_params.k)
+        best_ad = res.fun
+
+    return best_params, best_ad, num_evaluations
+
+
+def search_ftr_refined_grid(
+    ref_ecdf: np.ndarray, num_params: int, num_refinements: int, batch_max_samples: int
+) -> FtrParams:
+    """!  Estimate the FTR parameters yielding the closest ECDF to the reference one, with search grids.
 
       Uses a global search to estimate the FTR parameters yielding the best fit to the reference ECDF.
       Then, the search is refined by repeating the procedure in the neighborhood of the parameters
@@ -309,24 +620,15 @@ def fit_ftr_to_reference(
       is the previous iteration best value, and the lower and upper bounds are the first lower and upper
       values which were previously considered, respectively.
 
-    @param ref_data: The reference data, represented as a DataFrame of samples.
-    @param ref_params_combo: The specific combination of simulation parameters corresponding
-                             to the reference ECDF
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
     @param num_params: The number of values of each parameter in the global and local search grids.
     @param num_refinements: The number of local refinement search to be carried out after the global search.
+    @param batch_max_samples: The maximum number of FTR samples generated at once, see search_ftr_grid.
 
     @returns An estimate of the FTR parameters yielding the closest ECDF to the reference one.
     """
 
-    # Retrieve the reference ECDF
-    ref_ecdf = ref_data.query(
-        "scen == @ref_params_combo[0] and cond == @ref_params_combo[1] and fc == @ref_params_combo[2]"
-    )
-
-    # Perform the fit
     n_samples = len(ref_ecdf)
-    best_params = FtrParams()
-    best_ad = np.inf
 
     # The m and K parameters can range in ]0, +inf[
     m_and_k_ub = 4
@@ -353,21 +655,7 @@ def fit_ftr_to_reference(
         # sigma determined from k, due to the unit-mean constraint
     }
 
-    for element in product(*coarse_search_grid.values()):
-        # Create FTR params object
-        params = FtrParams()
-        params.m = element[0]
-        params.k = element[1]
-        params.delta = element[2]
-        params.sigma = get_sigma_from_k(params.k)
-
-        # Retrieve the corresponding FTR ECDF
-        ftr_ecdf = get_ftr_ecdf(params, n_samples, db=True)
-        ad_meas = compute_anderson_darling_measure(ref_ecdf, ftr_ecdf)
-
-        if ad_meas < best_ad:
-            best_params = params
-            best_ad = ad_meas
+    best_params, best_ad = search_ftr_grid(ref_ecdf, coarse_search_grid, batch_max_samples)
 
     for _ in range(num_refinements):
         # Refine search in the neighborhood of the previously identified params
@@ -406,30 +694,233 @@ def fit_ftr_to_reference(
             min(1, best_params.delta + 1 / num_params) - max(0, best_params.delta - 1 / num_params)
         ) / n_samples
 
-        for element in product(*finer_search_grid.values()):
-            # Create FTR params object
-            params = FtrParams()
-            params.m = element[0]
-            params.k = element[1]
-            params.delta = element[2]
-            params.sigma = get_sigma_from_k(params.k)
+        params, ad_meas = search_ftr_grid(ref_ecdf, finer_search_grid, batch_max_samples)
+        if ad_meas < best_ad:
+            best_params = params
+            best_ad = ad_meas
 
-            # Retrieve the corresponding FTR ECDF
-            ftr_ecdf = get_ftr_ecdf(params, n_samples, db=True)
-            ad_meas = compute_anderson_darling_measure(ref_ecdf, ftr_ecdf)
+    return best_params
+
+
+def get_fit_cache_fname(cache_folder: str, ref_ecdf: np.ndarray, search_settings: dict) -> Path:
+    """!  Returns the name of the cache file of a fit, which depends only on its inputs.
+    @param cache_folder: The folder holding the cached fit results.
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
+    @param search_settings: The settings of the search which affect its result.
+    @returns The cache file name, named after the hash of the reference ECDF and of the search settings.
+    """
+
+    key = hashlib.sha256()
+    key.update(json.dumps(search_settings, sort_keys=True).encode())
+    key.update(np.ascontiguousarray(ref_ecdf, dtype=np.float64).tobytes())
+    return Path(cache_folder) / f"{key.hexdigest()}.json"
+
+
+def fit_ftr_to_reference(
+    ref_data: pd.DataFrame,
+    ref_params_combo: tuple,
+    num_params: int,
+    num_refinements: int,
+    batch_max_samples: int = 2**20,
+    search_mode: str = "grid",
+    num_adaptive_grid_params: int = 6,
+    ad_rel_tolerance: float = 1e-4,
+    cache_folder: str = None,
+) -> str:
+    """!  Estimate the FTR parameters yielding the closest ECDF to the reference one.
+
+      The search is either search_ftr_refined_grid, or search_ftr_adaptive, which needs far fewer
+      evaluations. If a cache folder is specified, the fitted parameters are stored in it as soon as the
+      search is over, and the search is skipped if the same reference ECDF was already fitted with the same
+      search settings, so that interrupted or partially changed calibrations can be resumed.
+
+    @param ref_data: The reference data, represented as a DataFrame of samples.
+    @param ref_params_combo: The specific combination of simulation parameters corresponding
+                             to the reference ECDF
+    @param num_params: The number of values of each parameter in the global and local search grids.
+    @param num_refinements: The number of local refinement search to be carried out after the global search.
+    @param batch_max_samples: The maximum number of FTR samples generated at once, see search_ftr_grid.
+    @param search_mode: The search to use, either "grid" or "adaptive".
+    @param num_adaptive_grid_params: The number of values of each parameter in the coarse grid of the
+                                     adaptive search.
+    @param ad_rel_tolerance: The Anderson-Darling improvement, relative to the spread of the measures of
+                             the coarse grid, below which the adaptive search stops.
+    @param cache_folder: The folder holding the cached fit results, or None to disable the cache.
+
+    @returns A line of the fit results file, with the estimate of the FTR parameters yielding the closest
+             ECDF to the reference one.
+    """
+
+    # Retrieve the reference ECDF
+    ref_ecdf = np.sort(
+        ref_data.query(
+            "scen == @ref_params_combo[0] and cond == @ref_params_combo[1] and fc == @ref_params_combo[2]"
+        )["gain"].to_numpy()
+    )
+
+    if search_mode == "adaptive":
+        search_settings = {
+            "search_mode": search_mode,
+            "num_adaptive_grid_params": num_adaptive_grid_params,
+            "ad_rel_tolerance": ad_rel_tolerance,
+            "ad_tolerance_reference": "grid_spread",
+        }
+    else:
+        search_settings = {
+            "search_mode": search_mode,
+            "num_params": num_params,
+            "num_refinements": num_refinements,
+        }
+
+    # Look up the cached result
+    cache_fname = None
+    if cache_folder:
+        cache_fname = get_fit_cache_fname(cache_folder, ref_ecdf, search_settings)
+        if cache_fname.exists():
+            with open(cache_fname, encoding="utf-8") as f:
+                cached = json.load(f)
+            best_params = FtrParams()
+            best_params.m = cached["m"]
+            best_params.sigma = cached["sigma"]
+            best_params.k = cached["k"]
+            best_params.delta = cached["delta"]
+            return format_ftr_fit_result(ref_params_combo, best_params)
 
-            if ad_meas < best_ad:
-                best_params = params
-                best_ad = ad_meas
+    # Perform the fit
+    if search_mode == "adaptive":
+        best_params, _, _ = search_ftr_adaptive(
+            ref_ecdf, num_adaptive_grid_params, ad_rel_tolerance, batch_max_samples
+        )
+    else:
+        best_params = search_ftr_refined_grid(
+            ref_ecdf, num_params, num_refinements, batch_max_samples
+        )
+
+    # Store the result, atomically so that an interrupted run does not leave a partial file behind
+    if cache_fname is not None:
+        cache_fname.parent.mkdir(parents=True, exist_ok=True)
+        tmp_fname = cache_fname.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_fname, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "m": float(best_params.m),
+                    "sigma": float(best_params.sigma),
+                    "k": float(best_params.k),
+                    "delta": float(best_params.delta),
+                },
+                f,
+            )
+        os.replace(tmp_fname, cache_fname)
+
+    return format_ftr_fit_result(ref_params_combo, best_params)
+
+
+def format_ftr_fit_result(ref_params_combo: tuple, params: FtrParams) -> str:
+    """!  Formats the result of the fit for a combination of simulation parameters, as a line of the
+      fit results file.
+    @param ref_params_combo: The specific combination of simulation parameters of the reference ECDF
+    @param params: The fitted FTR parameters.
+    @returns The line of the fit results file.
+    """
 
     out_str = (
         f"{ref_params_combo[0]}\t{ref_params_combo[1]}\t{ref_params_combo[2]}"
-        + f" \t{best_params.sigma}\t{best_params.k}\t{best_params.delta}\t{best_params.m}\n"
+        + f" \t{params.sigma}\t{params.k}\t{params.delta}\t{params.m}\n"
     )
 
     return out_str
 
 
+def benchmark_ftr_grid_search(
+    ref_ecdf: np.ndarray,
+    num_params: int,
+    batch_max_samples: int,
+    num_adaptive_grid_params: int,
+    ad_rel_tolerance: float,
+):
+    """!  Times the evaluation of a search grid one parameter combination at a time, with get_ftr_ecdf and
+      compute_anderson_darling_measure, and in batches, with search_ftr_grid, then compares the grid
+      search with the adaptive search, search_ftr_adaptive, and prints the results.
+    @param ref_ecdf: The reference ECDF, represented as a sorted array of samples.
+    @param num_params: The number of values of each parameter in the search grid.
+    @param batch_max_samples: The maximum number of FTR samples generated at once, see search_ftr_grid.
+    @param num_adaptive_grid_params: The number of values of each parameter in the coarse grid of the
+                                     adaptive search.
+    @param ad_rel_tolerance: The Anderson-Darling improvement, relative to the spread of the measures of
+                             the coarse grid, below which the adaptive search stops.
+    """
+
+    search_grid = {
+        "m": np.power(10, np.linspace(start=0.001, stop=4, num=num_params)),
+        "k": np.power(10, np.linspace(start=0.001, stop=4, num=num_params)),
+        "delta": np.linspace(start=0.0, stop=1.0, num=num_params),
+    }
+    num_combos = num_params**3
+
+    start = time.perf_counter()
+    best_ad = np.inf
+    for element in product(*search_grid.values()):
+        params = FtrParams()
+        params.m, params.k, params.delta = element
+        params.sigma = get_sigma_from_k(params.k)
+        best_ad = min(
+            best_ad,
+            compute_anderson_darling_measure(
+                ref_ecdf, get_ftr_ecdf(params, len(ref_ecdf), db=True)
+            ),
+        )
+    one_at_a_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_params, batch_best_ad, batch_ad_meas = search_ftr_grid(
+        ref_ecdf, search_grid, batch_max_samples, return_measures=True
+    )
+    batched = time.perf_counter() - start
+
+    print(f"Search grid of {num_combos} combinations, {len(ref_ecdf)} samples each")
+    print(
+        f"One at a time: {one_at_a_time:.3f} s ({1e6 * one_at_a_time / num_combos:.1f} us per combination),"
+        f" best AD {best_ad:.2f}"
+    )
+    print(
+        f"Batched: {batched:.3f} s ({1e6 * batched / num_combos:.1f} us per combination),"
+        f" best AD {batch_best_ad:.2f} ({batch_params})"
+    )
+    print(f"Speedup: {one_at_a_time / batched:.1f}x")
+
+    start = time.perf_counter()
+    adaptive_params, _, num_evaluations = search_ftr_adaptive(
+        ref_ecdf, num_adaptive_grid_params, ad_rel_tolerance, batch_max_samples
+    )
+    adaptive = time.perf_counter() - start
+
+    # Score both fits on the same new draws, as their own measures come from different draws
+    base_samples = draw_ftr_base_samples(len(ref_ecdf))
+    grid_ad, adaptive_ad = compute_anderson_darling_measure_batch(
+        ref_ecdf,
+        get_ftr_ecdf_batch(
+            [batch_params.m, adaptive_params.m],
+            [batch_params.sigma, adaptive_params.sigma],
+            [batch_params.k, adaptive_params.k],
+            [batch_params.delta, adaptive_params.delta],
+            len(ref_ecdf),
+            db=True,
+            base_samples=base_samples,
+        ),
+    )
+    # The measure has a large offset, so the excess is compared with the spread of the grid measures
+    ad_spread = np.median(batch_ad_meas) - batch_best_ad
+    print(
+        f"Adaptive: {adaptive:.3f} s, {num_evaluations} combinations, AD {adaptive_ad:.2f}"
+        f" vs {grid_ad:.2f} for the batched grid search ({adaptive_params})"
+    )
+    print(
+        f"Excess AD over the grid optimum: {adaptive_ad - grid_ad:.2f}"
+        f" ({100 * (adaptive_ad - grid_ad) / ad_spread:.2f}% of the spread of the grid measures,"
+        f" {ad_spread:.2f})"
+    )
+
+
 def append_ftr_params_to_cpp_string(text: str, params: FtrParams) -> str:
     text += f"TwoRaySpectrumPropagationLossModel::FtrParams({np.format_float_scientific(params.m)}, {np.format_float_scientific(params.sigma)}, \
                                                             {np.format_float_scientific(params.k)}, {np.format_float_scientific(params.delta)})"
@@ -538,6 +1029,20 @@ if __name__ == "__main__":
         assert np.all(np.abs(mean_list - np.float64(1.0)) < epsilon)
         assert np.all(np.abs(mean_th_list - np.float64(1.0)) < epsilon)
 
+    if benchmark:
+        # Benchmark on the reference data of the first parameters combination
+        params_comb = next(product(scenarios, is_los, frequencies))
+        ref_data = df.query(
+            "scen == @params_comb[0] and cond == @params_comb[1] and fc == @params_comb[2]"
+        )
+        benchmark_ftr_grid_search(
+            np.sort(ref_data["gain"].to_numpy()),
+            num_search_grid_params,
+            batch_max_samples,
+            num_adaptive_grid_params,
+            ad_rel_tolerance,
+        )
+
     if fit_ftr_to_threegpp:
         # Parallel search for the different simulation parameters combination
         with tqdm_joblib(
@@ -546,9 +1051,17 @@ if __name__ == "__main__":
                 total=(len(scenarios) * len(is_los) * len(frequencies)),
             )
         ) as progress_bar:
-            res = joblib.Parallel(n_jobs=10)(
+            res = joblib.Parallel(n_jobs=n_jobs)(
                 joblib.delayed(fit_ftr_to_reference)(
-                    df, params_comb, num_search_grid_params, num_refinements
+                    df,
+                    params_comb,
+                    num_search_grid_params,
+                    num_refinements,
+                    batch_max_samples,
+                    search_mode,
+                    num_adaptive_grid_params,
+                    ad_rel_tolerance,
+                    cache_folder,
                 )
                 for params_comb in product(scenarios, is_los, frequencies)
             )
@@ -0,0 +1,158 @@
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation;
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# Visualizer stress test
+#
+# Creates nNodes randomly walking nodes (10000 by default), spread over a
+# square of side areaSize meters and connected in pairs by point-to-point
+# links; nFlows of the pairs exchange UDP echo traffic.  The visualizer is
+# started automatically and prints the number of view updates (frames) and
+# of simulated seconds per second of wall-clock time, every reportInterval
+# seconds.
+#
+#   ./ns3 run src/visualizer/examples/visualizer-stress.py -- --nNodes=10000
+
+import sys
+import time
+from ctypes import c_double, c_int
+
+try:
+    from ns import ns
+except ModuleNotFoundError:
+    raise SystemExit(
+        "Error: ns3 Python module not found;"
+        " Python bindings may not be enabled"
+        " or your PYTHONPATH might not be properly configured"
+    )
+
+try:
+    import visualizer
+    from gi.repository import GLib
+except ImportError:
+    raise SystemExit("Error: this example needs the visualizer module and PyGObject")
+
+
+class FrameRateReporter(object):
+    """
+    Counts visualizer view updates and periodically prints the frame rate.
+    """
+
+    def __init__(self, report_interval):
+        self.report_interval = report_interval
+        self.frames = 0
+        self.start = None
+        self.viz = None
+
+    def on_update_view(self, viz):
+        self.frames += 1
+
+    def report(self):
+        now = time.time()
+        elapsed = now - self.start
+        snapshot = self.viz.simulation.snapshots.latest
+        rate = self.viz.throughput.rate()
+        print(
+            "visualizer-stress: %.2f frames/s, %.2f simulated s/s (simulation time %.1f s)"
+            % (
+                self.frames / elapsed,
+                rate or 0.0,
+                snapshot.time if snapshot is not None else 0.0,
+            )
+        )
+        self.frames = 0
+        self.start = now
+        return True
+
+    def __call__(self, viz):
+        self.viz = viz
+        viz.connect("update-view", self.on_update_view)
+        self.start = time.time()
+        GLib.timeout_add_seconds(self.report_interval, self.report)
+        viz.play_button.set_active(True)
+        return False
+
+
+def main(argv):
+    nNodes = c_int(10000)
+    nFlows = c_int(500)
+    areaSize = c_double(5000.0)
+    simTime = c_double(600.0)
+    reportInterval = c_int(5)
+    cmd = ns.CommandLine(__file__)
+    cmd.AddValue("nNodes", "Number of nodes (rounded down to an even number)", nNodes)
+    cmd.AddValue("nFlows", "Number of node pairs exchanging UDP echo traffic", nFlows)
+    cmd.AddValue["double"]("areaSize", "Side of the square the nodes walk in, in meters", areaSize)
+    cmd.AddValue["double"]("simTime", "Simulation time, in seconds", simTime)
+    cmd.AddValue("reportInterval", "Wall-clock seconds between frame rate reports", reportInterval)
+    cmd.Parse(argv)
+
+    n_pairs = nNodes.value // 2
+    n_flows = min(nFlows.value, n_pairs)
+    half = areaSize.value / 2
+
+    ns.GlobalValue.Bind("SimulatorImplementationType", ns.StringValue("ns3::VisualSimulatorImpl"))
+
+    nodes = ns.NodeContainer()
+    nodes.Create(2 * n_pairs)
+
+    mobility = ns.MobilityHelper()
+    mobility.SetPositionAllocator(
+        "ns3::RandomRectanglePositionAllocator",
+        "X",
+        ns.StringValue("ns3::UniformRandomVariable[Min=%f|Max=%f]" % (-half, half)),
+        "Y",
+        ns.StringValue("ns3::UniformRandomVariable[Min=%f|Max=%f]" % (-half, half)),
+    )
+    mobility.SetMobilityModel(
+        "ns3::RandomWalk2dMobilityModel",
+        "Bounds",
+        ns.RectangleValue(ns.Rectangle(-half, half, -half, half)),
+    )
+    mobility.Install(nodes)
+
+    internet = ns.InternetStackHelper()
+    internet.Install(nodes)
+
+    p2p = ns.PointToPointHelper()
+    p2p.SetDeviceAttribute("DataRate", ns.StringValue("1Mbps"))
+    p2p.SetChannelAttribute("Delay", ns.StringValue("2ms"))
+    ipv4 = ns.Ipv4AddressHelper()
+    ipv4.SetBase(ns.Ipv4Address("10.0.0.0"), ns.Ipv4Mask("255.255.255.252"))
+
+    port = 9
+    for pair in range(n_pairs):
+        devices = p2p.Install(nodes.Get(2 * pair), nodes.Get(2 * pair + 1))
+        interfaces = ipv4.Assign(devices)
+        ipv4.NewNetwork()
+        if pair >= n_flows:
+            continue
+        server = ns.UdpEchoServerHelper(port)
+        server_apps = server.Install(nodes.Get(2 * pair + 1))
+        server_apps.Start(ns.Seconds(0.0))
+        client = ns.UdpEchoClientHelper(interfaces.GetAddress(1).ConvertTo(), port)
+        client.SetAttribute("MaxPackets", ns.UintegerValue(1000000))
+        client.SetAttribute("Interval", ns.TimeValue(ns.Seconds(0.5)))
+        client.SetAttribute("PacketSize", ns.UintegerValue(512))
+        client_apps = client.Install(nodes.Get(2 * pair))
+        client_apps.Start(ns.Seconds(1.0 + pair * 0.001))
+
+    visualizer.add_initialization_hook(FrameRateReporter(reportInterval.value))
+
+    ns.Simulator.Stop(ns.Seconds(simTime.value))
+    ns.Simulator.Run()
+    ns.Simulator.Destroy()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
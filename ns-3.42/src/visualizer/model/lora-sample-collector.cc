@@ -0,0 +1,167 @@
+/*
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License version 2 as
+ * published by the Free Software Foundation;
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+ */
+
+#include "lora-sample-collector.h"
+
+#include "ns3/log.h"
+#include "ns3/node-list.h"
+#include "ns3/simulator.h"
+
+NS_LOG_COMPONENT_DEFINE("LoraSampleCollector");
+
+namespace ns3
+{
+
+LoraSampleCollector::LoraSampleCollector()
+{
+    NS_LOG_FUNCTION(this);
+}
+
+LoraSampleCollector::~LoraSampleCollector()
+{
+    NS_LOG_FUNCTION(this);
+    Disconnect();
+}
+
+void
+LoraSampleCollector::Disconnect()
+{
+    for (uint32_t device = 0; device < m_applications.size(); device++)
+    {
+        m_applications[device]->TraceDisconnectWithoutContext(
+            "Transmission",
+            MakeCallback(&LoraSampleCollector::NotifyTransmission, this, device));
+    }
+    m_applications.clear();
+}
+
+std::vector<uint32_t>
+LoraSampleCollector::ScanDevices(std::string applicationType)
+{
+    NS_LOG_FUNCTION(this << applicationType);
+    Disconnect();
+    m_mobility.clear();
+    m_nodeIds.clear();
+    m_spreadingFactors.clear();
+    m_changed.clear();
+    m_changedDevices.clear();
+    m_samples = Samples();
+
+    TypeId tid;
+    if (!TypeId::LookupByNameFailSafe(applicationType, &tid))
+    {
+        return m_nodeIds;
+    }
+    for (auto iter = NodeList::Begin(); iter != NodeList::End(); iter++)
+    {
+        Ptr<Node> node = *iter;
+        for (uint32_t appI = 0; appI < node->GetNApplications(); appI++)
+        {
+            Ptr<Application> application = node->GetApplication(appI);
+            if (!application->GetInstanceTypeId().IsChildOf(tid))
+            {
+                continue;
+            }
+            uint32_t device = m_applications.size();
+            if (!application->TraceConnectWithoutContext(
+                    "Transmission",
+                    MakeCallback(&LoraSampleCollector::NotifyTransmission, this, device)))
+            {
+                continue;
+            }
+            m_applications.push_back(application);
+            m_mobility.push_back(node->GetObject<MobilityModel>());
+            m_nodeIds.push_back(node->GetId());
+            m_spreadingFactors.push_back(0);
+            m_changed.push_back(false);
+        }
+    }
+    return m_nodeIds;
+}
+
+std::vector<uint32_t>
+LoraSampleCollector::ScanGateways(std::string gatewayType) const
+{
+    NS_LOG_FUNCTION(this << gatewayType);
+    std::vector<uint32_t> gateways;
+    TypeId tid;
+    if (!TypeId::LookupByNameFailSafe(gatewayType, &tid))
+    {
+        return gateways;
+    }
+    for (auto iter = NodeList::Begin(); iter != NodeList::End(); iter++)
+    {
+        if ((*iter)->GetObject<Object>(tid))
+        {
+            gateways.push_back((*iter)->GetId());
+        }
+    }
+    return gateways;
+}
+
+void
+LoraSampleCollector::NotifyTransmission(uint32_t device,
+                                        uint8_t spreadingFactor,
+                                        double txPower,
+                                        uint8_t outcome)
+{
+    NS_LOG_FUNCTION(this << device << +spreadingFactor << txPower << +outcome);
+    Vector position;
+    if (m_mobility[device])
+    {
+        position = m_mobility[device]->GetPosition();
+    }
+    m_samples.times.push_back(Simulator::Now().GetSeconds());
+    m_samples.nodeIds.push_back(m_nodeIds[device]);
+    m_samples.positionsX.push_back(position.x);
+    m_samples.positionsY.push_back(position.y);
+    m_samples.spreadingFactors.push_back(spreadingFactor);
+    m_samples.txPowers.push_back(txPower);
+    m_samples.outcomes.push_back(outcome);
+
+    if (m_spreadingFactors[device] != spreadingFactor)
+    {
+        m_spreadingFactors[device] = spreadingFactor;
+        if (!m_changed[device])
+        {
+            m_changed[device] = true;
+            m_changedDevices.push_back(device);
+        }
+    }
+}
+
+LoraSampleCollector::Samples
+LoraSampleCollector::GetSamples()
+{
+    Samples samples;
+    std::swap(samples, m_samples);
+    return samples;
+}
+
+std::vector<LoraSampleCollector::SpreadingFactorChange>
+LoraSampleCollector::GetSpreadingFactorChanges()
+{
+    std::vector<SpreadingFactorChange> changes;
+    changes.reserve(m_changedDevices.size());
+    for (uint32_t device : m_changedDevices)
+    {
+        changes.push_back({m_nodeIds[device], m_spreadingFactors[device]});
+        m_changed[device] = false;
+    }
+    m_changedDevices.clear();
+    return changes;
+}
+
+} // namespace ns3
@@ -0,0 +1,132 @@
+/*
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License version 2 as
+ * published by the Free Software Foundation;
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+ */
+#ifndef NS3_LORA_SAMPLE_COLLECTOR_H
+#define NS3_LORA_SAMPLE_COLLECTOR_H
+
+#include "ns3/application.h"
+#include "ns3/mobility-model.h"
+
+#include <string>
+#include <vector>
+
+namespace ns3
+{
+
+/**
+ * \ingroup visualizer
+ *
+ * \brief Buffers the uplink transmissions of LoRa end devices for the visualizer
+ * \internal
+ *
+ * Connects to the "Transmission" trace source of the end device
+ * applications, whose signature is (uint8_t spreadingFactor, double
+ * txPower, uint8_t outcome), and appends every transmission to a columnar
+ * buffer that the visualizer takes in one call per sample period.  Changes
+ * of spreading factor are coalesced per device, so that the visualizer only
+ * has to update the devices whose spreading factor changed.  Like PyViz,
+ * this class is only meant to be used by the visualizer.
+ **/
+class LoraSampleCollector
+{
+  public:
+    LoraSampleCollector();
+    ~LoraSampleCollector();
+
+    /// Transmission outcome, as reported by the trace source
+    enum Outcome
+    {
+        RECEIVED = 0, ///< received by the gateway
+        LOST = 1,     ///< below the sensitivity or SNR threshold of the gateway
+        COLLIDED = 2, ///< lost because of a collision
+    };
+
+    /// Samples structure, one row per transmission
+    struct Samples
+    {
+        std::vector<double> times;             ///< transmission time, in seconds
+        std::vector<uint32_t> nodeIds;         ///< node ID of the end device
+        std::vector<double> positionsX;        ///< x position of the end device, in meters
+        std::vector<double> positionsY;        ///< y position of the end device, in meters
+        std::vector<uint8_t> spreadingFactors; ///< spreading factor
+        std::vector<double> txPowers;          ///< transmission power, in dBm
+        std::vector<uint8_t> outcomes;         ///< transmission outcome (see Outcome)
+    };
+
+    /// SpreadingFactorChange structure
+    struct SpreadingFactorChange
+    {
+        uint32_t nodeId;          ///< node ID of the end device
+        uint32_t spreadingFactor; ///< spreading factor of its last transmission
+    };
+
+    /**
+     * Find the end device applications and connect to their Transmission
+     * trace source.
+     * \param applicationType the TypeId name of the end device applications
+     * \returns the IDs of the end device nodes
+     */
+    std::vector<uint32_t> ScanDevices(std::string applicationType);
+
+    /**
+     * Find the gateways, i.e. the nodes that aggregate an object of a given type.
+     * \param gatewayType the TypeId name of the gateway objects
+     * \returns the IDs of the gateway nodes
+     */
+    std::vector<uint32_t> ScanGateways(std::string gatewayType) const;
+
+    /**
+     * Take the transmissions recorded since the previous call.
+     * \returns the samples
+     */
+    Samples GetSamples();
+
+    /**
+     * Get the devices whose spreading factor changed since the previous
+     * call; a device whose spreading factor changed several times is only
+     * reported once, with its current spreading factor.
+     * \returns the changes
+     */
+    std::vector<SpreadingFactorChange> GetSpreadingFactorChanges();
+
+  private:
+    /**
+     * Disconnect from the trace sources of the tracked devices
+     */
+    void Disconnect();
+
+    /**
+     * Transmission trace sink
+     * \param device the device index
+     * \param spreadingFactor the spreading factor
+     * \param txPower the transmission power, in dBm
+     * \param outcome the transmission outcome
+     */
+    void NotifyTransmission(uint32_t device,
+                            uint8_t spreadingFactor,
+                            double txPower,
+                            uint8_t outcome);
+
+    std::vector<Ptr<Application>> m_applications; ///< application of each device
+    std::vector<Ptr<MobilityModel>> m_mobility;   ///< mobility model of each device, if any
+    std::vector<uint32_t> m_nodeIds;              ///< node ID of each device
+    std::vector<uint8_t> m_spreadingFactors;      ///< current spreading factor of each device
+    std::vector<bool> m_changed;                  ///< whether each device changed
+    std::vector<uint32_t> m_changedDevices;       ///< devices with m_changed set
+    Samples m_samples;                            ///< transmissions not taken yet
+};
+
+} // namespace ns3
+
+#endif /* NS3_LORA_SAMPLE_COLLECTOR_H */
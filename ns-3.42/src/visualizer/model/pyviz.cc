@@ -32,6 +32,7 @@
 #include "ns3/wifi-net-device.h"
 
 #include <cstdlib>
+#include <limits>
 #include <sstream>
 
 NS_LOG_COMPONENT_DEFINE("PyViz");
@@ -885,6 +886,91 @@ PyViz::SetNodesOfInterest(std::set<uint32_t> nodes)
     m_nodesOfInterest = nodes;
 }
 
+void
+PyViz::SetPositionNodes(std::vector<uint32_t> nodes)
+{
+    m_positionMobilityModels.clear();
+    m_positionMobilityModels.reserve(nodes.size());
+    for (uint32_t nodeId : nodes)
+    {
+        m_positionMobilityModels.push_back(NodeList::GetNode(nodeId)->GetObject<MobilityModel>());
+    }
+}
+
+std::vector<double>
+PyViz::GetNodePositions() const
+{
+    std::vector<double> positions;
+    positions.reserve(2 * m_positionMobilityModels.size());
+    for (const auto& mobility : m_positionMobilityModels)
+    {
+        if (mobility)
+        {
+            Vector position = mobility->GetPosition();
+            positions.push_back(position.x);
+            positions.push_back(position.y);
+        }
+        else
+        {
+            positions.push_back(std::numeric_limits<double>::quiet_NaN());
+            positions.push_back(std::numeric_limits<double>::quiet_NaN());
+        }
+    }
+    return positions;
+}
+
+std::vector<uint32_t>
+PyViz::GetMobileNodes() const
+{
+    std::vector<uint32_t> nodes;
+    for (auto iter = NodeList::Begin(); iter != NodeList::End(); iter++)
+    {
+        if ((*iter)->GetObject<MobilityModel>())
+        {
+            nodes.push_back((*iter)->GetId());
+        }
+    }
+    return nodes;
+}
+
+std::vector<PyViz::TopologyLink>
+PyViz::GetTopologyLinks(std::vector<std::string> wiredDeviceTypes, bool channelsAsNodes) const
+{
+    std::set<std::string> wiredTypes(wiredDeviceTypes.begin(), wiredDeviceTypes.end());
+    std::vector<TopologyLink> links;
+    for (auto iter = NodeList::Begin(); iter != NodeList::End(); iter++)
+    {
+        Ptr<Node> node = *iter;
+        for (uint32_t devI = 0; devI < node->GetNDevices(); devI++)
+        {
+            Ptr<NetDevice> device = node->GetDevice(devI);
+            if (wiredTypes.find(device->GetInstanceTypeId().GetName()) == wiredTypes.end())
+            {
+                continue;
+            }
+            Ptr<Channel> channel = device->GetChannel();
+            if (!channel)
+            {
+                continue;
+            }
+            if (channelsAsNodes && channel->GetNDevices() > 2)
+            {
+                links.push_back({node->GetId(), node->GetId(), channel});
+                continue;
+            }
+            for (std::size_t otherDevI = 0; otherDevI < channel->GetNDevices(); otherDevI++)
+            {
+                Ptr<Node> otherNode = channel->GetDevice(otherDevI)->GetNode();
+                if (otherNode != node)
+                {
+                    links.push_back({node->GetId(), otherNode->GetId(), nullptr});
+                }
+            }
+        }
+    }
+    return links;
+}
+
 std::vector<PyViz::NodeStatistics>
 PyViz::GetNodesStatistics() const
 {
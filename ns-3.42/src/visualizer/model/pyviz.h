@@ -27,6 +27,7 @@
 #include "ns3/ipv4-header.h"
 #include "ns3/ipv4-l3-protocol.h"
 #include "ns3/mac48-address.h"
+#include "ns3/mobility-model.h"
 #include "ns3/node.h"
 #include "ns3/nstime.h"
 #include "ns3/packet.h"
@@ -165,6 +166,46 @@ class PyViz
      */
     void SetNodesOfInterest(std::set<uint32_t> nodes);
 
+    /**
+     * Set the nodes whose positions are returned by GetNodePositions
+     * \param nodes the node IDs, in the order used by GetNodePositions
+     */
+    void SetPositionNodes(std::vector<uint32_t> nodes);
+
+    /**
+     * Get the current positions of all the nodes set with
+     * SetPositionNodes, in a single call
+     * \returns a contiguous array x0, y0, x1, y1, ... with one (x, y) pair
+     * per node (NaN for nodes without a mobility model)
+     */
+    std::vector<double> GetNodePositions() const;
+
+    /**
+     * Get the nodes that have a mobility model
+     * \returns the IDs of all the nodes aggregating a MobilityModel
+     */
+    std::vector<uint32_t> GetMobileNodes() const;
+
+    /// TopologyLink structure
+    struct TopologyLink
+    {
+        uint32_t node;        ///< node ID
+        uint32_t peer;        ///< ID of the node at the other end (unused if channel is set)
+        Ptr<Channel> channel; ///< shared channel represented as a node, or NULL
+    };
+
+    /**
+     * Walk the devices of all nodes and list the wired links between them,
+     * in a single call.  Each link is listed once from each end.
+     * \param wiredDeviceTypes TypeId names of the devices to consider; other
+     * devices (wireless, virtual, unknown) are skipped
+     * \param channelsAsNodes if true, channels with more than two devices are
+     * returned as links to the channel instead of links to every other node
+     * \returns the links
+     */
+    std::vector<TopologyLink> GetTopologyLinks(std::vector<std::string> wiredDeviceTypes,
+                                               bool channelsAsNodes) const;
+
     /// NetDeviceStatistics structure
     struct NetDeviceStatistics
     {
@@ -315,6 +356,8 @@ class PyViz
     std::map<uint32_t, Time> m_packetsOfInterest; ///< list of packet UIDs that will be monitored
     std::map<uint32_t, LastPacketsSample> m_lastPackets;                    ///< last packets
     std::map<uint32_t, std::vector<NetDeviceStatistics>> m_nodesStatistics; ///< node statistics
+    std::vector<Ptr<MobilityModel>>
+        m_positionMobilityModels; ///< mobility models of the nodes set with SetPositionNodes
 
     // Trace callbacks
     /**
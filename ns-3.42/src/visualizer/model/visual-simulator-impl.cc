@@ -23,6 +23,11 @@
 #include "ns3/default-simulator-impl.h"
 #include "ns3/log.h"
 #include "ns3/packet-metadata.h"
+#include "ns3/string.h"
+#include "ns3/uinteger.h"
+
+#include <iomanip>
+#include <sstream>
 
 namespace ns3
 {
@@ -44,6 +49,35 @@ GetDefaultSimulatorImplFactory()
     factory.SetTypeId(DefaultSimulatorImpl::GetTypeId());
     return factory;
 }
+
+/**
+ * Quote a string as a Python string literal
+ * \param str the string to quote
+ * \return the quoted string
+ */
+std::string
+PythonQuote(const std::string& str)
+{
+    std::ostringstream oss;
+    oss << '\'';
+    for (char c : str)
+    {
+        if (c == '\\' || c == '\'')
+        {
+            oss << '\\' << c;
+        }
+        else if (c == '\n')
+        {
+            oss << "\\n";
+        }
+        else
+        {
+            oss << c;
+        }
+    }
+    oss << '\'';
+    return oss.str();
+}
 } // namespace
 
 TypeId
@@ -59,7 +93,44 @@ VisualSimulatorImpl::GetTypeId()
                 "Factory for the underlying simulator implementation used by the visualizer.",
                 ObjectFactoryValue(GetDefaultSimulatorImplFactory()),
                 MakeObjectFactoryAccessor(&VisualSimulatorImpl::m_simulatorImplFactory),
-                MakeObjectFactoryChecker());
+                MakeObjectFactoryChecker())
+            .AddAttribute("OffscreenOutput",
+                          "If not empty, run the visualizer without a display and render "
+                          "frames to this location instead: a directory receiving one PNG "
+                          "file per frame, a single frame stream file if the name ends "
+                          "in '.frames', or a trace of the samples, for replay without the "
+                          "simulator, if it ends in '.vztrace'.",
+                          StringValue(""),
+                          MakeStringAccessor(&VisualSimulatorImpl::m_offscreenOutput),
+                          MakeStringChecker())
+            .AddAttribute("TraceOutput",
+                          "If not empty, the file where the visualizer window records the "
+                          "samples of every period, for replay without the simulator "
+                          "(python3 -m visualizer.replay <file>).",
+                          StringValue(""),
+                          MakeStringAccessor(&VisualSimulatorImpl::m_traceOutput),
+                          MakeStringChecker())
+            .AddAttribute("OffscreenInterval",
+                          "Simulated time between two frames rendered in offscreen mode.",
+                          TimeValue(Seconds(1)),
+                          MakeTimeAccessor(&VisualSimulatorImpl::m_offscreenInterval),
+                          MakeTimeChecker(MilliSeconds(1)))
+            .AddAttribute("OffscreenWidth",
+                          "Width, in pixels, of the frames rendered in offscreen mode.",
+                          UintegerValue(1024),
+                          MakeUintegerAccessor(&VisualSimulatorImpl::m_offscreenWidth),
+                          MakeUintegerChecker<uint32_t>(16))
+            .AddAttribute("OffscreenHeight",
+                          "Height, in pixels, of the frames rendered in offscreen mode.",
+                          UintegerValue(768),
+                          MakeUintegerAccessor(&VisualSimulatorImpl::m_offscreenHeight),
+                          MakeUintegerChecker<uint32_t>(16))
+            .AddAttribute("OffscreenStopTime",
+                          "Simulated time at which offscreen rendering stops; zero means "
+                          "run until the simulation itself is stopped.",
+                          TimeValue(Seconds(0)),
+                          MakeTimeAccessor(&VisualSimulatorImpl::m_offscreenStopTime),
+                          MakeTimeChecker());
     return tid;
 }
 
@@ -117,18 +188,30 @@ VisualSimulatorImpl::IsFinished() const
 void
 VisualSimulatorImpl::Run()
 {
+    std::ostringstream script;
+    script << "import visualizer\n";
+    if (m_offscreenOutput.empty())
+    {
+        script << "visualizer.start(" << PythonQuote(m_traceOutput) << ");\n";
+    }
+    else
+    {
+        script << std::setprecision(17) << "visualizer.start_offscreen("
+               << PythonQuote(m_offscreenOutput) << ", " << m_offscreenInterval.GetSeconds()
+               << ", " << m_offscreenWidth << ", " << m_offscreenHeight << ", "
+               << m_offscreenStopTime.GetSeconds() << ");\n";
+    }
+
     if (!Py_IsInitialized())
     {
         Py_Initialize();
-        PyRun_SimpleString("import visualizer\n"
-                           "visualizer.start();\n");
+        PyRun_SimpleString(script.str().c_str());
     }
     else
     {
         PyGILState_STATE __py_gil_state = PyGILState_Ensure();
 
-        PyRun_SimpleString("import visualizer\n"
-                           "visualizer.start();\n");
+        PyRun_SimpleString(script.str().c_str());
 
         PyGILState_Release(__py_gil_state);
     }
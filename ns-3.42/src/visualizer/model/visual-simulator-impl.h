@@ -20,8 +20,11 @@
 #ifndef VISUAL_SIMULATOR_IMPL_H
 #define VISUAL_SIMULATOR_IMPL_H
 
+#include "ns3/nstime.h"
 #include "ns3/simulator-impl.h"
 
+#include <string>
+
 namespace ns3
 {
 
@@ -39,6 +42,16 @@ namespace ns3
  * To use this class, run any ns-3 simulation with the command-line
  * argument --SimulatorImplementationType=ns3::VisualSimulatorImpl.
  * This causes the visualizer (PyViz) to start automatically.
+ *
+ * Setting the OffscreenOutput attribute, for instance with
+ * --ns3::VisualSimulatorImpl::OffscreenOutput=frames/, runs the
+ * visualizer without a display: frames are rendered with cairo at
+ * every OffscreenInterval of simulated time instead of being shown
+ * in a window.
+ *
+ * Sessions can be recorded, with the TraceOutput attribute or by
+ * naming the offscreen output '*.vztrace', and replayed later without
+ * the simulator.
  **/
 class VisualSimulatorImpl : public SimulatorImpl
 {
@@ -83,6 +96,12 @@ class VisualSimulatorImpl : public SimulatorImpl
   private:
     Ptr<SimulatorImpl> m_simulator;       ///< the simulator implementation
     ObjectFactory m_simulatorImplFactory; ///< simulator implementation factory
+    std::string m_offscreenOutput;        ///< offscreen frame output; empty for the GUI
+    Time m_offscreenInterval;             ///< simulated time between offscreen frames
+    uint32_t m_offscreenWidth;            ///< offscreen frame width, in pixels
+    uint32_t m_offscreenHeight;           ///< offscreen frame height, in pixels
+    Time m_offscreenStopTime;             ///< simulated time at which offscreen rendering stops
+    std::string m_traceOutput;            ///< trace recorded by the GUI; empty for none
 };
 
 } // namespace ns3
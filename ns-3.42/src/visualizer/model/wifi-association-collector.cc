@@ -0,0 +1,149 @@
+/*
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License version 2 as
+ * published by the Free Software Foundation;
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+ */
+
+#include "wifi-association-collector.h"
+
+#include "ns3/ap-wifi-mac.h"
+#include "ns3/log.h"
+#include "ns3/node-list.h"
+
+NS_LOG_COMPONENT_DEFINE("WifiAssociationCollector");
+
+namespace ns3
+{
+
+WifiAssociationCollector::WifiAssociationCollector()
+{
+    NS_LOG_FUNCTION(this);
+}
+
+WifiAssociationCollector::~WifiAssociationCollector()
+{
+    NS_LOG_FUNCTION(this);
+    Disconnect();
+}
+
+void
+WifiAssociationCollector::Disconnect()
+{
+    for (uint32_t station = 0; station < m_stationMacs.size(); station++)
+    {
+        m_stationMacs[station]->TraceDisconnectWithoutContext(
+            "Assoc",
+            MakeCallback(&WifiAssociationCollector::NotifyAssoc, this, station));
+        m_stationMacs[station]->TraceDisconnectWithoutContext(
+            "DeAssoc",
+            MakeCallback(&WifiAssociationCollector::NotifyDeAssoc, this, station));
+    }
+    m_stationMacs.clear();
+}
+
+std::vector<WifiAssociationCollector::Station>
+WifiAssociationCollector::ScanStations()
+{
+    NS_LOG_FUNCTION(this);
+    Disconnect();
+    m_apNodeIds.clear();
+    m_changed.clear();
+    m_changedStations.clear();
+    m_apNodes.clear();
+
+    std::vector<Station> stations;
+    for (auto iter = NodeList::Begin(); iter != NodeList::End(); iter++)
+    {
+        Ptr<Node> node = *iter;
+        for (uint32_t devI = 0; devI < node->GetNDevices(); devI++)
+        {
+            Ptr<WifiNetDevice> device = DynamicCast<WifiNetDevice>(node->GetDevice(devI));
+            if (!device)
+            {
+                continue;
+            }
+            Ptr<WifiMac> mac = device->GetMac();
+            if (Ptr<StaWifiMac> staMac = DynamicCast<StaWifiMac>(mac))
+            {
+                uint32_t station = m_stationMacs.size();
+                staMac->TraceConnectWithoutContext(
+                    "Assoc",
+                    MakeCallback(&WifiAssociationCollector::NotifyAssoc, this, station));
+                staMac->TraceConnectWithoutContext(
+                    "DeAssoc",
+                    MakeCallback(&WifiAssociationCollector::NotifyDeAssoc, this, station));
+                m_stationMacs.push_back(staMac);
+                m_apNodeIds.push_back(-1);
+                m_changed.push_back(false);
+                stations.push_back({node->GetId(), device});
+            }
+            else if (DynamicCast<ApWifiMac>(mac))
+            {
+                m_apNodes[Mac48Address::ConvertFrom(device->GetAddress())] = node->GetId();
+                m_apNodes[mac->GetAddress()] = node->GetId();
+            }
+        }
+    }
+
+    // report the stations that are already associated
+    for (uint32_t station = 0; station < m_stationMacs.size(); station++)
+    {
+        Ptr<StaWifiMac> staMac = m_stationMacs[station];
+        if (staMac->IsAssociated())
+        {
+            NotifyAssoc(station, staMac->GetBssid(0));
+        }
+    }
+    return stations;
+}
+
+void
+WifiAssociationCollector::NotifyAssoc(uint32_t station, Mac48Address bssid)
+{
+    NS_LOG_FUNCTION(this << station << bssid);
+    auto ap = m_apNodes.find(bssid);
+    SetAssociation(station, ap == m_apNodes.end() ? -1 : static_cast<int32_t>(ap->second));
+}
+
+void
+WifiAssociationCollector::NotifyDeAssoc(uint32_t station, Mac48Address bssid)
+{
+    NS_LOG_FUNCTION(this << station << bssid);
+    SetAssociation(station, -1);
+}
+
+void
+WifiAssociationCollector::SetAssociation(uint32_t station, int32_t apNodeId)
+{
+    m_apNodeIds[station] = apNodeId;
+    if (!m_changed[station])
+    {
+        m_changed[station] = true;
+        m_changedStations.push_back(station);
+    }
+}
+
+std::vector<WifiAssociationCollector::AssociationChange>
+WifiAssociationCollector::GetChanges()
+{
+    std::vector<AssociationChange> changes;
+    changes.reserve(m_changedStations.size());
+    for (uint32_t station : m_changedStations)
+    {
+        changes.push_back({station, m_apNodeIds[station]});
+        m_changed[station] = false;
+    }
+    m_changedStations.clear();
+    return changes;
+}
+
+} // namespace ns3
@@ -0,0 +1,111 @@
+/*
+ * This program is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License version 2 as
+ * published by the Free Software Foundation;
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+ */
+#ifndef NS3_WIFI_ASSOCIATION_COLLECTOR_H
+#define NS3_WIFI_ASSOCIATION_COLLECTOR_H
+
+#include "ns3/mac48-address.h"
+#include "ns3/sta-wifi-mac.h"
+#include "ns3/wifi-net-device.h"
+
+#include <map>
+#include <vector>
+
+namespace ns3
+{
+
+/**
+ * \ingroup visualizer
+ *
+ * \brief Collects the association changes of Wi-Fi stations for the visualizer
+ * \internal
+ *
+ * Connects to the Assoc and DeAssoc trace sources of every StaWifiMac,
+ * and keeps the stations whose association changed since the last call
+ * to GetChanges, so that the visualizer only has to update those.  Like
+ * PyViz, this class is only meant to be used by the visualizer.
+ **/
+class WifiAssociationCollector
+{
+  public:
+    WifiAssociationCollector();
+    ~WifiAssociationCollector();
+
+    /// Station structure
+    struct Station
+    {
+        uint32_t nodeId;           ///< node ID
+        Ptr<WifiNetDevice> device; ///< station device
+    };
+
+    /// AssociationChange structure
+    struct AssociationChange
+    {
+        uint32_t station; ///< station index, in ScanStations order
+        int32_t apNodeId; ///< ID of the node of the AP, or -1 if not associated to a known AP
+    };
+
+    /**
+     * Find all the Wi-Fi stations and access points, and start tracking
+     * the association of the stations.  The current association of every
+     * station is reported by the next call to GetChanges.
+     * \returns the stations
+     */
+    std::vector<Station> ScanStations();
+
+    /**
+     * Get the association changes since the previous call; a station
+     * whose association changed several times is only reported once, with
+     * its current state.
+     * \returns the changes
+     */
+    std::vector<AssociationChange> GetChanges();
+
+  private:
+    /**
+     * Disconnect from the trace sources of the tracked stations
+     */
+    void Disconnect();
+
+    /**
+     * Assoc trace sink
+     * \param station the station index
+     * \param bssid the address of the AP
+     */
+    void NotifyAssoc(uint32_t station, Mac48Address bssid);
+
+    /**
+     * DeAssoc trace sink
+     * \param station the station index
+     * \param bssid the address of the AP
+     */
+    void NotifyDeAssoc(uint32_t station, Mac48Address bssid);
+
+    /**
+     * Record the association state of a station
+     * \param station the station index
+     * \param apNodeId the AP node ID, or -1
+     */
+    void SetAssociation(uint32_t station, int32_t apNodeId);
+
+    std::vector<Ptr<StaWifiMac>> m_stationMacs; ///< MAC of each station
+    std::vector<int32_t> m_apNodeIds;            ///< current AP node ID of each station
+    std::vector<bool> m_changed;                 ///< whether each station changed
+    std::vector<uint32_t> m_changedStations;     ///< stations with m_changed set
+    std::map<Mac48Address, uint32_t> m_apNodes;  ///< AP address -> AP node ID
+};
+
+} // namespace ns3
+
+#endif /* NS3_WIFI_ASSOCIATION_COLLECTOR_H */
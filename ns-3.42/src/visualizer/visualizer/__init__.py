@@ -1,3 +1,21 @@
-from ns import *
+import importlib
 
-from .core import add_initialization_hook, register_plugin, set_bounds, start
+# The entry points are imported on first use, with the ns-3 bindings they
+# need, so that the modules which do not need the simulator (replay.py,
+# trace.py, headless.py) can be imported without the bindings nor the GUI.
+_ENTRY_POINTS = {
+    "add_initialization_hook": "core",
+    "register_plugin": "core",
+    "set_bounds": "core",
+    "start": "core",
+    "start_offscreen": "offscreen",
+}
+
+
+def __getattr__(name):
+    module_name = _ENTRY_POINTS.get(name)
+    if module_name is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    # makes 'ns' a builtin, which the modules of the package rely on
+    importlib.import_module("ns")
+    return getattr(importlib.import_module("." + module_name, __name__), name)
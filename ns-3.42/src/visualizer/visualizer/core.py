@@ -1,12 +1,6 @@
 # -*- Mode: python; coding: utf-8 -*-
 from ctypes import c_double
 
-LAYOUT_ALGORITHM = "neato"  # ['neato'|'dot'|'twopi'|'circo'|'fdp'|'nop']
-REPRESENT_CHANNELS_AS_NODES = 1
-DEFAULT_NODE_SIZE = 1.0  # default node size in meters
-DEFAULT_TRANSMISSIONS_MEMORY = (
-    5  # default number of of past intervals whose transmissions are remembered
-)
 BITRATE_FONT_SIZE = 10
 
 # internal constants, normally not meant to be changed
@@ -49,6 +43,11 @@ except ImportError:
     print("PyGObject is required by the visualizer module and could not be found")
     exit(1)
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 try:
     import svgitem
 except ImportError:
@@ -61,7 +60,7 @@ try:
     gi.require_foreign("cairo")
     from gi.repository import Gdk, GLib, GObject, GooCanvas, Gtk, Pango
 
-    from . import hud
+    from . import hud, lod
 except ImportError as e:
     _import_error = e
 else:
@@ -72,13 +71,30 @@ try:
 except ImportError:
     ipython_view = None
 
+from .headless import (
+    DEFAULT_NODE_SIZE,
+    DEFAULT_TRANSMISSIONS_MEMORY,
+    LAYOUT_ALGORITHM,
+    REPRESENT_CHANNELS_AS_NODES,
+    average_drop_samples,
+    average_transmission_samples,
+    drop_sample_totals,
+    get_node_positions,
+    merge_sample_totals,
+    scan_topology,
+    take_snapshot,
+    transmission_sample_totals,
+)
+from .snapshot import SnapshotQueue, ThroughputMeter
+from .spatial_index import GridSpatialIndex
+from .trace import TraceWriter, get_topology
+
 from .base import (
     PIXELS_PER_METER,
     InformationWindow,
     Link,
     PyVizObject,
     load_plugins,
-    lookup_netdevice_traits,
     plugins,
     register_plugin,
     transform_distance_canvas_to_simulation,
@@ -439,13 +455,16 @@ class Node(PyVizObject):
             )
             self._update_position()
 
-    def set_position(self, x, y):
+    def set_position(self, x, y, update_bounds=True):
         """!
         Set position function.
 
         @param self: class object.
         @param x: x position
         @param y: y position
+        @param update_bounds: whether to grow the canvas bounds to include
+        the new position; callers moving many nodes at once pass False and
+        grow the bounds once for all of them
         @return none
         """
         self.canvas_item.set_property("center_x", x)
@@ -459,25 +478,10 @@ class Node(PyVizObject):
         if self._label_canvas_item is not None:
             self._label_canvas_item.set_properties(x=x, y=(y + self._size * 3))
 
-        # If the location of the point is now beyond the bounds of the
-        # canvas then those bounds now need to be increased
-        try:
-            bounds = self.visualizer.canvas.get_bounds()
-
-            (min_x, min_y, max_x, max_y) = bounds
+        self.visualizer.nodes_spatial_index.update(self, x, y)
 
-            min_x = min(x, min_x)
-            min_y = min(y, min_y)
-            max_x = max(x, max_x)
-            max_y = max(y, max_y)
-
-            new_bounds = (min_x, min_y, max_x, max_y)
-
-            if new_bounds != bounds:
-                self.visualizer.canvas.set_bounds(*new_bounds)
-        except TypeError:
-            # bug 2969:  GooCanvas.Canvas.get_bounds() inconsistency
-            pass
+        if update_bounds:
+            self.visualizer.grow_canvas_bounds(x, y, x, y)
 
     def get_position(self):
         """!
@@ -653,10 +657,16 @@ class WiredLink(Link):
 
 ## SimulationThread
 class SimulationThread(threading.Thread):
+    """
+    Runs the simulation one sample period at a time, up to target_time, and
+    publishes a Snapshot after each period.  The simulation keeps running
+    while the view draws, up to SNAPSHOT_RUN_AHEAD periods ahead of it.
+    """
+
     ## @var viz
     #  Visualizer object
     ## @var lock
-    #  thread lock
+    #  thread lock, held while the simulator runs
     ## @var go
     #  thread event
     ## @var target_time
@@ -665,8 +675,14 @@ class SimulationThread(threading.Thread):
     #  quit indicator
     ## @var sim_helper
     #  helper function
-    ## @var pause_messages
-    #  pause messages
+    ## @var snapshots
+    #  SnapshotQueue of the snapshots not yet consumed by the view
+    ## @var lock_wanted
+    #  event set by the view to stop the simulation after the current period
+    ## @var recorder
+    #  TraceWriter recording the snapshots, or None
+    ## @var _position_nodes
+    #  tuple of the indices of the nodes whose positions are sampled
     def __init__(self, viz):
         """!
         Initializer function.
@@ -683,7 +699,15 @@ class SimulationThread(threading.Thread):
         self.target_time = 0  # in seconds
         self.quit = False
         self.sim_helper = ns.PyViz()
-        self.pause_messages = []
+        self.snapshots = SnapshotQueue()
+        self.lock_wanted = threading.Event()
+        self.recorder = None
+        self._position_nodes = ()
+        # let the view run while the simulator runs
+        try:
+            ns.PyViz.SimulatorRunUntil.__release_gil__ = True
+        except AttributeError:
+            pass
 
     def set_nodes_of_interest(self, nodes):
         """!
@@ -699,6 +723,21 @@ class SimulationThread(threading.Thread):
         finally:
             self.lock.release()
 
+    def set_position_nodes(self, nodes):
+        """!
+        Set the nodes whose positions are sampled in the snapshots.
+
+        @param self: class object.
+        @param nodes: tuple of node indices, the rows of Snapshot.positions
+        @return none
+        """
+        self.lock.acquire()
+        try:
+            self.sim_helper.SetPositionNodes(list(nodes))
+            self._position_nodes = nodes
+        finally:
+            self.lock.release()
+
     def run(self):
         """!
         Initializer function.
@@ -707,30 +746,25 @@ class SimulationThread(threading.Thread):
         @return none
         """
         while not self.quit:
-            # print "sim: Wait for go"
             self.go.wait()  # wait until the main (view) thread gives us the go signal
             self.go.clear()
-            if self.quit:
-                break
-            # self.go.clear()
-            # print "sim: Acquire lock"
-            self.lock.acquire()
-            try:
-                if 0:
-                    if ns3.Simulator.IsFinished():
-                        self.viz.play_button.set_sensitive(False)
+            while not self.quit and not self.lock_wanted.is_set():
+                self.lock.acquire()
+                try:
+                    now = ns.Simulator.Now().GetSeconds()
+                    if now >= self.target_time or ns.Simulator.IsFinished():
                         break
-                # print "sim: Current time is %f; Run until: %f" % (ns3.Simulator.Now ().GetSeconds (), self.target_time)
-                # if ns3.Simulator.Now ().GetSeconds () > self.target_time:
-                #    print "skipping, model is ahead of view!"
-                self.sim_helper.SimulatorRunUntil(ns.Seconds(self.target_time))
-                # print "sim: Run until ended at current time: ", ns3.Simulator.Now ().GetSeconds ()
-                self.pause_messages.extend(self.sim_helper.GetPauseMessages())
-                GLib.idle_add(self.viz.update_model, priority=PRIORITY_UPDATE_MODEL)
-                # print "sim: Run until: ", self.target_time, ": finished."
-            finally:
-                self.lock.release()
-            # print "sim: Release lock, loop."
+                    self.sim_helper.SimulatorRunUntil(
+                        ns.Seconds(min(self.target_time, now + self.viz.sample_period))
+                    )
+                    snapshot = take_snapshot(self.sim_helper, self._position_nodes)
+                finally:
+                    self.lock.release()
+                if self.recorder is not None:
+                    self.recorder.write(snapshot)
+                # blocks only if the view is SNAPSHOT_RUN_AHEAD periods behind
+                if not self.snapshots.publish(snapshot) or snapshot.pause_messages:
+                    break
 
 
 ## ShowTransmissionsMode
@@ -768,12 +802,14 @@ class Visualizer(GObject.GObject):
                     Gtk.Menu,
                 ),
             ),
-            # signal emitted after every simulation period (SAMPLE_PERIOD seconds of simulated time)
+            # signal emitted after every simulation period (SAMPLE_PERIOD seconds of simulated time),
+            # with viz.snapshot set to the Snapshot of that period;
             # the simulation lock is acquired while the signal is emitted
             "simulation-periodic-update": (GObject.SignalFlags.RUN_LAST, None, ()),
             # signal emitted right after the topology is scanned
             "topology-scanned": (GObject.SignalFlags.RUN_LAST, None, ()),
-            # signal emitted when it's time to update the view objects
+            # signal emitted when it's time to update the view objects;
+            # the simulation lock is not held, use viz.simulation.snapshots.latest
             "update-view": (GObject.SignalFlags.RUN_LAST, None, ()),
         }
 
@@ -788,7 +824,12 @@ class Visualizer(GObject.GObject):
         Visualizer.INSTANCE = self
         super(Visualizer, self).__init__()
         self.nodes = {}  # node index -> Node
+        self.nodes_spatial_index = GridSpatialIndex()  # canvas position -> Node
+        self._mobile_nodes = None  # nodes with mobility, in PyViz.SetPositionNodes order
+        self._position_nodes = None  # tuple of the indices of self._mobile_nodes
+        self._mobile_positions = None  # last canvas positions of self._mobile_nodes
         self.channels = {}  # id(ns3.Channel) -> Channel
+        self.links = []  # WiredLink objects
         self.window = None  # toplevel window
         self.canvas = None  # GooCanvas.Canvas
         self.time_label = None  # Gtk.Label
@@ -806,9 +847,12 @@ class Visualizer(GObject.GObject):
         self.speed = 1.0
         self.information_windows = []
         self._transmission_arrows = []
-        self._last_transmissions = []
+        self._last_transmissions = []  # Snapshot.transmissions of the last periods
         self._drop_arrows = []
-        self._last_drops = []
+        self._last_drops = []  # Snapshot.drops of the last periods
+        self._pending_snapshots = []  # snapshots not yet seen by simulation-periodic-update
+        self.snapshot = None  # Snapshot of the current simulation-periodic-update
+        self.throughput = ThroughputMeter()  # simulated seconds per wall-clock second
         self._show_transmissions_mode = None
         self.set_show_transmissions_mode(ShowTransmissionsMode.ALL)
         self._panning_state = None
@@ -1076,6 +1120,7 @@ class Visualizer(GObject.GObject):
         self.nodes_group.raise_(self.channels_group)
 
         self.hud = hud.Axes(self)
+        self.cluster_layer = lod.ClusterLayer(self)
 
         hbox = Gtk.HBox()
         hbox.show()
@@ -1197,81 +1242,7 @@ class Visualizer(GObject.GObject):
         self.window.show()
 
     def scan_topology(self):
-        print("scanning topology: %i nodes..." % (ns.NodeList.GetNNodes(),))
-        graph = pygraphviz.AGraph()
-        seen_nodes = 0
-        for nodeI in range(ns.NodeList.GetNNodes()):
-            seen_nodes += 1
-            if seen_nodes == 100:
-                print(
-                    "scan topology... %i nodes visited (%.1f%%)"
-                    % (nodeI, 100 * nodeI / ns.NodeList.GetNNodes())
-                )
-                seen_nodes = 0
-            node = ns.NodeList.GetNode(nodeI)
-            node_name = "Node %i" % nodeI
-            node_view = self.get_node(nodeI)
-
-            mobility = node.GetObject[ns.MobilityModel]()
-            if mobility:
-                node_view.set_color("red")
-                pos = node.GetObject[ns.MobilityModel]().__deref__().GetPosition()
-                node_view.set_position(*transform_point_simulation_to_canvas(pos.x, pos.y))
-                # print "node has mobility position -> ", "%f,%f" % (pos.x, pos.y)
-            else:
-                graph.add_node(node_name)
-
-            for devI in range(node.GetNDevices()):
-                device = node.GetDevice(devI)
-                device_traits = lookup_netdevice_traits(type(device.__deref__()))
-                if device_traits.is_wireless:
-                    continue
-                if device_traits.is_virtual:
-                    continue
-                channel = device.GetChannel()
-                if channel.GetNDevices() > 2:
-                    if REPRESENT_CHANNELS_AS_NODES:
-                        # represent channels as white nodes
-                        if mobility is None:
-                            channel_name = "Channel %s" % id(channel)
-                            graph.add_edge(node_name, channel_name)
-                        self.get_channel(channel)
-                        self.create_link(self.get_node(nodeI), self.get_channel(channel))
-                    else:
-                        # don't represent channels, just add links between nodes in the same channel
-                        for otherDevI in range(channel.GetNDevices()):
-                            otherDev = channel.GetDevice(otherDevI)
-                            otherNode = otherDev.GetNode()
-                            otherNodeView = self.get_node(otherNode.GetId())
-                            if otherNode is not node:
-                                if mobility is None and not otherNodeView.has_mobility:
-                                    other_node_name = "Node %i" % otherNode.GetId()
-                                    graph.add_edge(node_name, other_node_name)
-                                self.create_link(self.get_node(nodeI), otherNodeView)
-                else:
-                    for otherDevI in range(channel.GetNDevices()):
-                        otherDev = channel.GetDevice(otherDevI)
-                        otherNode = otherDev.GetNode()
-                        otherNodeView = self.get_node(otherNode.GetId())
-                        if otherNode is not node:
-                            if mobility is None and not otherNodeView.has_mobility:
-                                other_node_name = "Node %i" % otherNode.GetId()
-                                graph.add_edge(node_name, other_node_name)
-                            self.create_link(self.get_node(nodeI), otherNodeView)
-
-        print("scanning topology: calling graphviz layout")
-        graph.layout(LAYOUT_ALGORITHM)
-        for node in graph.iternodes():
-            # print node, "=>", node.attr['pos']
-            node_type, node_id = node.split(" ")
-            pos_x, pos_y = [float(s) for s in node.attr["pos"].split(",")]
-            if node_type == "Node":
-                obj = self.nodes[int(node_id)]
-            elif node_type == "Channel":
-                obj = self.channels[int(node_id)]
-            obj.set_position(pos_x, pos_y)
-
-        print("scanning topology: all done.")
+        scan_topology(self, self.simulation.sim_helper)
         self.emit("topology-scanned")
 
     def get_node(self, index):
@@ -1280,6 +1251,7 @@ class Visualizer(GObject.GObject):
         except KeyError:
             node = Node(self, index)
             self.nodes[index] = node
+            self._mobile_nodes = None
             self.nodes_group.add_child(node.canvas_item, -1)
             node.canvas_item.connect("button-press-event", self.on_node_button_press_event, node)
             node.canvas_item.connect(
@@ -1298,40 +1270,99 @@ class Visualizer(GObject.GObject):
 
     def create_link(self, node, node_or_channel):
         link = WiredLink(node, node_or_channel)
+        self.links.append(link)
         self.links_group.add_child(link.canvas_item, -1)
         link.canvas_item.lower(None)
 
     def update_view(self):
         # print "update_view"
 
-        self.time_label.set_text("Time: %f s" % ns.Simulator.Now().GetSeconds())
+        snapshot = self.simulation.snapshots.latest
+        if snapshot is not None:
+            rate = self.throughput.rate()
+            if rate is None:
+                self.time_label.set_text("Time: %f s" % snapshot.time)
+            else:
+                self.time_label.set_text("Time: %f s (%.2f sim s/s)" % (snapshot.time, rate))
 
         self._update_node_positions()
 
-        # Update information
-        for info_win in self.information_windows:
-            info_win.update()
-
+        self.cluster_layer.update()
         self._update_transmissions_view()
         self._update_drops_view()
 
         self.emit("update-view")
 
+    def grow_canvas_bounds(self, min_x, min_y, max_x, max_y):
+        """!
+        Grow the canvas bounds, if needed, to include a rectangle.
+
+        @param self: class object.
+        @param min_x: minimum x of the rectangle
+        @param min_y: minimum y of the rectangle
+        @param max_x: maximum x of the rectangle
+        @param max_y: maximum y of the rectangle
+        @return none
+        """
+        # If the location of the point is now beyond the bounds of the
+        # canvas then those bounds now need to be increased
+        try:
+            bounds = self.canvas.get_bounds()
+
+            new_bounds = (
+                min(min_x, bounds[0]),
+                min(min_y, bounds[1]),
+                max(max_x, bounds[2]),
+                max(max_y, bounds[3]),
+            )
+
+            if new_bounds != tuple(bounds):
+                self.canvas.set_bounds(*new_bounds)
+        except TypeError:
+            # bug 2969:  GooCanvas.Canvas.get_bounds() inconsistency
+            pass
+
     def _update_node_positions(self):
-        for node in self.nodes.values():
-            if node.has_mobility:
-                ns3_node = ns.NodeList.GetNode(node.node_index)
-                mobility = ns3_node.GetObject[ns.MobilityModel]()
-                if mobility:
-                    pos = ns3_node.GetObject[ns.MobilityModel]().__deref__().GetPosition()
-                    x, y = transform_point_simulation_to_canvas(pos.x, pos.y)
+        if self._mobile_nodes is None:
+            self._mobile_nodes = [node for node in self.nodes.values() if node.has_mobility]
+            self._position_nodes = tuple(node.node_index for node in self._mobile_nodes)
+            self.simulation.set_position_nodes(self._position_nodes)
+            self._mobile_positions = None
+        if not self._mobile_nodes:
+            return
+
+        snapshot = self.simulation.snapshots.latest
+        if snapshot is None or snapshot.position_nodes is not self._position_nodes:
+            # not sampled yet
+            return
+        positions = snapshot.positions
+        if numpy is not None:
+            # only nodes that actually moved need their canvas items updated
+            valid = ~numpy.isnan(positions[:, 0])
+            if self._mobile_positions is None:
+                moved = valid
+            else:
+                moved = valid & numpy.any(positions != self._mobile_positions, axis=1)
+            self._mobile_positions = positions
+            for i in numpy.flatnonzero(moved).tolist():
+                x, y = positions[i]
+                self._mobile_nodes[i].set_position(x, y, update_bounds=False)
+            if moved.any():
+                min_x, min_y = positions[moved].min(axis=0)
+                max_x, max_y = positions[moved].max(axis=0)
+                self.grow_canvas_bounds(min_x, min_y, max_x, max_y)
+        else:
+            for node, (x, y) in zip(self._mobile_nodes, positions):
+                if not math.isnan(x):
                     node.set_position(x, y)
-                    if node is self.follow_node:
-                        hadj = self._scrolled_window.get_hadjustment()
-                        vadj = self._scrolled_window.get_vadjustment()
-                        px, py = self.canvas.convert_to_pixels(x, y)
-                        hadj.set_value(px - hadj.get_page_size() / 2)
-                        vadj.set_value(py - vadj.get_page_size() / 2)
+
+        if self.follow_node is not None and self.follow_node.has_mobility:
+            x, y = self.follow_node.get_position()
+            hadj = self._scrolled_window.get_hadjustment()
+            vadj = self._scrolled_window.get_vadjustment()
+            px, py = self.canvas.convert_to_pixels(x, y)
+            hadj.set_value(px - hadj.get_page_size() / 2)
+            vadj.set_value(py - vadj.get_page_size() / 2)
 
     def center_on_node(self, node):
         if isinstance(node, ns.Node):
@@ -1350,47 +1381,72 @@ class Visualizer(GObject.GObject):
         hadj.set_value(px - hadj.get_page_size() / 2)
         vadj.set_value(py - vadj.get_page_size() / 2)
 
-    def update_model(self):
-        self.simulation.lock.acquire()
-        try:
-            self.emit("simulation-periodic-update")
-        finally:
-            self.simulation.lock.release()
-
-    def do_simulation_periodic_update(self):
+    def _consume_snapshot(self, snapshot):
         smooth_factor = int(self.transmissions_smoothing_adjustment.get_value() * 10)
 
-        transmissions = self.simulation.sim_helper.GetTransmissionSamples()
-        self._last_transmissions.append(transmissions)
+        self._last_transmissions.append(snapshot.transmissions)
         while len(self._last_transmissions) > smooth_factor:
             self._last_transmissions.pop(0)
 
-        drops = self.simulation.sim_helper.GetPacketDropSamples()
-        self._last_drops.append(drops)
+        self._last_drops.append(snapshot.drops)
         while len(self._last_drops) > smooth_factor:
             self._last_drops.pop(0)
 
-    def _get_label_over_line_position(self, pos1_x, pos1_y, pos2_x, pos2_y):
+    def get_visible_region(self):
+        """!
+        Get the part of the canvas currently shown in the window.
+
+        @param self: class object.
+        @return (x1, y1, x2, y2) visible rectangle, in canvas coordinates
+        """
         hadj = self._scrolled_window.get_hadjustment()
         vadj = self._scrolled_window.get_vadjustment()
-        bounds_x1, bounds_y1 = self.canvas.convert_from_pixels(hadj.get_value(), vadj.get_value())
-        bounds_x2, bounds_y2 = self.canvas.convert_from_pixels(
+        x1, y1 = self.canvas.convert_from_pixels(hadj.get_value(), vadj.get_value())
+        x2, y2 = self.canvas.convert_from_pixels(
             hadj.get_value() + hadj.get_page_size(), vadj.get_value() + vadj.get_page_size()
         )
+        return x1, y1, x2, y2
+
+    def _get_label_over_line_position(self, pos1_x, pos1_y, pos2_x, pos2_y):
+        bounds_x1, bounds_y1, bounds_x2, bounds_y2 = self.get_visible_region()
         ns.PyViz.LineClipping(
             bounds_x1, bounds_y1, bounds_x2, bounds_y2, pos1_x, pos1_y, pos2_x, pos2_y
         )
         return (pos1_x.value + pos2_x.value) / 2, (pos1_y.value + pos2_y.value) / 2
 
+    def _get_visible_transmissions(self, transmissions_average):
+        """!
+        Select the transmissions crossing the visible region.
+
+        @param self: class object.
+        @param transmissions_average: dict mapping (transmitter id, receiver id)
+        to (total bytes, sample count)
+        @return list of (x1, y1, x2, y2, total bytes, sample count)
+        """
+        view_x1, view_y1, view_x2, view_y2 = self.get_visible_region()
+        visible_nodes = set(
+            node.node_index
+            for node in self.nodes_spatial_index.query_rect(view_x1, view_y1, view_x2, view_y2)
+        )
+
+        transmissions = []
+        for (transmitter_id, receiver_id), (rx_bytes, rx_count) in transmissions_average.items():
+            pos1_x, pos1_y = self.get_node(transmitter_id).get_position()
+            pos2_x, pos2_y = self.get_node(receiver_id).get_position()
+            if transmitter_id not in visible_nodes and receiver_id not in visible_nodes:
+                # both ends are off-screen, but the line between them may still cross the view
+                if (
+                    max(pos1_x, pos2_x) < view_x1
+                    or min(pos1_x, pos2_x) > view_x2
+                    or max(pos1_y, pos2_y) < view_y1
+                    or min(pos1_y, pos2_y) > view_y2
+                ):
+                    continue
+            transmissions.append((pos1_x, pos1_y, pos2_x, pos2_y, rx_bytes, rx_count))
+        return transmissions
+
     def _update_transmissions_view(self):
-        transmissions_average = {}
-        for transmission_set in self._last_transmissions:
-            for transmission in transmission_set:
-                key = (transmission.transmitter.GetId(), transmission.receiver.GetId())
-                rx_bytes, count = transmissions_average.get(key, (0, 0))
-                rx_bytes += transmission.bytes
-                count += 1
-                transmissions_average[key] = rx_bytes, count
+        transmissions_average = merge_sample_totals(self._last_transmissions)
 
         old_arrows = self._transmission_arrows
         for arrow, label in old_arrows:
@@ -1400,9 +1456,12 @@ class Visualizer(GObject.GObject):
 
         k = self.node_size_adjustment.get_value() / 5
 
-        for (transmitter_id, receiver_id), (rx_bytes, rx_count) in transmissions_average.items():
-            transmitter = self.get_node(transmitter_id)
-            receiver = self.get_node(receiver_id)
+        if self.cluster_layer.active:
+            transmissions = self.cluster_layer.aggregate_transmissions(transmissions_average)
+        else:
+            transmissions = self._get_visible_transmissions(transmissions_average)
+
+        for pos1_x, pos1_y, pos2_x, pos2_y, rx_bytes, rx_count in transmissions:
             try:
                 arrow, label = old_arrows.pop()
             except IndexError:
@@ -1426,8 +1485,6 @@ class Visualizer(GObject.GObject):
             line_width = max(0.1, math.log(float(rx_bytes) / rx_count / self.sample_period) * k)
             arrow.set_property("line-width", line_width)
 
-            pos1_x, pos1_y = transmitter.get_position()
-            pos2_x, pos2_y = receiver.get_position()
             points = GooCanvas.CanvasPoints.new(2)
             points.set_point(0, pos1_x, pos1_y)
             points.set_point(1, pos2_x, pos2_y)
@@ -1477,14 +1534,7 @@ class Visualizer(GObject.GObject):
         self._transmission_arrows = new_arrows + old_arrows
 
     def _update_drops_view(self):
-        drops_average = {}
-        for drop_set in self._last_drops:
-            for drop in drop_set:
-                key = drop.transmitter.GetId()
-                drop_bytes, count = drops_average.get(key, (0, 0))
-                drop_bytes += drop.bytes
-                count += 1
-                drops_average[key] = drop_bytes, count
+        drops_average = merge_sample_totals(self._last_drops)
 
         old_arrows = self._drop_arrows
         for arrow, label in old_arrows:
@@ -1493,14 +1543,22 @@ class Visualizer(GObject.GObject):
         new_arrows = []
 
         # get the coordinates for the edge of screen
-        vadjustment = self._scrolled_window.get_vadjustment()
-        bottom_y = vadjustment.get_value() + vadjustment.get_page_size()
-        dummy, edge_y = self.canvas.convert_from_pixels(0, bottom_y)
+        view_x1, dummy, view_x2, edge_y = self.get_visible_region()
 
         k = self.node_size_adjustment.get_value() / 5
 
-        for transmitter_id, (drop_bytes, drop_count) in drops_average.items():
-            transmitter = self.get_node(transmitter_id)
+        if self.cluster_layer.active:
+            drops = self.cluster_layer.aggregate_drops(drops_average)
+        else:
+            drops = []
+            for transmitter_id, (drop_bytes, drop_count) in drops_average.items():
+                # drop arrows point down to the bottom edge of the screen, so they
+                # are visible only for nodes above it and horizontally on screen
+                pos_x, pos_y = self.get_node(transmitter_id).get_position()
+                if view_x1 <= pos_x <= view_x2 and pos_y <= edge_y:
+                    drops.append((pos_x, pos_y, drop_bytes, drop_count))
+
+        for pos1_x, pos1_y, drop_bytes, drop_count in drops:
             try:
                 arrow, label = old_arrows.pop()
             except IndexError:
@@ -1525,7 +1583,6 @@ class Visualizer(GObject.GObject):
                 "line-width",
                 max(0.1, math.log(float(drop_bytes) / drop_count / self.sample_period) * k),
             )
-            pos1_x, pos1_y = transmitter.get_position()
             pos2_x, pos2_y = pos1_x, edge_y
             points = GooCanvas.CanvasPoints.new(2)
             points.set_point(0, pos1_x, pos1_y)
@@ -1551,18 +1608,45 @@ class Visualizer(GObject.GObject):
     def update_view_timeout(self):
         # print "view: update_view_timeout called at real time ", time.time()
 
-        # while the simulator is busy, run the gtk event loop
-        while not self.simulation.lock.acquire(False):
-            while Gtk.events_pending():
-                Gtk.main_iteration()
-        pause_messages = self.simulation.pause_messages
-        self.simulation.pause_messages = []
-        try:
-            self.update_view()
-            self.simulation.target_time = ns.Simulator.Now().GetSeconds() + self.sample_period
-            # print "view: target time set to %f" % self.simulation.target_time
-        finally:
-            self.simulation.lock.release()
+        # take whatever the simulation thread published, without waiting for it
+        snapshots = self.simulation.snapshots.drain()
+        pause_messages = []
+        for snapshot in snapshots:
+            self._consume_snapshot(snapshot)
+            pause_messages.extend(snapshot.pause_messages)
+        self._pending_snapshots.extend(snapshots)
+        latest = self.simulation.snapshots.latest
+        if snapshots:
+            self.throughput.add(latest.time)
+
+        self.update_view()
+
+        # plugins and information windows query the simulator directly: run
+        # them only while the simulation thread is between two periods, and
+        # otherwise ask it to stop after the current one
+        if self.simulation.lock.acquire(False):
+            self.simulation.lock_wanted.clear()
+            try:
+                pending_snapshots = self._pending_snapshots
+                self._pending_snapshots = []
+                for snapshot in pending_snapshots:
+                    self.snapshot = snapshot
+                    self.emit("simulation-periodic-update")
+                for info_win in self.information_windows:
+                    info_win.update()
+            finally:
+                self.simulation.lock.release()
+        else:
+            self.simulation.lock_wanted.set()
+
+        # advance one period per tick, but let the simulation get at most
+        # SNAPSHOT_RUN_AHEAD periods ahead of what is shown
+        latest_time = latest.time if latest is not None else 0.0
+        self.simulation.target_time = min(
+            self.simulation.target_time + self.sample_period,
+            latest_time + self.sample_period * self.simulation.snapshots.capacity,
+        )
+        # print "view: target time set to %f" % self.simulation.target_time
 
         if pause_messages:
             # print pause_messages
@@ -1580,6 +1664,7 @@ class Visualizer(GObject.GObject):
         # if we're paused, stop the update timer
         if not self.play_button.get_active():
             self._update_timeout_id = None
+            self.throughput.reset()
             return False
 
         # print "view: self.simulation.go.set()"
@@ -1609,8 +1694,11 @@ class Visualizer(GObject.GObject):
             GLib.source_remove(self._update_timeout_id)
             self._update_timeout_id = None
         self.simulation.quit = True
+        self.simulation.snapshots.close()
         self.simulation.go.set()
         self.simulation.join()
+        if self.simulation.recorder is not None:
+            self.simulation.recorder.close()
         Gtk.main_quit()
 
     def _monkey_patch_ipython(self):
@@ -1670,8 +1758,12 @@ class Visualizer(GObject.GObject):
 
         return False
 
-    def start(self):
+    def start(self, trace_output=""):
         self.scan_topology()
+        if trace_output:
+            self.simulation.recorder = TraceWriter(
+                trace_output, get_topology(self, self.sample_period)
+            )
         self.window.connect("delete-event", self._quit)
         # self._start_update_timer()
         GLib.timeout_add(200, self.autoscale_view)
@@ -1835,6 +1927,14 @@ class Visualizer(GObject.GObject):
         hadj = self._scrolled_window.get_hadjustment()
         vadj = self._scrolled_window.get_vadjustment()
         x, y = self.canvas.convert_from_pixels(hadj.get_value() + x, vadj.get_value() + y)
+        # nodes are drawn on top, so look them up in the spatial index first
+        # instead of letting the canvas hit-test every item
+        node = self.nodes_spatial_index.nearest(
+            x, y, transform_distance_simulation_to_canvas(self.node_size_adjustment.get_value())
+        )
+        if node is not None:
+            node.tooltip_query(tooltip)
+            return True
         item = self.canvas.get_item_at(x, y, True)
         # print "items at (%f, %f): %r | keyboard_mode=%r" % (x, y, item, keyboard_mode)
         if not item:
@@ -1985,7 +2085,14 @@ def set_bounds(x1, y1, x2, y2):
 _run_once = False
 
 
-def start():
+def start(trace_output=""):
+    """
+    Run the simulation with the visualizer.
+
+    @param trace_output: if not empty, the file where the snapshot of
+    every sample period is recorded, for replay without the simulator
+    (see visualizer/replay.py)
+    """
     global _run_once
     if _run_once:
         return
@@ -2002,4 +2109,4 @@ def start():
     for hook, args in initialization_hooks:
         GLib.idle_add(hook, viz, *args)
     ns.Packet.EnablePrinting()
-    viz.start()
+    viz.start(trace_output)
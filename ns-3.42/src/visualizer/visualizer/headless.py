@@ -0,0 +1,233 @@
+# -*- Mode: python; coding: utf-8 -*-
+"""
+Parts of the visualizer that need neither the GUI libraries (GTK,
+GooCanvas, cairo, graphviz) nor, until they are called, the ns-3 bindings:
+canvas geometry, the sampling of the simulation into Snapshots and the
+topology scan.  They are shared by the GUI (core.py), the offscreen
+renderer (offscreen.py) and the trace replay (replay.py), so that the
+latter two work without a display and the replay without the simulator.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import layout
+from .snapshot import Snapshot, copy_node_statistics
+
+LAYOUT_ALGORITHM = "neato"  # ['neato'|'dot'|'twopi'|'circo'|'fdp'|'nop']
+REPRESENT_CHANNELS_AS_NODES = 1
+DEFAULT_NODE_SIZE = 1.0  # default node size in meters
+DEFAULT_TRANSMISSIONS_MEMORY = (
+    5  # default number of of past intervals whose transmissions are remembered
+)
+PIXELS_PER_METER = 3.0  # pixels-per-meter, at 100% zoom level
+
+
+def transform_distance_simulation_to_canvas(d):
+    return d * PIXELS_PER_METER
+
+
+def transform_point_simulation_to_canvas(x, y):
+    return x * PIXELS_PER_METER, y * PIXELS_PER_METER
+
+
+def transform_distance_canvas_to_simulation(d):
+    return d / PIXELS_PER_METER
+
+
+def transform_point_canvas_to_simulation(x, y):
+    return x / PIXELS_PER_METER, y / PIXELS_PER_METER
+
+
+def get_node_positions(sim_helper):
+    """!
+    Fetch, in a single call, the positions of the nodes registered with
+    PyViz.SetPositionNodes.
+
+    @param sim_helper: the PyViz helper.
+    @return canvas positions, as a numpy array of shape (n, 2) or, if numpy
+    is not available, a list of (x, y) tuples; nodes without mobility get NaN
+    """
+    positions = sim_helper.GetNodePositions()
+    count = len(positions)
+    if numpy is not None:
+        if count == 0:
+            return numpy.empty((0, 2))
+        array = numpy.frombuffer(positions.data(), dtype=numpy.float64, count=count)
+        return array.reshape(-1, 2) * PIXELS_PER_METER
+    return [
+        transform_point_simulation_to_canvas(positions[i], positions[i + 1])
+        for i in range(0, count, 2)
+    ]
+
+
+def take_snapshot(sim_helper, position_nodes):
+    """!
+    Copy the state sampled during the last sample period into a Snapshot.
+
+    @param sim_helper: the PyViz helper.
+    @param position_nodes: tuple of the node indices registered with
+    PyViz.SetPositionNodes
+    @return the Snapshot
+    """
+    positions = ()
+    if position_nodes:
+        positions = get_node_positions(sim_helper)
+        if numpy is not None:
+            positions.flags.writeable = False
+    return Snapshot(
+        time=ns.Simulator.Now().GetSeconds(),
+        position_nodes=position_nodes,
+        positions=positions,
+        transmissions=transmission_sample_totals(sim_helper.GetTransmissionSamples()),
+        drops=drop_sample_totals(sim_helper.GetPacketDropSamples()),
+        node_statistics=copy_node_statistics(sim_helper.GetNodesStatistics()),
+        pause_messages=tuple(str(message) for message in sim_helper.GetPauseMessages()),
+    )
+
+
+def transmission_sample_totals(transmission_set):
+    """!
+    Copy the transmission samples of one sample period into a dict.
+
+    @param transmission_set: PyViz transmission sample list.
+    @return dict mapping (transmitter id, receiver id) to bytes
+    """
+    totals = {}
+    for transmission in transmission_set:
+        key = (transmission.transmitter.GetId(), transmission.receiver.GetId())
+        totals[key] = totals.get(key, 0) + transmission.bytes
+    return totals
+
+
+def drop_sample_totals(drop_set):
+    """!
+    Copy the packet drop samples of one sample period into a dict.
+
+    @param drop_set: PyViz packet drop sample list.
+    @return dict mapping transmitter id to dropped bytes
+    """
+    totals = {}
+    for drop in drop_set:
+        key = drop.transmitter.GetId()
+        totals[key] = totals.get(key, 0) + drop.bytes
+    return totals
+
+
+def merge_sample_totals(totals_sets):
+    """!
+    Accumulate per period sample totals over several sample periods.
+
+    @param totals_sets: iterable of dicts mapping a key to bytes, one per period.
+    @return dict mapping the keys to (total bytes, sample count)
+    """
+    merged = {}
+    for totals in totals_sets:
+        for key, sample_bytes in totals.items():
+            total_bytes, count = merged.get(key, (0, 0))
+            merged[key] = total_bytes + sample_bytes, count + 1
+    return merged
+
+
+def average_transmission_samples(sample_sets):
+    """!
+    Accumulate transmission samples over several sample periods.
+
+    @param sample_sets: iterable of PyViz transmission sample lists, one per period.
+    @return dict mapping (transmitter id, receiver id) to (total bytes, sample count)
+    """
+    return merge_sample_totals(transmission_sample_totals(s) for s in sample_sets)
+
+
+def average_drop_samples(sample_sets):
+    """!
+    Accumulate packet drop samples over several sample periods.
+
+    @param sample_sets: iterable of PyViz packet drop sample lists, one per period.
+    @return dict mapping transmitter id to (total dropped bytes, sample count)
+    """
+    return merge_sample_totals(drop_sample_totals(s) for s in sample_sets)
+
+
+def scan_topology(viz, sim_helper):
+    """!
+    Scan the ns-3 topology and lay it out on a visualizer.
+
+    Works with any object providing the get_node/get_channel/create_link
+    interface of L{Visualizer}, so that the GUI and the offscreen renderer
+    share the same topology walk.  The devices and channels are walked by
+    the PyViz helper in a single call; the layout of the wired nodes is
+    cached on disk per topology (see L{layout.cached_layout}), and falls
+    back to graphviz when NumPy is not available.
+
+    @param viz: the visualizer (GUI or offscreen) to populate.
+    @param sim_helper: the PyViz helper.
+    @return none
+    """
+    # needs the ns-3 bindings, which the callers of scan_topology have loaded
+    from .netdevices import netdevice_traits
+
+    n_nodes = ns.NodeList.GetNNodes()
+    print("scanning topology: %i nodes..." % (n_nodes,))
+
+    mobile_nodes = set(sim_helper.GetMobileNodes())
+    layout_objects = {}
+    for nodeI in range(n_nodes):
+        node_view = viz.get_node(nodeI)
+        node_view._has_mobility = nodeI in mobile_nodes
+        if node_view._has_mobility:
+            node_view.set_color("red")
+        else:
+            layout_objects["Node %i" % nodeI] = node_view
+
+    if mobile_nodes:
+        mobile_list = sorted(mobile_nodes)
+        sim_helper.SetPositionNodes(mobile_list)
+        for nodeI, (x, y) in zip(mobile_list, get_node_positions(sim_helper)):
+            viz.get_node(nodeI).set_position(x, y)
+
+    wired_device_types = [
+        "ns3::" + device_type.__name__
+        for device_type, traits in netdevice_traits.items()
+        if not traits.is_wireless and not traits.is_virtual
+    ]
+    edges = set()
+    for link in sim_helper.GetTopologyLinks(wired_device_types, bool(REPRESENT_CHANNELS_AS_NODES)):
+        node_name = "Node %i" % link.node
+        node_view = viz.get_node(link.node)
+        if link.channel:
+            # represent channels as white nodes
+            channel_view = viz.get_channel(link.channel)
+            viz.create_link(node_view, channel_view)
+            if link.node not in mobile_nodes:
+                channel_name = "Channel %i" % link.channel.GetId()
+                layout_objects[channel_name] = channel_view
+                edges.add((node_name, channel_name))
+        else:
+            viz.create_link(node_view, viz.get_node(link.peer))
+            if link.node not in mobile_nodes and link.peer not in mobile_nodes:
+                edges.add(tuple(sorted((node_name, "Node %i" % link.peer))))
+
+    if numpy is not None:
+        positions = layout.cached_layout(n_nodes, layout_objects, edges)
+    else:
+        import pygraphviz
+
+        print("scanning topology: calling graphviz layout")
+        graph = pygraphviz.AGraph()
+        for name in layout_objects:
+            graph.add_node(name)
+        for name1, name2 in edges:
+            graph.add_edge(name1, name2)
+        graph.layout(LAYOUT_ALGORITHM)
+        positions = dict(
+            (str(node), [float(s) for s in node.attr["pos"].split(",")])
+            for node in graph.iternodes()
+        )
+    for name, obj in layout_objects.items():
+        pos_x, pos_y = positions[name]
+        obj.set_position(pos_x, pos_y)
+
+    print("scanning topology: all done.")
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LAYOUT_EDGE_LENGTH = 72.0  # ideal edge length, in canvas units (same as graphviz neato)
+LAYOUT_ITERATIONS = 100  # force-directed iterations for a full layout
+LAYOUT_INCREMENTAL_ITERATIONS = 50  # iterations when only new nodes are placed
+LAYOUT_CHUNK_SIZE = 512  # rows per block when computing pairwise repulsion
+LAYOUT_CACHE_ENV = "NS3_VISUALIZER_LAYOUT_CACHE"
+
+
+def topology_fingerprint(num_nodes, names, edges):
+    """!
+    Compute the fingerprint of a topology, used as layout cache key
+
+    @param num_nodes: total number of ns-3 nodes, including mobile ones
+    @param names: names of the objects to lay out
+    @param edges: iterable of (name1, name2) edges between them
+    @return hexadecimal digest
+    """
+    digest = hashlib.sha1()
+    digest.update(("%i\n" % num_nodes).encode())
+    for name in sorted(names):
+        digest.update(("%s\n" % name).encode())
+    for name1, name2 in sorted(tuple(sorted(edge)) for edge in edges):
+        digest.update(("%s -- %s\n" % (name1, name2)).encode())
+    return digest.hexdigest()
+
+
+## LayoutCache class
+class LayoutCache(object):
+    """
+    On-disk cache of topology layouts, one JSON file (positions and edges) per topology
+    fingerprint.  The directory defaults to ~/.cache/ns3/visualizer-layouts
+    and can be changed with the NS3_VISUALIZER_LAYOUT_CACHE environment
+    variable; setting it to an empty string disables the cache.
+    """
+
+    ## @var directory
+    #  cache directory, or None if caching is disabled
+    def __init__(self, directory=None):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param directory: cache directory; None for the default one
+        """
+        if directory is None:
+            directory = os.environ.get(LAYOUT_CACHE_ENV)
+            if directory is None:
+                cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+                    os.path.expanduser("~"), ".cache"
+                )
+                directory = os.path.join(cache_home, "ns3", "visualizer-layouts")
+        self.directory = directory or None
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, fingerprint + ".json")
+
+    def _read(self, path):
+        """!
+        Read a cached layout
+
+        @param self: this object
+        @param path: file name
+        @return (positions, edges): dict mapping names to (x, y), and the set
+        of the edges of the topology, as sorted (name1, name2) tuples, or None
+        for files written before the edges were stored; None if the file
+        cannot be read
+        """
+        try:
+            with open(path) as layout_file:
+                content = json.load(layout_file)
+            if "positions" in content:
+                positions = content["positions"]
+                edges = set(tuple(sorted(edge)) for edge in content["edges"])
+            else:
+                positions = content
+                edges = None
+            positions = dict((name, (float(x), float(y))) for name, (x, y) in positions.items())
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        return positions, edges
+
+    def load(self, fingerprint):
+        """!
+        Load the layout of a topology
+
+        @param self: this object
+        @param fingerprint: topology fingerprint
+        @return dict mapping names to (x, y), or None if not cached
+        """
+        if self.directory is None:
+            return None
+        layout = self._read(self._path(fingerprint))
+        return layout[0] if layout is not None else None
+
+    def load_latest(self, edges):
+        """!
+        Load the most recently saved layout of a topology contained in a
+        new one, i.e. whose edges are all edges of the new topology, to
+        seed an incremental layout
+
+        @param self: this object
+        @param edges: set of the edges of the new topology, as sorted
+        (name1, name2) tuples
+        @return (positions, edges) as returned by _read, or None if no
+        cached layout qualifies
+        """
+        if self.directory is None:
+            return None
+        try:
+            paths = [
+                os.path.join(self.directory, file_name)
+                for file_name in os.listdir(self.directory)
+                if file_name.endswith(".json")
+            ]
+        except OSError:
+            return None
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                pass
+        for path in sorted(mtimes, key=mtimes.get, reverse=True):
+            layout = self._read(path)
+            if layout is not None and layout[1] is not None and layout[1] <= edges:
+                return layout
+        return None
+
+    def save(self, fingerprint, positions, edges):
+        """!
+        Save the layout of a topology; failures are ignored, the cache being
+        only an optimization
+
+        @param self: this object
+        @param fingerprint: topology fingerprint
+        @param positions: dict mapping names to (x, y)
+        @param edges: iterable of (name1, name2) edges of the topology
+        @return none
+        """
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as layout_file:
+                json.dump(
+                    {
+                        "positions": dict((name, [x, y]) for name, (x, y) in positions.items()),
+                        "edges": sorted(set(tuple(sorted(edge)) for edge in edges)),
+                    },
+                    layout_file,
+                )
+            os.replace(tmp_path, self._path(fingerprint))
+        except OSError:
+            pass
+
+
+def force_directed_layout(names, edges, initial=None, iterations=None, seed=0):
+    """!
+    Lay out a graph with the Fruchterman-Reingold force-directed algorithm.
+
+    Objects with a position in @p initial keep it; only the other ones are
+    moved, starting next to their already placed neighbours.  Repulsion is
+    computed in blocks of LAYOUT_CHUNK_SIZE rows, so memory use stays linear
+    in the number of objects.
+
+    @param names: names of the objects to lay out
+    @param edges: iterable of (name1, name2) edges
+    @param initial: dict mapping names to fixed (x, y) positions, or None
+    @param iterations: number of iterations; None picks LAYOUT_ITERATIONS, or
+    LAYOUT_INCREMENTAL_ITERATIONS if some positions are already known
+    @param seed: random seed, so that layouts are reproducible
+    @return dict mapping names to (x, y)
+    """
+    names = list(names)
+    initial = initial or {}
+    count = len(names)
+    if count == 0:
+        return {}
+    index = dict((name, i) for i, name in enumerate(names))
+    edge_array = numpy.array(
+        [(index[name1], index[name2]) for name1, name2 in edges if name1 != name2],
+        dtype=numpy.intp,
+    ).reshape(-1, 2)
+
+    k = LAYOUT_EDGE_LENGTH
+    rng = numpy.random.default_rng(seed)
+    movable = numpy.array([name not in initial for name in names])
+    if not movable.any():
+        return dict((name, initial[name]) for name in names)
+    pos = rng.uniform(0, k * math.sqrt(count), size=(count, 2))
+    for name, (x, y) in initial.items():
+        if name in index:
+            pos[index[name]] = (x, y)
+
+    if not movable.all():
+        # start new objects next to the mean of their placed neighbours
+        neighbour_sum = numpy.zeros((count, 2))
+        neighbour_count = numpy.zeros(count)
+        for a, b in ((0, 1), (1, 0)):
+            placed = ~movable[edge_array[:, b]]
+            numpy.add.at(neighbour_sum, edge_array[placed, a], pos[edge_array[placed, b]])
+            numpy.add.at(neighbour_count, edge_array[placed, a], 1)
+        anchored = movable & (neighbour_count > 0)
+        pos[anchored] = neighbour_sum[anchored] / neighbour_count[anchored, None] + rng.normal(
+            0, k / 4, size=(int(anchored.sum()), 2)
+        )
+        if iterations is None:
+            iterations = LAYOUT_INCREMENTAL_ITERATIONS
+    if iterations is None:
+        iterations = LAYOUT_ITERATIONS
+
+    movable_index = numpy.flatnonzero(movable)
+    temperature = k * math.sqrt(count) / 10
+    cooling = temperature / (iterations + 1)
+    for dummy in range(iterations):
+        displacement = numpy.zeros((count, 2))
+        # repulsion, only needed for the objects that can move
+        for start in range(0, len(movable_index), LAYOUT_CHUNK_SIZE):
+            rows = movable_index[start : start + LAYOUT_CHUNK_SIZE]
+            dx = pos[rows, 0, None] - pos[None, :, 0]
+            dy = pos[rows, 1, None] - pos[None, :, 1]
+            factor = dx * dx
+            factor += dy * dy
+            numpy.maximum(factor, 1e-2, out=factor)
+            numpy.divide(k * k, factor, out=factor)
+            displacement[rows, 0] += (dx * factor).sum(axis=1)
+            displacement[rows, 1] += (dy * factor).sum(axis=1)
+        # attraction along the edges
+        if len(edge_array):
+            delta = pos[edge_array[:, 0]] - pos[edge_array[:, 1]]
+            distance = numpy.maximum(numpy.sqrt((delta**2).sum(axis=1)), 1e-2)
+            force = delta * (distance / k)[:, None]
+            numpy.add.at(displacement, edge_array[:, 0], -force)
+            numpy.add.at(displacement, edge_array[:, 1], force)
+        length = numpy.maximum(numpy.sqrt((displacement**2).sum(axis=1)), 1e-9)
+        step = displacement * (numpy.minimum(length, temperature) / length)[:, None]
+        pos[movable] += step[movable]
+        temperature -= cooling
+
+    return dict((name, (float(pos[i, 0]), float(pos[i, 1]))) for i, name in enumerate(names))
+
+
+def cached_layout(num_nodes, names, edges, cache=None):
+    """!
+    Lay out a topology, reusing cached layouts: an identical topology is
+    loaded from the cache as is.  Otherwise, if the most recent cached
+    layout whose edges are all edges of the topology exists, its objects
+    keep their positions, except those joined by a new edge, and only the
+    other ones are placed; without such a layout, the topology is laid out
+    from scratch.
+
+    @param num_nodes: total number of ns-3 nodes, including mobile ones
+    @param names: names of the objects to lay out
+    @param edges: iterable of (name1, name2) edges between them
+    @param cache: L{LayoutCache}, or None for the default one
+    @return dict mapping names to (x, y)
+    """
+    names = list(names)
+    edges = list(edges)
+    if cache is None:
+        cache = LayoutCache()
+    fingerprint = topology_fingerprint(num_nodes, names, edges)
+    positions = cache.load(fingerprint)
+    if positions is not None and all(name in positions for name in names):
+        print("scanning topology: layout loaded from cache")
+        return positions
+
+    initial = {}
+    edge_set = set(tuple(sorted(edge)) for edge in edges)
+    previous = cache.load_latest(edge_set)
+    if previous is not None:
+        previous_positions, previous_edges = previous
+        # a new edge between two placed objects frees both, so that it is laid out
+        moved = set(
+            name
+            for edge in edge_set - previous_edges
+            if all(name in previous_positions for name in edge)
+            for name in edge
+        )
+        initial = dict(
+            (name, previous_positions[name])
+            for name in names
+            if name in previous_positions and name not in moved
+        )
+    print(
+        "scanning topology: laying out %i objects (%i already placed)" % (len(names), len(initial))
+    )
+    positions = force_directed_layout(names, edges, initial)
+    cache.save(fingerprint, positions, edge_set)
+    return positions
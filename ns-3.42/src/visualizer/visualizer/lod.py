@@ -0,0 +1,205 @@
+import heapq
+import math
+from collections import Counter
+
+from gi.repository import GooCanvas
+
+LOD_MAX_VISIBLE_NODES = 500  # above this many visible nodes, draw clusters instead of nodes
+LOD_CELL_PIXELS = 48  # cluster cell size, in screen pixels
+LOD_MAX_FLOWS = 100  # maximum number of aggregated transmission flows drawn
+
+
+## ClusterLayer class
+class ClusterLayer(object):
+    """
+    Level-of-detail layer for dense topologies.
+
+    When more than LOD_MAX_VISIBLE_NODES nodes are visible, the individual
+    node items are hidden and nodes are aggregated into clusters, one per
+    cell of a grid whose cells measure LOD_CELL_PIXELS on screen whatever the
+    zoom level.  Each cluster is drawn as a single item showing the number of
+    nodes and their dominant colour; transmissions and drops are aggregated
+    per cluster as well.  The number of canvas items is therefore bounded by
+    the number of cells in the window, not by the number of nodes.
+    """
+
+    ## @var viz
+    #  visualizer
+    ## @var group
+    #  canvas group holding the cluster items
+    ## @var active
+    #  whether clusters are currently drawn instead of nodes
+    ## @var cell_size
+    #  cluster cell size, in canvas units
+    ## @var clusters
+    #  (cell x, cell y) -> (centroid x, centroid y, node count, dominant color)
+    ## @var _items
+    #  pool of (ellipse, label) canvas items
+    def __init__(self, viz):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param viz: visualization object
+        """
+        self.viz = viz
+        self.group = GooCanvas.CanvasGroup()
+        viz.canvas.get_root_item().add_child(self.group, -1)
+        self.group.raise_(viz.nodes_group)
+        self.active = False
+        self.cell_size = None
+        self.clusters = {}
+        self._items = []
+
+    def _cell(self, x, y):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+
+    def _set_active(self, active):
+        if active == self.active:
+            return
+        self.active = active
+        if active:
+            self.viz.nodes_group.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+        else:
+            self.viz.nodes_group.set_property("visibility", GooCanvas.CanvasItemVisibility.VISIBLE)
+            self.clusters = {}
+            for ellipse, label in self._items:
+                ellipse.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+                label.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+
+    def update(self):
+        """!
+        Recompute the clusters for the visible region, switching between
+        per-node and per-cluster rendering as needed
+
+        @param self: this object
+        @return none
+        """
+        x1, y1, x2, y2 = self.viz.get_visible_region()
+        visible = self.viz.nodes_spatial_index.query_rect(x1, y1, x2, y2)
+        self._set_active(len(visible) > LOD_MAX_VISIBLE_NODES)
+        if not self.active:
+            return
+
+        self.cell_size = LOD_CELL_PIXELS / self.viz.zoom.get_value()
+        members = {}
+        for node in visible:
+            x, y = node.get_position()
+            members.setdefault(self._cell(x, y), []).append((x, y, node._color))
+
+        self.clusters = {}
+        for cell, cell_members in members.items():
+            count = len(cell_members)
+            color, dummy_count = Counter(color for x, y, color in cell_members).most_common(1)[0]
+            self.clusters[cell] = (
+                sum(x for x, y, color in cell_members) / count,
+                sum(y for x, y, color in cell_members) / count,
+                count,
+                color,
+            )
+        self._draw()
+
+    def _draw(self):
+        items = self._items
+        while len(items) < len(self.clusters):
+            ellipse = GooCanvas.CanvasEllipse(
+                parent=self.group,
+                stroke_color="black",
+                pointer_events=GooCanvas.CanvasPointerEvents.NONE,
+            )
+            label = GooCanvas.CanvasText(
+                parent=self.group,
+                fill_color="black",
+                anchor=GooCanvas.CanvasAnchorType.CENTER,
+                pointer_events=GooCanvas.CanvasPointerEvents.NONE,
+            )
+            items.append((ellipse, label))
+
+        font_size = max(1, int(self.cell_size / 5))
+        for (ellipse, label), (x, y, count, color) in zip(items, self.clusters.values()):
+            radius = min(self.cell_size / 2, self.cell_size * 0.1 * math.sqrt(count))
+            ellipse.set_properties(
+                center_x=x,
+                center_y=y,
+                radius_x=radius,
+                radius_y=radius,
+                line_width=self.cell_size / 50,
+                fill_color_rgba=(color & 0xFFFFFF00) | 0xC0,
+                visibility=GooCanvas.CanvasItemVisibility.VISIBLE,
+            )
+            label.set_properties(
+                x=x,
+                y=y,
+                text=str(count),
+                font=("Sans Serif %i" % font_size),
+                visibility=GooCanvas.CanvasItemVisibility.VISIBLE,
+            )
+        for ellipse, label in items[len(self.clusters) :]:
+            ellipse.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+            label.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+
+    def _node_cluster(self, node_id):
+        """!
+        Find the cluster of a node
+
+        @param self: this object
+        @param node_id: node index
+        @return (cell, (x, y)) where (x, y) is the cluster centroid, or the
+        center of the cell for nodes outside the visible clusters
+        """
+        x, y = self.viz.get_node(node_id).get_position()
+        cell = self._cell(x, y)
+        try:
+            cluster_x, cluster_y, dummy_count, dummy_color = self.clusters[cell]
+        except KeyError:
+            cluster_x = (cell[0] + 0.5) * self.cell_size
+            cluster_y = (cell[1] + 0.5) * self.cell_size
+        return cell, (cluster_x, cluster_y)
+
+    def aggregate_transmissions(self, transmissions_average):
+        """!
+        Aggregate per node pair transmissions into flows between clusters
+
+        @param self: this object
+        @param transmissions_average: dict mapping (transmitter id, receiver id)
+        to (total bytes, sample count)
+        @return list of (x1, y1, x2, y2, total bytes, sample count), one per
+        flow, at most LOD_MAX_FLOWS of the largest ones
+        """
+        flows = {}
+        for (transmitter_id, receiver_id), (rx_bytes, rx_count) in transmissions_average.items():
+            cell1, pos1 = self._node_cluster(transmitter_id)
+            cell2, pos2 = self._node_cluster(receiver_id)
+            if cell1 == cell2:
+                continue
+            key = (cell1, cell2)
+            try:
+                dummy_pos1, dummy_pos2, flow_bytes, flow_count = flows[key]
+            except KeyError:
+                flow_bytes, flow_count = 0, 0
+            flows[key] = (pos1, pos2, flow_bytes + rx_bytes, max(flow_count, rx_count))
+        largest = heapq.nlargest(LOD_MAX_FLOWS, flows.values(), key=lambda flow: flow[2])
+        return [
+            (pos1[0], pos1[1], pos2[0], pos2[1], flow_bytes, flow_count)
+            for pos1, pos2, flow_bytes, flow_count in largest
+        ]
+
+    def aggregate_drops(self, drops_average):
+        """!
+        Aggregate per node packet drops into per cluster drops
+
+        @param self: this object
+        @param drops_average: dict mapping transmitter id to (total bytes, sample count)
+        @return list of (x, y, total bytes, sample count), one per cluster
+        """
+        drops = {}
+        for transmitter_id, (drop_bytes, drop_count) in drops_average.items():
+            cell, pos = self._node_cluster(transmitter_id)
+            if cell not in self.clusters:
+                continue
+            try:
+                dummy_pos, cluster_bytes, cluster_count = drops[cell]
+            except KeyError:
+                cluster_bytes, cluster_count = 0, 0
+            drops[cell] = (pos, cluster_bytes + drop_bytes, max(cluster_count, drop_count))
+        return [(pos[0], pos[1], drop_bytes, count) for pos, drop_bytes, count in drops.values()]
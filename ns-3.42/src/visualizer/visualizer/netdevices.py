@@ -0,0 +1,55 @@
+"""
+Traits of the ns-3 NetDevice types, used to tell wired links from wireless
+ones.  Unlike base.py, this module does not need the GUI libraries, but it
+needs the ns-3 bindings.
+"""
+
+import sys
+
+
+## NetDeviceTraits class
+class NetDeviceTraits(object):
+    ## class variables
+    ## @var is_wireless
+    #  is wireless
+    ## @var is_virtual
+    #  is virtual
+    def __init__(self, is_wireless=None, is_virtual=False):
+        """!
+        Initialize function.
+        @param self The current class
+        @param is_wireless is wireless flag
+        @param is_virtual is virtual flag
+        """
+        assert is_virtual or is_wireless is not None
+        self.is_wireless = is_wireless
+        self.is_virtual = is_virtual
+
+
+netdevice_traits = {
+    ns.PointToPointNetDevice: NetDeviceTraits(is_wireless=False),
+    ns.CsmaNetDevice: NetDeviceTraits(is_wireless=False),
+    ns.WifiNetDevice: NetDeviceTraits(is_wireless=True),
+    ns.BridgeNetDevice: NetDeviceTraits(is_virtual=True),
+    ns.LoopbackNetDevice: NetDeviceTraits(is_virtual=True, is_wireless=False),
+    ns.MeshPointDevice: NetDeviceTraits(is_virtual=True),
+    ns.SubscriberStationNetDevice: NetDeviceTraits(is_wireless=True),
+    ns.BaseStationNetDevice: NetDeviceTraits(is_wireless=True),
+    ns.LteUeNetDevice: NetDeviceTraits(is_wireless=True),
+    ns.LteEnbNetDevice: NetDeviceTraits(is_wireless=True),
+}
+
+
+def lookup_netdevice_traits(class_type):
+    try:
+        return netdevice_traits[class_type]
+    except KeyError:
+        sys.stderr.write(
+            "WARNING: no NetDeviceTraits registered for device type %r; "
+            "I will assume this is a non-virtual wireless device, "
+            "but you should edit %r, variable 'netdevice_traits',"
+            " to make sure.\n" % (class_type.__name__, __file__)
+        )
+        t = NetDeviceTraits(is_virtual=False, is_wireless=True)
+        netdevice_traits[class_type] = t
+        return t
@@ -0,0 +1,513 @@
+# -*- Mode: python; coding: utf-8 -*-
+"""
+Offscreen (headless) rendering for the visualizer.
+
+Instead of a GTK window driven by a GLib timeout, the simulation is
+advanced synchronously, one frame interval of simulated time at a
+time, and each frame is drawn with cairo into an image surface.  No
+display, main loop or simulation thread is needed.
+
+Frames are written either as numbered PNG files in a directory, or, if
+the output name ends in '.frames', as a single frame stream file:
+
+  - header: the 8 bytes C{FRAME_STREAM_MAGIC};
+  - one record per frame: C{FRAME_HEADER} (simulated time in seconds,
+    length of the PNG data) followed by the PNG data.
+
+If the output name ends in C{TRACE_EXTENSION}, nothing is rendered: the
+samples of every frame interval are recorded in a trace instead (see
+trace.py), which visualizer/replay.py plays back without the simulator.
+"""
+
+import io
+import math
+import os
+import struct
+import sys
+
+from .headless import (
+    DEFAULT_NODE_SIZE,
+    average_drop_samples,
+    average_transmission_samples,
+    get_node_positions,
+    scan_topology,
+    take_snapshot,
+    transform_distance_simulation_to_canvas,
+)
+from .trace import TraceWriter, get_topology
+
+FRAME_STREAM_MAGIC = b"NS3VIZF1"
+FRAME_HEADER = struct.Struct("<dI")
+FRAME_MARGIN = 0.05  # fraction of the frame kept empty around the topology
+TRACE_EXTENSION = ".vztrace"
+
+NAMED_COLORS = {
+    "red": 0xFF0000FF,
+    "green": 0x00FF00FF,
+    "blue": 0x0000FFFF,
+    "yellow": 0xFFFF00FF,
+    "black": 0x000000FF,
+    "white": 0xFFFFFFFF,
+    "grey": 0x808080FF,
+    "gray": 0x808080FF,
+}
+
+
+def _set_source_rgba(cr, color):
+    cr.set_source_rgba(
+        ((color >> 24) & 0xFF) / 255.0,
+        ((color >> 16) & 0xFF) / 255.0,
+        ((color >> 8) & 0xFF) / 255.0,
+        (color & 0xFF) / 255.0,
+    )
+
+
+## OffscreenNode class
+class OffscreenNode(object):
+    ## @var node_index
+    #  node index
+    ## @var links
+    #  links
+    ## @var x
+    #  canvas x position
+    ## @var y
+    #  canvas y position
+    ## @var color
+    #  RGBA color
+    ## @var _has_mobility
+    #  has mobility model
+    def __init__(self, node_index):
+        """!
+        Initializer function.
+
+        @param self: class object.
+        @param node_index: node index
+        """
+        self.node_index = node_index
+        self.links = []
+        self.x = 0.0
+        self.y = 0.0
+        self.color = 0x808080FF
+        self._has_mobility = None
+
+    def set_position(self, x, y):
+        self.x = x
+        self.y = y
+
+    def get_position(self):
+        return self.x, self.y
+
+    def set_color(self, color):
+        if isinstance(color, str):
+            color = NAMED_COLORS.get(color, 0x808080FF)
+        self.color = color
+
+    @property
+    def has_mobility(self):
+        if self._has_mobility is None:
+            node = ns.NodeList.GetNode(self.node_index)
+            self._has_mobility = node.GetObject[ns.MobilityModel]()
+        return self._has_mobility
+
+
+## OffscreenChannel class
+class OffscreenChannel(object):
+    ## @var channel
+    #  channel
+    ## @var links
+    #  links
+    ## @var x
+    #  canvas x position
+    ## @var y
+    #  canvas y position
+    def __init__(self, channel):
+        self.channel = channel
+        self.links = []
+        self.x = 0.0
+        self.y = 0.0
+
+    def set_position(self, x, y):
+        self.x = x
+        self.y = y
+
+    def get_position(self):
+        return self.x, self.y
+
+
+## OffscreenLink class
+class OffscreenLink(object):
+    ## @var node1
+    #  first node
+    ## @var node2
+    #  second node or channel
+    def __init__(self, node1, node2):
+        self.node1 = node1
+        self.node2 = node2
+        node1.links.append(self)
+        node2.links.append(self)
+
+
+## OffscreenVisualizer class
+class OffscreenVisualizer(object):
+    ## @var output
+    #  output directory or frame stream file name
+    ## @var interval
+    #  simulated time between frames, in seconds
+    ## @var width
+    #  frame width, in pixels
+    ## @var height
+    #  frame height, in pixels
+    ## @var stop_time
+    #  simulated time at which rendering stops (0 for no limit)
+    ## @var nodes
+    #  node index -> OffscreenNode
+    ## @var channels
+    #  id(ns3.Channel) -> OffscreenChannel
+    ## @var links
+    #  list of links
+    ## @var sim_helper
+    #  PyViz helper
+    ## @var bounds
+    #  canvas bounds (min_x, min_y, max_x, max_y) shown in the frames
+    ## @var frame_count
+    #  number of frames written so far
+    def __init__(self, output, interval, width, height, stop_time=0.0):
+        """!
+        Initializer function.
+
+        @param self: class object.
+        @param output: directory for PNG frames, or a '.frames' stream file name
+        @param interval: simulated time between frames, in seconds
+        @param width: frame width, in pixels
+        @param height: frame height, in pixels
+        @param stop_time: simulated time at which to stop, or 0 to run until
+        the simulation stops by itself
+        """
+        assert interval > 0
+        self.output = output
+        self.interval = interval
+        self.width = int(width)
+        self.height = int(height)
+        self.stop_time = stop_time
+        self.nodes = {}
+        self.channels = {}
+        self.links = []
+        self.sim_helper = ns.PyViz()
+        self.bounds = None
+        self.frame_count = 0
+        self._transmissions = {}
+        self._drops = {}
+        self._stream = None
+        self._recorder = None
+        self._mobile_nodes = None
+        self._position_nodes = ()
+
+    def get_node(self, index):
+        try:
+            return self.nodes[index]
+        except KeyError:
+            node = OffscreenNode(index)
+            self.nodes[index] = node
+            self._mobile_nodes = None
+            return node
+
+    def get_channel(self, ns3_channel):
+        try:
+            return self.channels[id(ns3_channel)]
+        except KeyError:
+            channel = OffscreenChannel(ns3_channel)
+            self.channels[id(ns3_channel)] = channel
+            return channel
+
+    def create_link(self, node, node_or_channel):
+        self.links.append(OffscreenLink(node, node_or_channel))
+
+    def _update_node_positions(self):
+        if self._mobile_nodes is None:
+            self._mobile_nodes = [node for node in self.nodes.values() if node.has_mobility]
+            self._position_nodes = tuple(node.node_index for node in self._mobile_nodes)
+            self.sim_helper.SetPositionNodes(list(self._position_nodes))
+        if not self._mobile_nodes:
+            return
+        for node, (x, y) in zip(self._mobile_nodes, get_node_positions(self.sim_helper)):
+            if not math.isnan(x):
+                node.set_position(x, y)
+
+    def _update_bounds(self):
+        """!
+        Grow the frame bounds so that every node is visible; bounds never
+        shrink, so that static parts of the topology do not move around
+        between frames.
+
+        @param self: class object.
+        @return none
+        """
+        objects = list(self.nodes.values()) + list(self.channels.values())
+        if not objects:
+            return
+        min_x = min(obj.x for obj in objects)
+        min_y = min(obj.y for obj in objects)
+        max_x = max(obj.x for obj in objects)
+        max_y = max(obj.y for obj in objects)
+        if self.bounds is not None:
+            min_x = min(min_x, self.bounds[0])
+            min_y = min(min_y, self.bounds[1])
+            max_x = max(max_x, self.bounds[2])
+            max_y = max(max_y, self.bounds[3])
+        self.bounds = (min_x, min_y, max_x, max_y)
+
+    def _sample(self):
+        self._transmissions = average_transmission_samples(
+            [self.sim_helper.GetTransmissionSamples()]
+        )
+        self._drops = average_drop_samples([self.sim_helper.GetPacketDropSamples()])
+
+    def render_frame(self):
+        """!
+        Render the current state of the simulation.
+
+        @param self: class object.
+        @return a cairo.ImageSurface holding the frame
+        """
+        return render_frame(
+            self.width,
+            self.height,
+            self.bounds,
+            self.nodes.values(),
+            self.channels.values(),
+            self.links,
+            self._transmissions,
+            self._drops,
+            self.interval,
+            ns.Simulator.Now().GetSeconds(),
+        )
+
+    def _open_output(self):
+        if self.output.endswith(TRACE_EXTENSION):
+            self._recorder = TraceWriter(self.output, get_topology(self, self.interval))
+        elif self.output.endswith(".frames"):
+            self._stream = open(self.output, "wb")
+            self._stream.write(FRAME_STREAM_MAGIC)
+        else:
+            os.makedirs(self.output, exist_ok=True)
+
+    def _write_frame(self):
+        if self._recorder is not None:
+            self._recorder.write(take_snapshot(self.sim_helper, self._position_nodes))
+            self.frame_count += 1
+            return
+        self._update_bounds()
+        surface = self.render_frame()
+        if self._stream is not None:
+            buf = io.BytesIO()
+            surface.write_to_png(buf)
+            data = buf.getvalue()
+            self._stream.write(FRAME_HEADER.pack(ns.Simulator.Now().GetSeconds(), len(data)))
+            self._stream.write(data)
+        else:
+            surface.write_to_png(os.path.join(self.output, "frame-%06i.png" % self.frame_count))
+        self.frame_count += 1
+
+    def run(self):
+        """!
+        Scan the topology, then alternate between running the simulation
+        for one frame interval and rendering a frame, until the simulation
+        stops or stop_time is reached.
+
+        @param self: class object.
+        @return the number of frames written
+        """
+        scan_topology(self, self.sim_helper)
+        self.sim_helper.SetNodesOfInterest(list(range(ns.NodeList.GetNNodes())))
+        self._update_node_positions()
+        self._open_output()
+        try:
+            self._write_frame()
+            while True:
+                target_time = ns.Simulator.Now().GetSeconds() + self.interval
+                if self.stop_time > 0:
+                    target_time = min(target_time, self.stop_time)
+                self.sim_helper.SimulatorRunUntil(ns.Seconds(target_time))
+                messages = self.sim_helper.GetPauseMessages()
+                for message in messages:
+                    print("visualizer pause: %s" % (message,), file=sys.stderr)
+                self._update_node_positions()
+                if self._recorder is None:
+                    self._sample()
+                self._write_frame()
+                now = ns.Simulator.Now().GetSeconds()
+                # The simulation stopped before reaching the target time:
+                # Simulator::Stop was called by the simulation itself.
+                if now < target_time or messages:
+                    break
+                if self.stop_time > 0 and now >= self.stop_time:
+                    break
+        finally:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            if self._recorder is not None:
+                self._recorder.close()
+                self._recorder = None
+        return self.frame_count
+
+
+def render_frame(width, height, bounds, nodes, channels, links, transmissions, drops, period, time):
+    """!
+    Draw one frame with cairo.
+
+    @param width: frame width, in pixels
+    @param height: frame height, in pixels
+    @param bounds: canvas bounds (min_x, min_y, max_x, max_y) shown in the frame, or None
+    @param nodes: iterable of nodes (OffscreenNode)
+    @param channels: iterable of channels (OffscreenChannel)
+    @param links: iterable of links (OffscreenLink)
+    @param transmissions: dict mapping (transmitter id, receiver id) to
+    (total bytes, sample count)
+    @param drops: dict mapping transmitter id to (total dropped bytes, sample count)
+    @param period: duration of a sample period, in seconds
+    @param time: simulation time shown in the frame, in seconds
+    @return a cairo.ImageSurface holding the frame
+    """
+    # imported here, so that traces can be recorded and replayed without pycairo
+    import cairo
+
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    cr = cairo.Context(surface)
+    cr.set_source_rgb(1.0, 1.0, 1.0)
+    cr.paint()
+
+    min_x, min_y, max_x, max_y = bounds or (-1.0, -1.0, 1.0, 1.0)
+    span_x = max(max_x - min_x, 1.0)
+    span_y = max(max_y - min_y, 1.0)
+    scale = (1.0 - 2 * FRAME_MARGIN) * min(width / span_x, height / span_y)
+    offset_x = (width - scale * span_x) / 2 - scale * min_x
+    offset_y = (height - scale * span_y) / 2 - scale * min_y
+
+    def to_pixels(x, y):
+        return offset_x + scale * x, offset_y + scale * y
+
+    # links
+    cr.set_line_width(1.0)
+    cr.set_source_rgb(0.0, 0.0, 0.0)
+    for link in links:
+        cr.move_to(*to_pixels(*link.node1.get_position()))
+        cr.line_to(*to_pixels(*link.node2.get_position()))
+    cr.stroke()
+
+    # channels
+    for channel in channels:
+        px, py = to_pixels(channel.x, channel.y)
+        cr.arc(px, py, max(3.0, 30 * scale), 0, 2 * math.pi)
+        cr.set_source_rgb(1.0, 1.0, 1.0)
+        cr.fill_preserve()
+        cr.set_source_rgb(0.5, 0.5, 0.5)
+        cr.stroke()
+
+    # nodes
+    positions = {}
+    radius = max(2.0, transform_distance_simulation_to_canvas(DEFAULT_NODE_SIZE) * scale)
+    for node in nodes:
+        px, py = to_pixels(node.x, node.y)
+        positions[node.node_index] = (px, py)
+        cr.arc(px, py, radius, 0, 2 * math.pi)
+        _set_source_rgba(cr, node.color)
+        cr.fill_preserve()
+        cr.set_source_rgb(0.0, 0.0, 0.0)
+        cr.set_line_width(max(0.5, radius * 0.15))
+        cr.stroke()
+
+    # transmissions
+    for (transmitter_id, receiver_id), (rx_bytes, rx_count) in transmissions.items():
+        if transmitter_id not in positions or receiver_id not in positions:
+            continue
+        x1, y1 = positions[transmitter_id]
+        x2, y2 = positions[receiver_id]
+        line_width = max(0.5, math.log(max(2.0, float(rx_bytes) / rx_count / period)))
+        _set_source_rgba(cr, 0x00C000C0)
+        _draw_arrow(cr, x1, y1, x2, y2, line_width)
+
+    # drops: an arrow pointing down from the transmitter to the frame edge
+    for transmitter_id, (drop_bytes, drop_count) in drops.items():
+        if transmitter_id not in positions:
+            continue
+        x1, y1 = positions[transmitter_id]
+        line_width = max(0.5, math.log(max(2.0, float(drop_bytes) / drop_count / period)))
+        _set_source_rgba(cr, 0xC00000C0)
+        _draw_arrow(cr, x1, y1, x1, height, line_width)
+
+    cr.set_source_rgb(0.0, 0.0, 0.0)
+    cr.select_font_face("Sans", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+    cr.set_font_size(14)
+    cr.move_to(8, 20)
+    cr.show_text("Time: %f s" % time)
+    surface.flush()
+    return surface
+
+
+def _draw_arrow(cr, x1, y1, x2, y2, line_width):
+    cr.set_line_width(line_width)
+    cr.move_to(x1, y1)
+    cr.line_to(x2, y2)
+    cr.stroke()
+    angle = math.atan2(y2 - y1, x2 - x1)
+    head = 4 * line_width
+    cr.move_to(x2, y2)
+    cr.line_to(x2 - head * math.cos(angle - math.pi / 6), y2 - head * math.sin(angle - math.pi / 6))
+    cr.line_to(x2 - head * math.cos(angle + math.pi / 6), y2 - head * math.sin(angle + math.pi / 6))
+    cr.close_path()
+    cr.fill()
+
+
+def read_frame_stream(file_name):
+    """!
+    Iterate over the frames of a frame stream written in offscreen mode.
+
+    @param file_name: the '.frames' file name
+    @return generator of (simulated time, PNG data) tuples
+    """
+    with open(file_name, "rb") as stream:
+        if stream.read(len(FRAME_STREAM_MAGIC)) != FRAME_STREAM_MAGIC:
+            raise ValueError("%r is not a visualizer frame stream" % (file_name,))
+        while True:
+            header = stream.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            time, length = FRAME_HEADER.unpack(header)
+            yield time, stream.read(length)
+
+
+_run_once = False
+
+
+def start_offscreen(output, interval=1.0, width=1024, height=768, stop_time=0.0):
+    """!
+    Run the simulation without a display, rendering frames with cairo.
+
+    This is what VisualSimulatorImpl runs instead of start() when its
+    OffscreenOutput attribute is set.  Plugins are not loaded, since they
+    depend on the GTK user interface.
+
+    @param output: directory for PNG frames, a '.frames' stream file name,
+    or a TRACE_EXTENSION trace file name
+    @param interval: simulated time between frames, in seconds
+    @param width: frame width, in pixels
+    @param height: frame height, in pixels
+    @param stop_time: simulated time at which to stop, or 0 to run until
+    the simulation stops by itself
+    @return none
+    """
+    global _run_once
+    if _run_once:
+        return
+    _run_once = True
+    if not output.endswith(TRACE_EXTENSION):
+        try:
+            import cairo
+        except ImportError as e:
+            print("No visualization support (%s)." % (str(e),), file=sys.stderr)
+            ns.Simulator.Run()
+            return
+    viz = OffscreenVisualizer(output, interval, width, height, stop_time)
+    frames = viz.run()
+    print("offscreen visualizer: wrote %i frames to %s" % (frames, output))
@@ -1,3 +1,7 @@
+import csv
+import tempfile
+
+import numpy
 from gi.repository import Gtk
 
 try:
@@ -5,19 +9,59 @@ try:
 except ModuleNotFoundError:
     from visualizer.base import InformationWindow
 
-NODE_STATISTICS_MEMORY = 10
+NODE_STATISTICS_MEMORY = 10  # samples over which rates are computed
+NODE_STATISTICS_HISTORY = 128  # samples kept in memory for the rates
+EXPORT_CHUNK_RECORDS = 1 << 20  # records read from the spill file at a time when exporting
+
+# one record of the exported time series, as spilled to disk after every sample
+STATISTICS_RECORD_DTYPE = numpy.dtype(
+    [
+        ("time", numpy.float64),
+        ("node", numpy.uint32),
+        ("interface", numpy.uint32),
+        ("tx_packets", numpy.uint64),
+        ("tx_bytes", numpy.uint64),
+        ("rx_packets", numpy.uint64),
+        ("rx_bytes", numpy.uint64),
+    ]
+)
+
+# counters of a (node, interface) row, in NetDeviceStatistics order
+TX_BYTES, RX_BYTES, TX_PACKETS, RX_PACKETS = range(4)
 
 
 ## StatisticsCollector class
 class StatisticsCollector(object):
     """
     Collects interface statistics for all nodes.
+
+    The counters of every (node, interface) pair are kept in a single ring
+    buffer of the last @c history samples, so that the rates of all the
+    interfaces are computed at once.  Every sample is also appended to a
+    temporary spill file, so that the whole time series, from the start of
+    the simulation, can be exported without being kept in memory.
     """
 
-    ## @var node_statistics
-    #  node statistics
     ## @var visualizer
     #  visualizer
+    ## @var history
+    #  number of samples kept
+    ## @var count
+    #  number of samples collected so far
+    ## @var times
+    #  ring buffer of sample times, shape (history,)
+    ## @var counters
+    #  ring buffer of counters, shape (history, rows, 4)
+    ## @var valid
+    #  whether each row was sampled, shape (history, rows)
+    ## @var row_nodes
+    #  node id of each row
+    ## @var row_interfaces
+    #  interface index of each row
+    ## @var node_rows
+    #  node id -> list of rows, one per interface
+    ## @var spill_file
+    #  temporary file holding every sample, as STATISTICS_RECORD_DTYPE records
 
     ## NetDevStats class
     class NetDevStats(object):
@@ -33,14 +77,47 @@ class StatisticsCollector(object):
             "txBitRate",
         ]
 
-    def __init__(self, visualizer):
+    def __init__(self, visualizer, history=NODE_STATISTICS_HISTORY):
         """!
         Collects interface statistics for all nodes.
         @param self this object
         @param visualizer visualizer object
+        @param history number of samples kept
         """
-        self.node_statistics = {}  # nodeid -> list(raw statistics)
+        assert history >= NODE_STATISTICS_MEMORY
         self.visualizer = visualizer
+        self.history = history
+        self.count = 0
+        self.times = numpy.zeros(history)
+        self.counters = numpy.zeros((history, 0, 4), dtype=numpy.uint64)
+        self.valid = numpy.zeros((history, 0), dtype=bool)
+        self.row_nodes = numpy.zeros(0, dtype=numpy.uint32)
+        self.row_interfaces = numpy.zeros(0, dtype=numpy.uint32)
+        self.node_rows = {}
+        self._n_rows = 0
+        self.spill_file = tempfile.TemporaryFile(prefix="ns3-interface-statistics-")
+
+    def _get_rows(self, node_id, n_interfaces):
+        rows = self.node_rows.setdefault(node_id, [])
+        while len(rows) < n_interfaces:
+            if self._n_rows == self.counters.shape[1]:
+                # grow geometrically, so that new nodes cost amortized O(1)
+                capacity = max(16, 2 * self._n_rows)
+                extra = capacity - self._n_rows
+                self.counters = numpy.concatenate(
+                    [self.counters, numpy.zeros((self.history, extra, 4), dtype=numpy.uint64)],
+                    axis=1,
+                )
+                self.valid = numpy.concatenate(
+                    [self.valid, numpy.zeros((self.history, extra), dtype=bool)], axis=1
+                )
+                self.row_nodes = numpy.resize(self.row_nodes, capacity)
+                self.row_interfaces = numpy.resize(self.row_interfaces, capacity)
+            self.row_nodes[self._n_rows] = node_id
+            self.row_interfaces[self._n_rows] = len(rows)
+            rows.append(self._n_rows)
+            self._n_rows += 1
+        return rows[:n_interfaces]
 
     def simulation_periodic_update(self, viz):
         """!
@@ -49,16 +126,55 @@ class StatisticsCollector(object):
         @param viz visualizer object
         @return none
         """
-        nodes_statistics = viz.simulation.sim_helper.GetNodesStatistics()
-        for stats in nodes_statistics:
-            try:
-                raw_stats_list = self.node_statistics[stats.nodeId]
-            except KeyError:
-                raw_stats_list = []
-                self.node_statistics[stats.nodeId] = raw_stats_list
-            raw_stats_list.append(stats.statistics)
-            while len(raw_stats_list) > NODE_STATISTICS_MEMORY:
-                raw_stats_list.pop(0)
+        slot = self.count % self.history
+        rows = []
+        values = []
+        for node_id, statistics in viz.snapshot.node_statistics.items():
+            rows.extend(self._get_rows(node_id, len(statistics)))
+            values.extend(statistics)
+        self.times[slot] = viz.snapshot.time
+        self.valid[slot] = False
+        if rows:
+            self.counters[slot, rows] = numpy.array(values, dtype=numpy.uint64)
+            self.valid[slot, rows] = True
+            records = numpy.empty(len(rows), dtype=STATISTICS_RECORD_DTYPE)
+            records["time"] = viz.snapshot.time
+            records["node"] = self.row_nodes[rows]
+            records["interface"] = self.row_interfaces[rows]
+            for name, counter in (
+                ("tx_packets", TX_PACKETS),
+                ("tx_bytes", TX_BYTES),
+                ("rx_packets", RX_PACKETS),
+                ("rx_bytes", RX_BYTES),
+            ):
+                records[name] = self.counters[slot, rows, counter]
+            self.spill_file.write(records.tobytes())
+        self.count += 1
+
+    def get_rates(self, rows=None):
+        """!
+        Compute the packet and bit rates over the last NODE_STATISTICS_MEMORY samples.
+        @param self this object
+        @param rows rows to compute, or None for all of them
+        @return (counters, rates): arrays of shape (rows, 4), the latest
+        counters and the corresponding rates per second (bits per second for
+        the byte counters), or None if fewer samples were collected; rates
+        are NaN for rows not sampled at both ends of the interval
+        """
+        if self.count < NODE_STATISTICS_MEMORY:
+            return None
+        if rows is None:
+            rows = slice(0, self._n_rows)
+        new = (self.count - 1) % self.history
+        old = (self.count - NODE_STATISTICS_MEMORY) % self.history
+        counters = self.counters[new, rows]
+        k = self.times[new] - self.times[old]
+        if k <= 0:
+            k = self.visualizer.sample_period * (NODE_STATISTICS_MEMORY - 1)
+        rates = (counters.astype(numpy.float64) - self.counters[old, rows]) / k
+        rates[:, [TX_BYTES, RX_BYTES]] *= 8
+        rates[~(self.valid[new, rows] & self.valid[old, rows])] = numpy.nan
+        return counters, rates
 
     def get_interface_statistics(self, nodeId):
         """!
@@ -67,41 +183,85 @@ class StatisticsCollector(object):
         @param nodeId node ID
         @return the statistics
         """
-        try:
-            raw_stats_list = self.node_statistics[nodeId]
-        except KeyError:
+        rows = self.node_rows.get(nodeId)
+        if not rows:
             return []
-
-        if len(raw_stats_list) < NODE_STATISTICS_MEMORY:
+        result = self.get_rates(rows)
+        if result is None:
+            return []
+        counters, rates = result
+        if numpy.isnan(rates).any():
             return []
-        assert len(raw_stats_list) == NODE_STATISTICS_MEMORY
-        tx_packets1 = []  # transmitted packets, one value per interface
-        rx_packets1 = []
-        tx_bytes1 = []
-        rx_bytes1 = []
-        for iface, stats in enumerate(raw_stats_list[0]):
-            tx_packets1.append(stats.transmittedPackets)
-            tx_bytes1.append(stats.transmittedBytes)
-            rx_packets1.append(stats.receivedPackets)
-            rx_bytes1.append(stats.receivedBytes)
 
         retval = []
-
-        k = self.visualizer.sample_period * (NODE_STATISTICS_MEMORY - 1)
-        for iface, stats in enumerate(raw_stats_list[-1]):
+        for iface_counters, iface_rates in zip(counters.tolist(), rates.tolist()):
             outStat = self.NetDevStats()
-            outStat.txPackets = stats.transmittedPackets
-            outStat.txBytes = stats.transmittedBytes
-            outStat.rxPackets = stats.receivedPackets
-            outStat.rxBytes = stats.receivedBytes
-
-            outStat.txPacketRate = (stats.transmittedPackets - tx_packets1[iface]) / k
-            outStat.rxPacketRate = (stats.receivedPackets - rx_packets1[iface]) / k
-            outStat.txBitRate = (stats.transmittedBytes - tx_bytes1[iface]) * 8 / k
-            outStat.rxBitRate = (stats.receivedBytes - rx_bytes1[iface]) * 8 / k
+            outStat.txPackets = iface_counters[TX_PACKETS]
+            outStat.txBytes = iface_counters[TX_BYTES]
+            outStat.rxPackets = iface_counters[RX_PACKETS]
+            outStat.rxBytes = iface_counters[RX_BYTES]
+
+            outStat.txPacketRate = iface_rates[TX_PACKETS]
+            outStat.rxPacketRate = iface_rates[RX_PACKETS]
+            outStat.txBitRate = iface_rates[TX_BYTES]
+            outStat.rxBitRate = iface_rates[RX_BYTES]
             retval.append(outStat)
         return retval
 
+    def _read_records(self):
+        """!
+        Read back the spilled time series, in chunks.
+        @param self this object
+        @return generator of STATISTICS_RECORD_DTYPE arrays
+        """
+        self.spill_file.flush()
+        self.spill_file.seek(0)
+        try:
+            while True:
+                data = self.spill_file.read(EXPORT_CHUNK_RECORDS * STATISTICS_RECORD_DTYPE.itemsize)
+                if not data:
+                    break
+                yield numpy.frombuffer(data, dtype=STATISTICS_RECORD_DTYPE)
+        finally:
+            # the next samples are appended after the records read
+            self.spill_file.seek(0, 2)
+
+    def export(self, file_name):
+        """!
+        Export the whole time series collected since the start of the
+        simulation, one record per sample, node and interface, to a CSV file,
+        or to a Parquet file (which needs pyarrow) if the name ends in
+        '.parquet'.
+        @param self this object
+        @param file_name output file name
+        @return the number of records written
+        """
+        names = list(STATISTICS_RECORD_DTYPE.names)
+        count = 0
+        if file_name.endswith(".parquet"):
+            import pyarrow
+            import pyarrow.parquet
+
+            schema = pyarrow.schema(
+                [(name, pyarrow.from_numpy_dtype(STATISTICS_RECORD_DTYPE[name])) for name in names]
+            )
+            with pyarrow.parquet.ParquetWriter(file_name, schema) as writer:
+                for records in self._read_records():
+                    writer.write_table(
+                        pyarrow.Table.from_arrays(
+                            [pyarrow.array(records[name]) for name in names], schema=schema
+                        )
+                    )
+                    count += len(records)
+        else:
+            with open(file_name, "w", newline="") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(names)
+                for records in self._read_records():
+                    writer.writerows(records.tolist())
+                    count += len(records)
+        return count
+
 
 ## ShowInterfaceStatistics class
 class ShowInterfaceStatistics(InformationWindow):
@@ -244,6 +404,32 @@ class ShowInterfaceStatistics(InformationWindow):
             )
 
 
+def export_statistics(viz, statistics_collector):
+    """!
+    Ask for a file name and export the interface statistics of all the nodes to it.
+    @param viz the visualizer object
+    @param statistics_collector the StatisticsCollector
+    @return none
+    """
+    sel = Gtk.FileChooserNative.new(
+        "Export Interface Statistics...",
+        viz.window,
+        Gtk.FileChooserAction.SAVE,
+        "_Export",
+        "_Cancel",
+    )
+    sel.set_local_only(True)
+    sel.set_do_overwrite_confirmation(True)
+    sel.set_current_name("interface-statistics.csv")
+    resp = sel.run()
+    file_name = sel.get_filename() if resp == Gtk.ResponseType.ACCEPT else None
+    sel.destroy()
+    if file_name is None:
+        return
+    count = statistics_collector.export(file_name)
+    print("interface statistics: wrote %i records to %s" % (count, file_name))
+
+
 def populate_node_menu(viz, node, menu, statistics_collector):
     menu_item = Gtk.MenuItem("Show Interface Statistics")
     menu_item.show()
@@ -254,6 +440,13 @@ def populate_node_menu(viz, node, menu, statistics_collector):
     menu_item.connect("activate", _show_it)
     menu.add(menu_item)
 
+    menu_item = Gtk.MenuItem("Export Interface Statistics...")
+    menu_item.show()
+    menu_item.connect(
+        "activate", lambda dummy_menu_item: export_statistics(viz, statistics_collector)
+    )
+    menu.add(menu_item)
+
 
 def register(viz):
     statistics_collector = StatisticsCollector(viz)
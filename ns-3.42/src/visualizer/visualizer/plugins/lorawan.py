@@ -0,0 +1,368 @@
+import math
+
+import numpy
+
+try:
+    from ns import ns
+except ModuleNotFoundError:
+    raise SystemExit(
+        "Error: ns3 Python module not found;"
+        " Python bindings may not be enabled"
+        " or your PYTHONPATH might not be properly configured"
+    )
+from gi.repository import GooCanvas
+
+try:
+    from ns3.visualizer.base import PIXELS_PER_METER, PyVizObject
+except ModuleNotFoundError:
+    from visualizer.base import PIXELS_PER_METER, PyVizObject
+
+LORA_END_DEVICE_TYPE = "LoRaEndDevice"  # TypeId name of the end device applications
+LORA_GATEWAY_TYPE = "LoRaGateway"  # TypeId name of the objects aggregated to gateway nodes
+LORA_GRID_CELLS = 16  # cells per side of the reception grid
+LORA_HALF_LIFE = 300.0  # simulated seconds after which past transmissions weigh half
+LORA_GATEWAY_COLOR = 0x000000FF
+## node colour for each spreading factor
+LORA_SF_COLORS = {
+    7: 0x1F77B4FF,
+    8: 0x2CA02CFF,
+    9: 0xBCBD22FF,
+    10: 0xFF7F0EFF,
+    11: 0xD62728FF,
+    12: 0x9467BDFF,
+}
+RECEIVED, LOST, COLLIDED = range(3)  # transmission outcomes, as traced by the end devices
+
+
+def _column(vector, dtype):
+    """!
+    Copy a std::vector returned by LoraSampleCollector into a NumPy array.
+
+    @param vector: the std::vector
+    @param dtype: NumPy type of its elements
+    @return the array
+    """
+    count = len(vector)
+    if not count:
+        return numpy.zeros(0, dtype=dtype)
+    view = vector.data()
+    view.reshape((count,))
+    return numpy.frombuffer(view, dtype=dtype, count=count).copy()
+
+
+## LoraCell class
+class LoraCell(PyVizObject):
+    """
+    Cell of the reception grid, with the decayed transmission counts of the
+    end devices that transmitted from it.
+    """
+
+    ## @var grid
+    #  LoraGrid
+    ## @var index
+    #  cell index in the grid
+    ## @var rect
+    #  rectangle showing the reception success ratio
+    ## @var heat
+    #  ellipse showing the collision heat
+    def __init__(self, grid, index, parent_canvas_item):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param grid: the LoraGrid
+        @param index: cell index in the grid
+        @param parent_canvas_item: parent canvas item
+        """
+        super(LoraCell, self).__init__()
+        self.grid = grid
+        self.index = index
+        x, y = grid.cell_origin(index)
+        self.rect = GooCanvas.CanvasRect(
+            parent=parent_canvas_item,
+            x=x,
+            y=y,
+            width=grid.cell_size,
+            height=grid.cell_size,
+            line_width=0,
+            visibility=GooCanvas.CanvasItemVisibility.HIDDEN,
+        )
+        self.rect.pyviz_object = self
+        self.heat = GooCanvas.CanvasEllipse(
+            parent=parent_canvas_item,
+            center_x=x + grid.cell_size / 2,
+            center_y=y + grid.cell_size / 2,
+            line_width=0,
+            pointer_events=GooCanvas.CanvasPointerEvents.NONE,
+            visibility=GooCanvas.CanvasItemVisibility.HIDDEN,
+        )
+
+    def tooltip_query(self, tooltip):
+        """!
+        Show the transmission counts of the cell
+
+        @param self: this object
+        @param tooltip: the tooltip
+        @return none
+        """
+        received, lost, collided = self.grid.counts[:, self.index]
+        total = received + lost + collided
+        tooltip.set_text(
+            "LoRa transmissions (decayed, half-life %g s): %.1f\n"
+            "received: %.1f (%.0f%%)\nlost: %.1f\ncollided: %.1f"
+            % (
+                LORA_HALF_LIFE,
+                total,
+                received,
+                100.0 * received / total if total else 0.0,
+                lost,
+                collided,
+            )
+        )
+
+
+## LoraGrid class
+class LoraGrid(object):
+    """
+    Fixed grid of LORA_GRID_CELLS x LORA_GRID_CELLS cells over the
+    deployment, aggregating the transmissions per cell.  Its drawing cost
+    depends on the number of cells, not on the number of end devices.
+    """
+
+    ## @var origin
+    #  canvas position of the top left corner of the grid
+    ## @var cell_size
+    #  cell size, in canvas units
+    ## @var counts
+    #  array (3, cells) of decayed counts, per outcome
+    ## @var cells
+    #  list of LoraCell
+    def __init__(self, parent_canvas_item, bounds):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param parent_canvas_item: parent canvas item
+        @param bounds: (min_x, min_y, max_x, max_y) canvas bounds of the deployment
+        """
+        min_x, min_y, max_x, max_y = bounds
+        self.cell_size = max(max_x - min_x, max_y - min_y, PIXELS_PER_METER) / LORA_GRID_CELLS
+        # one extra cell, so that the devices on the max bounds are inside
+        self.cell_size *= LORA_GRID_CELLS / (LORA_GRID_CELLS - 1.0)
+        self.origin = (min_x, min_y)
+        self.counts = numpy.zeros((3, LORA_GRID_CELLS * LORA_GRID_CELLS))
+        self.cells = [
+            LoraCell(self, index, parent_canvas_item)
+            for index in range(LORA_GRID_CELLS * LORA_GRID_CELLS)
+        ]
+
+    def cell_origin(self, index):
+        """!
+        Get the top left corner of a cell
+
+        @param self: this object
+        @param index: cell index
+        @return canvas position
+        """
+        row, column = divmod(index, LORA_GRID_CELLS)
+        return (self.origin[0] + column * self.cell_size, self.origin[1] + row * self.cell_size)
+
+    def add(self, positions_x, positions_y, outcomes, decay):
+        """!
+        Decay the counts and add transmissions; devices outside of the grid
+        are counted in the nearest border cell
+
+        @param self: this object
+        @param positions_x: array of device x positions, in meters
+        @param positions_y: array of device y positions, in meters
+        @param outcomes: array of transmission outcomes
+        @param decay: factor applied to the previous counts
+        @return none
+        """
+        self.counts *= decay
+        if not len(outcomes):
+            return
+        columns = numpy.clip(
+            ((positions_x * PIXELS_PER_METER - self.origin[0]) / self.cell_size).astype(int),
+            0,
+            LORA_GRID_CELLS - 1,
+        )
+        rows = numpy.clip(
+            ((positions_y * PIXELS_PER_METER - self.origin[1]) / self.cell_size).astype(int),
+            0,
+            LORA_GRID_CELLS - 1,
+        )
+        cells = rows * LORA_GRID_CELLS + columns
+        self.counts += numpy.bincount(
+            outcomes.astype(int) * self.counts.shape[1] + cells, minlength=self.counts.size
+        ).reshape(self.counts.shape)
+
+    def draw(self):
+        """!
+        Update the cell items: the fill colour goes from red to green with
+        the reception success ratio, its opacity grows with the traffic, and
+        the size of the orange disc grows with the collisions.
+
+        @param self: this object
+        @return none
+        """
+        totals = self.counts.sum(axis=0)
+        max_total = totals.max()
+        max_collided = self.counts[COLLIDED].max()
+        for cell, total, received, collided in zip(
+            self.cells, totals, self.counts[RECEIVED], self.counts[COLLIDED]
+        ):
+            if total < 1e-3:
+                cell.rect.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+                cell.heat.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+                continue
+            ratio = received / total
+            alpha = 0x30 + int(0x70 * total / max_total)
+            color = (int(0xFF * (1 - ratio)) << 24) | (int(0xC0 * ratio) << 16) | alpha
+            cell.rect.set_properties(
+                fill_color_rgba=color, visibility=GooCanvas.CanvasItemVisibility.VISIBLE
+            )
+            if collided < 1e-3:
+                cell.heat.set_property("visibility", GooCanvas.CanvasItemVisibility.HIDDEN)
+                continue
+            radius = self.cell_size * 0.4 * math.sqrt(collided / max_collided)
+            cell.heat.set_properties(
+                radius_x=radius,
+                radius_y=radius,
+                fill_color_rgba=0xFF8C00C0,
+                visibility=GooCanvas.CanvasItemVisibility.VISIBLE,
+            )
+
+    def destroy(self):
+        """!
+        Remove the cell items from the canvas
+
+        @param self: this object
+        @return none
+        """
+        for cell in self.cells:
+            cell.rect.remove()
+            cell.heat.remove()
+        self.cells = []
+
+
+## LoraMonitor class
+class LoraMonitor(object):
+    """
+    Shows LoRaWAN deployments: end devices are coloured by the spreading
+    factor of their last transmission (see LORA_SF_COLORS), and the
+    reception success and collisions at the gateway are aggregated on a
+    grid of cells instead of being drawn per packet.
+
+    Transmissions are buffered in C++ by a LoraSampleCollector, connected
+    to the "Transmission" trace source of the LORA_END_DEVICE_TYPE
+    applications, and taken once per sample period; only the devices whose
+    spreading factor changed are redrawn, so the cost of a frame does not
+    grow with the number of end devices.
+    """
+
+    ## @var collector
+    #  LoraSampleCollector
+    ## @var group
+    #  canvas group of the grid
+    ## @var grid
+    #  LoraGrid, or None if there are no end devices
+    ## @var _changes
+    #  list of (node id, spreading factor) not drawn yet
+    ## @var _last_time
+    #  simulation time of the previous update, in seconds
+    ## @var _dirty
+    #  whether the grid must be redrawn
+    def __init__(self, viz):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param viz: visualization object
+        """
+        self.collector = ns.LoraSampleCollector()
+        self.group = GooCanvas.CanvasGroup()
+        viz.canvas.get_root_item().add_child(self.group, -1)
+        self.group.lower(viz.links_group)
+        self.grid = None
+        self._changes = []
+        self._last_time = 0.0
+        self._dirty = False
+
+    def scan_nodes(self, viz):
+        """!
+        Find the end devices and the gateways
+
+        @param self: this object
+        @param viz: visualization object
+        @return none
+        """
+        if self.grid is not None:
+            self.grid.destroy()
+            self.grid = None
+        self._changes = []
+        devices = list(self.collector.ScanDevices(LORA_END_DEVICE_TYPE))
+        if not devices:
+            return
+        gateways = list(self.collector.ScanGateways(LORA_GATEWAY_TYPE))
+        for node_id in gateways:
+            node = viz.get_node(node_id)
+            node.set_color(LORA_GATEWAY_COLOR)
+            node.set_label("Gateway %i" % node_id)
+
+        positions = numpy.array(
+            [viz.get_node(node_id).get_position() for node_id in devices + gateways]
+        )
+        bounds = tuple(positions.min(axis=0)) + tuple(positions.max(axis=0))
+        self.grid = LoraGrid(self.group, bounds)
+        self._last_time = ns.Simulator.Now().GetSeconds()
+
+    def simulation_periodic_update(self, viz):
+        """!
+        Take the transmissions of the last sample period
+
+        @param self: this object
+        @param viz: visualization object
+        @return none
+        """
+        if self.grid is None:
+            return
+        samples = self.collector.GetSamples()
+        self._changes.extend(
+            (change.nodeId, change.spreadingFactor)
+            for change in self.collector.GetSpreadingFactorChanges()
+        )
+        now = ns.Simulator.Now().GetSeconds()
+        decay = 0.5 ** ((now - self._last_time) / LORA_HALF_LIFE)
+        self._last_time = now
+        self.grid.add(
+            _column(samples.positionsX, numpy.float64),
+            _column(samples.positionsY, numpy.float64),
+            _column(samples.outcomes, numpy.uint8),
+            decay,
+        )
+        self._dirty = True
+
+    def update_view(self, viz):
+        """!
+        Redraw the devices whose spreading factor changed, and the grid
+
+        @param self: this object
+        @param viz: visualization object
+        @return none
+        """
+        for node_id, spreading_factor in self._changes:
+            color = LORA_SF_COLORS.get(spreading_factor)
+            if color is not None:
+                viz.get_node(node_id).set_color(color)
+        self._changes = []
+        if self._dirty:
+            self.grid.draw()
+            self._dirty = False
+
+
+def register(viz):
+    monitor = LoraMonitor(viz)
+    viz.connect("topology-scanned", monitor.scan_nodes)
+    viz.connect("simulation-periodic-update", monitor.simulation_periodic_update)
+    viz.connect("update-view", monitor.update_view)
@@ -126,16 +126,23 @@ class WifiLink(Link):
 
 ## WifiLinkMonitor class
 class WifiLinkMonitor(object):
-    ## @var access_points
-    #  bssid -> node
+    """
+    Shows the association of Wi-Fi stations to access points.  Associations
+    are tracked by a WifiAssociationCollector, connected to the Assoc and
+    DeAssoc trace sources of the stations, so each periodic update only
+    touches the stations whose association changed.
+    """
+
+    ## @var collector
+    #  WifiAssociationCollector
     ## @var stations
-    #  list of (sta_netdevice, viz_node, wifi_link)
+    #  list of (sta_netdevice, viz_node, wifi_link), in ScanStations order
     def __init__(self, dummy_viz):
         """! Initialize function.
         @param self The object pointer.
         @param dummy_viz A dummy visualizer
         """
-        self.access_points = {}  # bssid -> node
+        self.collector = ns.WifiAssociationCollector()
         self.stations = []  # list of (sta_netdevice, viz_node, wifi_link)
 
     def scan_nodes(self, viz):
@@ -147,24 +154,11 @@ class WifiLinkMonitor(object):
         for sta_netdevice, viz_node, wifi_link in self.stations:
             wifi_link.destroy()
 
-        self.access_points = {}
         self.stations = []
-
-        for node in viz.nodes.values():
-            ns3_node = ns.NodeList.GetNode(node.node_index)
-            for devI in range(ns3_node.GetNDevices()):
-                dev = ns3_node.GetDevice(devI)
-                if not isinstance(dev, ns.WifiNetDevice):
-                    continue
-                wifi_mac = dev.GetMac()
-                if isinstance(wifi_mac, ns.StaWifiMac):
-                    wifi_link = WifiLink(viz.links_group, node, dev)
-                    self.stations.append((dev, node, wifi_link))
-                elif isinstance(wifi_mac, ns.ApWifiMac):
-                    bssid = ns.Mac48Address.ConvertFrom(dev.GetAddress())
-                    self.access_points[str(bssid)] = node
-        # print "APs: ", self.access_points
-        # print "STAs: ", self.stations
+        for station in self.collector.ScanStations():
+            node = viz.get_node(station.nodeId)
+            wifi_link = WifiLink(viz.links_group, node, station.device)
+            self.stations.append((station.device, node, wifi_link))
 
     def simulation_periodic_update(self, viz):
         """! Simulation Periodic Update function.
@@ -172,16 +166,12 @@ class WifiLinkMonitor(object):
         @param viz The visualizer object
         @return none
         """
-        for sta_netdevice, viz_node, wifi_link in self.stations:
-            if not sta_netdevice.IsLinkUp():
-                wifi_link.set_ap(None)
-                continue
-            bssid = str(sta_netdevice.GetMac().GetBssid())
-            if bssid == "00:00:00:00:00:00":
+        for change in self.collector.GetChanges():
+            dummy_sta_netdevice, dummy_viz_node, wifi_link = self.stations[change.station]
+            if change.apNodeId < 0:
                 wifi_link.set_ap(None)
-                continue
-            ap = self.access_points[bssid]
-            wifi_link.set_ap(ap)
+            else:
+                wifi_link.set_ap(viz.get_node(change.apNodeId))
 
     def update_view(self, viz):
         """! Update View function.
@@ -0,0 +1,394 @@
+# -*- Mode: python; coding: utf-8 -*-
+"""
+Replay of recorded visualizer sessions, without the simulator.
+
+Traces are recorded either by the GUI, with the TraceOutput attribute of
+VisualSimulatorImpl, or headless, by giving the OffscreenOutput attribute a
+file name ending in '.vztrace'.  Then:
+
+  python3 -m visualizer.replay run.vztrace
+
+opens a window to play the trace at any speed, pause it, and scrub or seek
+with the time slider, and:
+
+  python3 -m visualizer.replay run.vztrace --export frames/
+
+renders every frame to PNG files (or to a '.frames' stream), like the
+offscreen mode does, without a display.
+"""
+
+import argparse
+import io
+import math
+import os
+import sys
+import time
+
+from .headless import DEFAULT_TRANSMISSIONS_MEMORY, merge_sample_totals
+from .offscreen import (
+    FRAME_HEADER,
+    FRAME_STREAM_MAGIC,
+    OffscreenChannel,
+    OffscreenLink,
+    OffscreenNode,
+    render_frame,
+)
+from .trace import TraceReader
+
+REPLAY_TIMER_INTERVAL = 40  # milliseconds between two replay steps
+REPLAY_SPEEDS = (0.1, 1000.0)  # range of replay speeds, in simulated seconds per second
+
+# imported by import_gtk() when the replay window is opened, so that
+# exporting frames needs neither a display nor GTK
+GLib = None
+Gtk = None
+
+
+def import_gtk():
+    """!
+    Import GTK 3, which only the replay window needs.
+
+    @return whether GTK could be imported
+    """
+    global GLib, Gtk
+    try:
+        import gi
+
+        gi.require_version("Gtk", "3.0")
+        from gi.repository import GLib, Gtk
+    except (ImportError, ValueError):
+        return False
+    return True
+
+
+## ReplayScene class
+class ReplayScene(object):
+    """
+    Nodes, channels and links of a trace, positioned as in a given frame.
+    """
+
+    ## @var trace
+    #  TraceReader
+    ## @var nodes
+    #  node index -> OffscreenNode
+    ## @var channels
+    #  list of OffscreenChannel
+    ## @var links
+    #  list of OffscreenLink
+    ## @var bounds
+    #  canvas bounds (min_x, min_y, max_x, max_y) of the whole trace
+    ## @var frame
+    #  index of the current frame
+    def __init__(self, trace):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param trace: the TraceReader
+        """
+        self.trace = trace
+        topology = trace.topology
+        self.nodes = {}
+        for index, (x, y, color, has_mobility) in enumerate(topology["nodes"]):
+            node = OffscreenNode(index)
+            node.set_position(x, y)
+            node.set_color(color)
+            node._has_mobility = has_mobility
+            self.nodes[index] = node
+        self.channels = []
+        for x, y in topology["channels"]:
+            channel = OffscreenChannel(None)
+            channel.set_position(x, y)
+            self.channels.append(channel)
+        self.links = []
+        for node_index, kind, other_index in topology["links"]:
+            other = self.channels[other_index] if kind == "channel" else self.nodes[other_index]
+            self.links.append(OffscreenLink(self.nodes[node_index], other))
+
+        objects = list(self.nodes.values()) + self.channels
+        bounds = trace.position_bounds()
+        if objects:
+            topology_bounds = (
+                min(obj.x for obj in objects),
+                min(obj.y for obj in objects),
+                max(obj.x for obj in objects),
+                max(obj.y for obj in objects),
+            )
+            if bounds is None:
+                bounds = topology_bounds
+            else:
+                bounds = (
+                    min(bounds[0], topology_bounds[0]),
+                    min(bounds[1], topology_bounds[1]),
+                    max(bounds[2], topology_bounds[2]),
+                    max(bounds[3], topology_bounds[3]),
+                )
+        self.bounds = bounds
+        self.frame = None
+        self._transmissions = {}
+        self._drops = {}
+        self.seek(0)
+
+    def seek(self, frame):
+        """!
+        Move to a frame
+
+        @param self: this object
+        @param frame: frame index
+        @return none
+        """
+        if not len(self.trace) or frame == self.frame:
+            return
+        self.frame = frame
+        snapshot = self.trace[frame]
+        for node_index, (x, y) in zip(snapshot.position_nodes, snapshot.positions):
+            if not math.isnan(x):
+                self.nodes[node_index].set_position(x, y)
+
+        # smooth transmissions over the last frames, as the GUI does
+        first = max(0, frame - DEFAULT_TRANSMISSIONS_MEMORY + 1)
+        snapshots = [snapshot] + [self.trace[i] for i in range(first, frame)]
+        self._transmissions = merge_sample_totals(s.transmissions for s in snapshots)
+        self._drops = merge_sample_totals(s.drops for s in snapshots)
+
+    def period(self):
+        """!
+        Get the duration of the sample period of the current frame
+
+        @param self: this object
+        @return duration, in seconds
+        """
+        times = self.trace.times
+        if self.frame and times[self.frame] > times[self.frame - 1]:
+            return float(times[self.frame] - times[self.frame - 1])
+        return self.trace.topology["sample_period"]
+
+    def time(self):
+        """!
+        Get the simulation time of the current frame
+
+        @param self: this object
+        @return time, in seconds
+        """
+        if self.frame is None:
+            return 0.0
+        return float(self.trace.times[self.frame])
+
+    def render(self, width, height):
+        """!
+        Render the current frame
+
+        @param self: this object
+        @param width: frame width, in pixels
+        @param height: frame height, in pixels
+        @return a cairo.ImageSurface
+        """
+        return render_frame(
+            width,
+            height,
+            self.bounds,
+            self.nodes.values(),
+            self.channels,
+            self.links,
+            self._transmissions,
+            self._drops,
+            self.period(),
+            self.time(),
+        )
+
+
+def export_frames(scene, output, width, height):
+    """!
+    Render every frame of a trace, like the offscreen mode does.
+
+    @param scene: the ReplayScene
+    @param output: directory for PNG frames, or a '.frames' stream file name
+    @param width: frame width, in pixels
+    @param height: frame height, in pixels
+    @return the number of frames written
+    """
+    stream = None
+    if output.endswith(".frames"):
+        stream = open(output, "wb")
+        stream.write(FRAME_STREAM_MAGIC)
+    else:
+        os.makedirs(output, exist_ok=True)
+    try:
+        for frame in range(len(scene.trace)):
+            scene.seek(frame)
+            surface = scene.render(width, height)
+            if stream is not None:
+                buf = io.BytesIO()
+                surface.write_to_png(buf)
+                data = buf.getvalue()
+                stream.write(FRAME_HEADER.pack(scene.time(), len(data)))
+                stream.write(data)
+            else:
+                surface.write_to_png(os.path.join(output, "frame-%06i.png" % frame))
+    finally:
+        if stream is not None:
+            stream.close()
+    return len(scene.trace)
+
+
+## ReplayWindow class
+class ReplayWindow(object):
+    """
+    Window playing a trace, with play/pause, speed and time slider controls.
+    """
+
+    ## @var scene
+    #  ReplayScene
+    ## @var window
+    #  Gtk.Window
+    ## @var drawing_area
+    #  Gtk.DrawingArea showing the frames
+    ## @var play_button
+    #  Gtk.ToggleButton
+    ## @var speed
+    #  Gtk.Adjustment, in simulated seconds per second
+    ## @var time_slider
+    #  Gtk.Scale, in simulated seconds
+    ## @var time_label
+    #  Gtk.Label
+    ## @var replay_time
+    #  simulation time being replayed, in seconds
+    def __init__(self, scene, speed=1.0):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param scene: the ReplayScene
+        @param speed: initial replay speed, in simulated seconds per second
+        """
+        self.scene = scene
+        times = scene.trace.times
+        start_time = float(times[0]) if len(times) else 0.0
+        end_time = float(times[-1]) if len(times) else 0.0
+        self.replay_time = start_time
+        self._last_step = None
+        self._seeking = False
+
+        self.window = Gtk.Window(title="ns-3 replay: %s" % scene.trace.file_name)
+        self.window.set_default_size(1024, 768)
+        self.window.connect("delete-event", lambda *dummy_args: Gtk.main_quit())
+        vbox = Gtk.VBox()
+        self.window.add(vbox)
+
+        self.drawing_area = Gtk.DrawingArea()
+        self.drawing_area.connect("draw", self._on_draw)
+        vbox.pack_start(self.drawing_area, True, True, 0)
+
+        hbox = Gtk.HBox()
+        vbox.pack_start(hbox, False, False, 4)
+        self.play_button = Gtk.ToggleButton(label="Play")
+        self.play_button.connect("toggled", self._on_play_button_toggled)
+        hbox.pack_start(self.play_button, False, False, 4)
+
+        hbox.pack_start(Gtk.Label(label="Speed:"), False, False, 4)
+        self.speed = Gtk.Adjustment(
+            value=speed, lower=REPLAY_SPEEDS[0], upper=REPLAY_SPEEDS[1], step_increment=0.1
+        )
+        speed_spin = Gtk.SpinButton(adjustment=self.speed, digits=1)
+        hbox.pack_start(speed_spin, False, False, 4)
+
+        self.time_slider = Gtk.Scale.new_with_range(
+            Gtk.Orientation.HORIZONTAL, start_time, max(end_time, start_time + 1e-6), 0.1
+        )
+        self.time_slider.set_draw_value(False)
+        self.time_slider.connect("value-changed", self._on_time_slider_changed)
+        hbox.pack_start(self.time_slider, True, True, 4)
+
+        self.time_label = Gtk.Label()
+        hbox.pack_start(self.time_label, False, False, 4)
+
+        self._update_time_label()
+        self.window.show_all()
+        GLib.timeout_add(REPLAY_TIMER_INTERVAL, self._step)
+
+    def seek(self, replay_time):
+        """!
+        Show the frame at a given simulation time
+
+        @param self: this object
+        @param replay_time: simulation time, in seconds
+        @return none
+        """
+        self.replay_time = replay_time
+        self.scene.seek(self.scene.trace.find_frame(replay_time))
+        self._seeking = True
+        try:
+            self.time_slider.set_value(replay_time)
+        finally:
+            self._seeking = False
+        self._update_time_label()
+        self.drawing_area.queue_draw()
+
+    def _update_time_label(self):
+        self.time_label.set_text(
+            "Time: %f s (frame %i/%i)"
+            % (self.scene.time(), (self.scene.frame or 0) + 1, len(self.scene.trace))
+        )
+
+    def _on_draw(self, widget, cr):
+        allocation = widget.get_allocation()
+        surface = self.scene.render(allocation.width, allocation.height)
+        cr.set_source_surface(surface, 0, 0)
+        cr.paint()
+        return True
+
+    def _on_play_button_toggled(self, button):
+        self._last_step = None
+        button.set_label("Pause" if button.get_active() else "Play")
+        times = self.scene.trace.times
+        if button.get_active() and len(times) and self.replay_time >= times[-1]:
+            self.seek(float(times[0]))
+
+    def _on_time_slider_changed(self, slider):
+        if not self._seeking:
+            self.seek(slider.get_value())
+
+    def _step(self):
+        now = time.time()
+        if self.play_button.get_active() and self._last_step is not None:
+            times = self.scene.trace.times
+            replay_time = self.replay_time + (now - self._last_step) * self.speed.get_value()
+            if not len(times) or replay_time >= times[-1]:
+                replay_time = float(times[-1]) if len(times) else 0.0
+                self.play_button.set_active(False)
+            self.seek(replay_time)
+        self._last_step = now
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded visualizer session")
+    parser.add_argument("trace", help="trace file, recorded by the visualizer")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="simulated seconds per second (default 1)"
+    )
+    parser.add_argument(
+        "--export",
+        metavar="OUTPUT",
+        help="render all the frames to a directory of PNG files, or to a '.frames' stream,"
+        " instead of opening a window",
+    )
+    parser.add_argument("--width", type=int, default=1024, help="exported frame width")
+    parser.add_argument("--height", type=int, default=768, help="exported frame height")
+    args = parser.parse_args(argv)
+
+    scene = ReplayScene(TraceReader(args.trace))
+    if args.export:
+        frames = export_frames(scene, args.export, args.width, args.height)
+        print("replay: wrote %i frames to %s" % (frames, args.export))
+        return 0
+    if not import_gtk():
+        print("replay: PyGObject and GTK 3 are needed to open the replay window", file=sys.stderr)
+        return 1
+    ReplayWindow(scene, args.speed)
+    Gtk.main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import collections
+import threading
+import time
+
+SNAPSHOT_RUN_AHEAD = 4  # maximum number of published snapshots not yet consumed by the view
+THROUGHPUT_WINDOW = 5.0  # wall-clock seconds over which the simulation throughput is measured
+
+## Snapshot class
+#
+# Immutable state of the simulation at the end of a sample period, published
+# by the simulation thread for the view:
+#  - time: simulation time, in seconds
+#  - position_nodes: tuple of node indices, the rows of positions
+#  - positions: canvas positions of position_nodes (see get_node_positions)
+#  - transmissions: dict mapping (transmitter id, receiver id) to bytes
+#  - drops: dict mapping transmitter id to dropped bytes
+#  - node_statistics: dict mapping node id to a tuple of NetDeviceStatistics
+#  - pause_messages: tuple of pause messages
+Snapshot = collections.namedtuple(
+    "Snapshot",
+    [
+        "time",
+        "position_nodes",
+        "positions",
+        "transmissions",
+        "drops",
+        "node_statistics",
+        "pause_messages",
+    ],
+)
+
+## NetDeviceStatistics class
+#
+# Python copy of PyViz::NetDeviceStatistics, safe to use outside the
+# simulation lock.
+NetDeviceStatistics = collections.namedtuple(
+    "NetDeviceStatistics",
+    ["transmittedBytes", "receivedBytes", "transmittedPackets", "receivedPackets"],
+)
+
+
+def copy_node_statistics(nodes_statistics):
+    """!
+    Copy the result of PyViz::GetNodesStatistics into Python objects.
+
+    @param nodes_statistics: vector of PyViz::NodeStatistics
+    @return dict mapping node id to a tuple of NetDeviceStatistics, one per interface
+    """
+    return dict(
+        (
+            stats.nodeId,
+            tuple(
+                NetDeviceStatistics(
+                    iface.transmittedBytes,
+                    iface.receivedBytes,
+                    iface.transmittedPackets,
+                    iface.receivedPackets,
+                )
+                for iface in stats.statistics
+            ),
+        )
+        for stats in nodes_statistics
+    )
+
+
+## SnapshotQueue class
+class SnapshotQueue(object):
+    """
+    Bounded single-producer, single-consumer queue of snapshots.
+
+    The consumer (the view) never blocks: drain() returns whatever was
+    published since the previous call.  The producer (the simulation thread)
+    blocks in publish() only when capacity snapshots are waiting, which
+    bounds how far the simulation runs ahead of the view.  Both sides rely on
+    the atomicity of deque.append() and deque.popleft().
+    """
+
+    ## @var capacity
+    #  maximum number of unconsumed snapshots
+    ## @var latest
+    #  last snapshot returned by drain(), or None
+    ## @var _snapshots
+    #  unconsumed snapshots, oldest first
+    ## @var _space
+    #  event set when the queue is not full
+    ## @var _closed
+    #  whether close() was called
+    def __init__(self, capacity=SNAPSHOT_RUN_AHEAD):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param capacity: maximum number of unconsumed snapshots
+        """
+        assert capacity > 0
+        self.capacity = capacity
+        self.latest = None
+        self._snapshots = collections.deque()
+        self._space = threading.Event()
+        self._space.set()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def publish(self, snapshot):
+        """!
+        Publish a snapshot, waiting first while the queue is full
+
+        @param self: this object
+        @param snapshot: the snapshot
+        @return False if the queue was closed while waiting, True otherwise
+        """
+        while len(self._snapshots) >= self.capacity:
+            self._space.clear()
+            if self._closed:
+                return False
+            if len(self._snapshots) < self.capacity:
+                break
+            self._space.wait()
+        self._snapshots.append(snapshot)
+        return True
+
+    def drain(self):
+        """!
+        Take all the published snapshots, without blocking
+
+        @param self: this object
+        @return list of snapshots, oldest first (possibly empty)
+        """
+        snapshots = []
+        while True:
+            try:
+                snapshots.append(self._snapshots.popleft())
+            except IndexError:
+                break
+        self._space.set()
+        if snapshots:
+            self.latest = snapshots[-1]
+        return snapshots
+
+    def close(self):
+        """!
+        Wake up and refuse a producer waiting in publish()
+
+        @param self: this object
+        @return none
+        """
+        self._closed = True
+        self._space.set()
+
+
+## ThroughputMeter class
+class ThroughputMeter(object):
+    """
+    Measures the simulation throughput, in simulated seconds per wall-clock
+    second, over a sliding window.
+    """
+
+    ## @var window
+    #  window length, in wall-clock seconds
+    ## @var _samples
+    #  (wall-clock time, simulation time) samples, oldest first
+    def __init__(self, window=THROUGHPUT_WINDOW):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param window: window length, in wall-clock seconds
+        """
+        self.window = window
+        self._samples = collections.deque()
+
+    def add(self, sim_time, wall_time=None):
+        """!
+        Record the simulation time reached at some wall-clock time
+
+        @param self: this object
+        @param sim_time: simulation time, in seconds
+        @param wall_time: wall-clock time; None for now
+        @return none
+        """
+        if wall_time is None:
+            wall_time = time.time()
+        self._samples.append((wall_time, sim_time))
+        while len(self._samples) > 2 and wall_time - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    def reset(self):
+        """!
+        Forget the recorded samples, e.g. when the simulation is paused
+
+        @param self: this object
+        @return none
+        """
+        self._samples.clear()
+
+    def rate(self):
+        """!
+        Get the throughput
+
+        @param self: this object
+        @return simulated seconds per wall-clock second, or None if unknown
+        """
+        if len(self._samples) < 2:
+            return None
+        wall1, sim1 = self._samples[0]
+        wall2, sim2 = self._samples[-1]
+        if wall2 <= wall1:
+            return None
+        return (sim2 - sim1) / (wall2 - wall1)
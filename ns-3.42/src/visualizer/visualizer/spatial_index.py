@@ -0,0 +1,153 @@
+import math
+
+DEFAULT_CELL_SIZE = 100.0  # grid cell size, in canvas units
+
+
+## GridSpatialIndex class
+class GridSpatialIndex(object):
+    """
+    Uniform grid over canvas coordinates, mapping each cell to the objects
+    located in it.  Moving an object only touches the cells it leaves and
+    enters, so the index can be kept up to date on every position change.
+    """
+
+    ## @var cell_size
+    #  cell size, in canvas units
+    ## @var _cells
+    #  (cell x, cell y) -> set of objects
+    ## @var _positions
+    #  object -> (x, y, cell)
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param cell_size: cell size, in canvas units
+        """
+        assert cell_size > 0
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, obj):
+        return obj in self._positions
+
+    def _cell(self, x, y):
+        return (int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size)))
+
+    def update(self, obj, x, y):
+        """!
+        Insert an object, or move it to a new position
+
+        @param self: this object
+        @param obj: the object
+        @param x: x position, in canvas units
+        @param y: y position, in canvas units
+        @return none
+        """
+        cell = self._cell(x, y)
+        try:
+            old_x, old_y, old_cell = self._positions[obj]
+        except KeyError:
+            old_cell = None
+        if old_cell != cell:
+            if old_cell is not None:
+                old_members = self._cells[old_cell]
+                old_members.discard(obj)
+                if not old_members:
+                    del self._cells[old_cell]
+            self._cells.setdefault(cell, set()).add(obj)
+        self._positions[obj] = (x, y, cell)
+
+    def remove(self, obj):
+        """!
+        Remove an object from the index
+
+        @param self: this object
+        @param obj: the object
+        @return none
+        """
+        try:
+            x, y, cell = self._positions.pop(obj)
+        except KeyError:
+            return
+        members = self._cells[cell]
+        members.discard(obj)
+        if not members:
+            del self._cells[cell]
+
+    def get_position(self, obj):
+        """!
+        Get the indexed position of an object
+
+        @param self: this object
+        @param obj: the object
+        @return (x, y), or None if the object is not indexed
+        """
+        try:
+            x, y, cell = self._positions[obj]
+        except KeyError:
+            return None
+        return x, y
+
+    def query_rect(self, x1, y1, x2, y2):
+        """!
+        Find the objects inside a rectangle
+
+        @param self: this object
+        @param x1: minimum x of the rectangle
+        @param y1: minimum y of the rectangle
+        @param x2: maximum x of the rectangle
+        @param y2: maximum y of the rectangle
+        @return list of objects
+        """
+        cx1, cy1 = self._cell(x1, y1)
+        cx2, cy2 = self._cell(x2, y2)
+        result = []
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            # the rectangle spans more cells than are occupied: scan the occupied ones
+            cells = [
+                members
+                for (cx, cy), members in self._cells.items()
+                if cx1 <= cx <= cx2 and cy1 <= cy <= cy2
+            ]
+        else:
+            cells = []
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    members = self._cells.get((cx, cy))
+                    if members:
+                        cells.append(members)
+        positions = self._positions
+        for members in cells:
+            for obj in members:
+                x, y, dummy_cell = positions[obj]
+                if x1 <= x <= x2 and y1 <= y <= y2:
+                    result.append(obj)
+        return result
+
+    def nearest(self, x, y, max_distance):
+        """!
+        Find the object nearest to a point
+
+        @param self: this object
+        @param x: x coordinate of the point
+        @param y: y coordinate of the point
+        @param max_distance: ignore objects farther than this distance
+        @return the nearest object, or None if none is within max_distance
+        """
+        best = None
+        best_distance2 = max_distance * max_distance
+        candidates = self.query_rect(
+            x - max_distance, y - max_distance, x + max_distance, y + max_distance
+        )
+        for obj in candidates:
+            ox, oy, dummy_cell = self._positions[obj]
+            distance2 = (ox - x) ** 2 + (oy - y) ** 2
+            if distance2 <= best_distance2:
+                best = obj
+                best_distance2 = distance2
+        return best
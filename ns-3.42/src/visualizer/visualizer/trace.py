@@ -0,0 +1,462 @@
+# -*- Mode: python; coding: utf-8 -*-
+"""
+Compact binary trace of visualizer sessions, for replay without a simulator.
+
+A trace records the topology once, then the Snapshot of every sample
+period, grouped in chunks of columnar arrays that are read back through a
+memory map:
+
+  - header: C{TRACE_MAGIC}, C{TRACE_HEADER} (format version, length of the
+    topology description) and the topology description (UTF-8 JSON), padded
+    to 8 bytes;
+  - chunks: C{CHUNK_HEADER} (C{CHUNK_MAGIC}, chunk size in bytes, number of
+    frames, positions, transmissions, drops and statistics records), then
+    the frame times, one offset array per record type giving the records of
+    each frame, and the record arrays (C{POSITION_DTYPE},
+    C{TRANSMISSION_DTYPE}, C{DROP_DTYPE}, C{STATISTICS_DTYPE}), each padded
+    to 8 bytes;
+  - index: C{INDEX_MAGIC}, the number of chunks and one C{INDEX_DTYPE}
+    record per chunk;
+  - footer: C{TRACE_FOOTER} (offset of the index, C{TRACE_END_MAGIC}).
+
+A trace whose writer did not close it (e.g. the simulation crashed) has no
+index; the reader then rebuilds it by walking the chunk headers.
+"""
+
+import bisect
+import json
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .snapshot import NetDeviceStatistics, Snapshot
+
+TRACE_MAGIC = b"NS3VIZT1"
+TRACE_END_MAGIC = b"NS3VIZTE"
+TRACE_VERSION = 1
+TRACE_HEADER = struct.Struct("<II")
+TRACE_FOOTER = struct.Struct("<Q8s")
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sQIIIII4x")
+INDEX_MAGIC = b"INDX"
+INDEX_HEADER = struct.Struct("<4sI")
+CHUNK_FRAMES = 256  # frames per chunk
+
+if numpy is not None:
+    POSITION_DTYPE = numpy.dtype([("node", "<u4"), ("x", "<f4"), ("y", "<f4")])
+    TRANSMISSION_DTYPE = numpy.dtype(
+        [("transmitter", "<u4"), ("receiver", "<u4"), ("bytes", "<u4")]
+    )
+    DROP_DTYPE = numpy.dtype([("transmitter", "<u4"), ("bytes", "<u4")])
+    STATISTICS_DTYPE = numpy.dtype(
+        [
+            ("node", "<u4"),
+            ("interface", "<u4"),
+            ("transmitted_bytes", "<u8"),
+            ("received_bytes", "<u8"),
+            ("transmitted_packets", "<u8"),
+            ("received_packets", "<u8"),
+        ]
+    )
+    INDEX_DTYPE = numpy.dtype(
+        [("offset", "<u8"), ("first_time", "<f8"), ("last_time", "<f8"), ("frames", "<u8")]
+    )
+
+
+def _check_numpy():
+    if numpy is None:
+        raise RuntimeError("NumPy is required to record and replay visualizer traces")
+
+
+def _padding(length):
+    return -length % 8
+
+
+def get_topology(viz, sample_period):
+    """!
+    Describe the topology shown by a visualizer, for TraceWriter.
+
+    @param viz: the visualizer (GUI or offscreen), after scan_topology
+    @param sample_period: simulated time between two snapshots, in seconds
+    @return dict with the node positions, colors and mobility, channel
+    positions and links, serializable to JSON
+    """
+    nodes = []
+    for index in range(max(viz.nodes) + 1 if viz.nodes else 0):
+        node = viz.get_node(index)
+        x, y = node.get_position()
+        color = node._color if hasattr(node, "_color") else node.color
+        nodes.append([x, y, color, bool(node.has_mobility)])
+    channel_index = {}
+    channels = []
+    for channel in viz.channels.values():
+        channel_index[id(channel)] = len(channels)
+        channels.append(list(channel.get_position()))
+    links = []
+    for link in viz.links:
+        if id(link.node2) in channel_index:
+            links.append([link.node1.node_index, "channel", channel_index[id(link.node2)]])
+        else:
+            links.append([link.node1.node_index, "node", link.node2.node_index])
+    return {"sample_period": sample_period, "nodes": nodes, "channels": channels, "links": links}
+
+
+## TraceWriter class
+class TraceWriter(object):
+    """
+    Records snapshots into a trace file.
+    """
+
+    ## @var file_name
+    #  trace file name
+    ## @var frame_count
+    #  number of frames recorded so far
+    ## @var _file
+    #  trace file
+    ## @var _frames
+    #  snapshots of the chunk being filled
+    ## @var _index
+    #  list of (offset, first time, last time, frames) of the written chunks
+    def __init__(self, file_name, topology):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param file_name: trace file name
+        @param topology: topology description, see get_topology()
+        """
+        _check_numpy()
+        self.file_name = file_name
+        self.frame_count = 0
+        self._frames = []
+        self._index = []
+        self._file = open(file_name, "wb")
+        topology_data = json.dumps(topology).encode("utf-8")
+        self._file.write(TRACE_MAGIC)
+        self._file.write(TRACE_HEADER.pack(TRACE_VERSION, len(topology_data)))
+        self._file.write(topology_data)
+        self._file.write(b"\0" * _padding(len(topology_data)))
+
+    def write(self, snapshot):
+        """!
+        Record a snapshot
+
+        @param self: this object
+        @param snapshot: the Snapshot
+        @return none
+        """
+        self._frames.append(snapshot)
+        self.frame_count += 1
+        if len(self._frames) >= CHUNK_FRAMES:
+            self._write_chunk()
+
+    def _write_chunk(self):
+        frames = self._frames
+        if not frames:
+            return
+        self._frames = []
+
+        positions = []
+        transmissions = []
+        drops = []
+        statistics = []
+        offsets = numpy.zeros((4, len(frames) + 1), dtype="<u4")
+        for i, snapshot in enumerate(frames):
+            for node, (x, y) in zip(snapshot.position_nodes, snapshot.positions):
+                positions.append((node, x, y))
+            for (transmitter, receiver), rx_bytes in snapshot.transmissions.items():
+                transmissions.append((transmitter, receiver, rx_bytes))
+            for transmitter, drop_bytes in snapshot.drops.items():
+                drops.append((transmitter, drop_bytes))
+            for node, interfaces in snapshot.node_statistics.items():
+                for interface, stats in enumerate(interfaces):
+                    statistics.append((node, interface) + tuple(stats))
+            offsets[:, i + 1] = (len(positions), len(transmissions), len(drops), len(statistics))
+
+        arrays = [
+            numpy.array([snapshot.time for snapshot in frames], dtype="<f8"),
+            offsets[0],
+            offsets[1],
+            offsets[2],
+            offsets[3],
+            numpy.array(positions, dtype=POSITION_DTYPE),
+            numpy.array(transmissions, dtype=TRANSMISSION_DTYPE),
+            numpy.array(drops, dtype=DROP_DTYPE),
+            numpy.array(statistics, dtype=STATISTICS_DTYPE),
+        ]
+        size = CHUNK_HEADER.size + sum(a.nbytes + _padding(a.nbytes) for a in arrays)
+        offset = self._file.tell()
+        self._file.write(
+            CHUNK_HEADER.pack(
+                CHUNK_MAGIC,
+                size,
+                len(frames),
+                len(positions),
+                len(transmissions),
+                len(drops),
+                len(statistics),
+            )
+        )
+        for array in arrays:
+            self._file.write(array.tobytes())
+            self._file.write(b"\0" * _padding(array.nbytes))
+        self._file.flush()
+        self._index.append((offset, frames[0].time, frames[-1].time, len(frames)))
+
+    def close(self):
+        """!
+        Write the pending frames and the index, and close the file
+
+        @param self: this object
+        @return none
+        """
+        if self._file is None:
+            return
+        self._write_chunk()
+        index_offset = self._file.tell()
+        self._file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self._index)))
+        self._file.write(numpy.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._file.write(TRACE_FOOTER.pack(index_offset, TRACE_END_MAGIC))
+        self._file.close()
+        self._file = None
+
+
+## TraceChunk class
+class TraceChunk(object):
+    """
+    Arrays of one chunk, as views on the memory map.
+    """
+
+    ## @var times
+    #  frame times
+    ## @var position_offsets
+    #  first position record of each frame, plus the total
+    ## @var transmission_offsets
+    #  first transmission record of each frame, plus the total
+    ## @var drop_offsets
+    #  first drop record of each frame, plus the total
+    ## @var statistics_offsets
+    #  first statistics record of each frame, plus the total
+    ## @var positions
+    #  POSITION_DTYPE records
+    ## @var transmissions
+    #  TRANSMISSION_DTYPE records
+    ## @var drops
+    #  DROP_DTYPE records
+    ## @var statistics
+    #  STATISTICS_DTYPE records
+    def __init__(self, data, offset):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param data: memory map of the trace file, as a uint8 array
+        @param offset: offset of the chunk header
+        """
+        (
+            dummy_magic,
+            dummy_size,
+            n_frames,
+            n_positions,
+            n_transmissions,
+            n_drops,
+            n_statistics,
+        ) = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+
+        def take(dtype, count):
+            nonlocal offset
+            array = numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes + _padding(array.nbytes)
+            return array
+
+        self.times = take("<f8", n_frames)
+        self.position_offsets = take("<u4", n_frames + 1)
+        self.transmission_offsets = take("<u4", n_frames + 1)
+        self.drop_offsets = take("<u4", n_frames + 1)
+        self.statistics_offsets = take("<u4", n_frames + 1)
+        self.positions = take(POSITION_DTYPE, n_positions)
+        self.transmissions = take(TRANSMISSION_DTYPE, n_transmissions)
+        self.drops = take(DROP_DTYPE, n_drops)
+        self.statistics = take(STATISTICS_DTYPE, n_statistics)
+
+    def snapshot(self, i):
+        """!
+        Rebuild the Snapshot of a frame
+
+        @param self: this object
+        @param i: frame index in the chunk
+        @return the Snapshot
+        """
+        positions = self.positions[self.position_offsets[i] : self.position_offsets[i + 1]]
+        transmissions = self.transmissions[
+            self.transmission_offsets[i] : self.transmission_offsets[i + 1]
+        ]
+        drops = self.drops[self.drop_offsets[i] : self.drop_offsets[i + 1]]
+        statistics = self.statistics[self.statistics_offsets[i] : self.statistics_offsets[i + 1]]
+
+        node_statistics = {}
+        for record in statistics.tolist():
+            node_statistics.setdefault(record[0], []).append(NetDeviceStatistics(*record[2:]))
+        return Snapshot(
+            time=float(self.times[i]),
+            position_nodes=tuple(positions["node"].tolist()),
+            positions=numpy.stack([positions["x"], positions["y"]], axis=1).astype(numpy.float64),
+            transmissions=dict(
+                ((transmitter, receiver), rx_bytes)
+                for transmitter, receiver, rx_bytes in transmissions.tolist()
+            ),
+            drops=dict(drops.tolist()),
+            node_statistics=dict(
+                (node, tuple(interfaces)) for node, interfaces in node_statistics.items()
+            ),
+            pause_messages=(),
+        )
+
+
+## TraceReader class
+class TraceReader(object):
+    """
+    Random access to the frames of a trace file, through a memory map.
+    """
+
+    ## @var file_name
+    #  trace file name
+    ## @var topology
+    #  topology description, see get_topology()
+    ## @var times
+    #  time of every frame
+    ## @var _data
+    #  memory map of the file
+    ## @var _chunk_offsets
+    #  offset of every chunk
+    ## @var _chunk_starts
+    #  index of the first frame of every chunk
+    ## @var _chunks
+    #  chunk offset -> TraceChunk, for the chunks already opened
+    def __init__(self, file_name):
+        """!
+        Initializer function
+
+        @param self: this object
+        @param file_name: trace file name
+        """
+        _check_numpy()
+        self.file_name = file_name
+        self._data = numpy.memmap(file_name, dtype=numpy.uint8, mode="r")
+        data = self._data
+        if bytes(data[: len(TRACE_MAGIC)]) != TRACE_MAGIC:
+            raise ValueError("%r is not a visualizer trace" % (file_name,))
+        version, topology_length = TRACE_HEADER.unpack_from(data, len(TRACE_MAGIC))
+        if version != TRACE_VERSION:
+            raise ValueError("%r: unsupported trace version %i" % (file_name, version))
+        offset = len(TRACE_MAGIC) + TRACE_HEADER.size
+        self.topology = json.loads(bytes(data[offset : offset + topology_length]).decode("utf-8"))
+        offset += topology_length + _padding(topology_length)
+
+        index = self._read_index()
+        if index is None:
+            index = self._scan_chunks(offset)
+        self._chunk_offsets = [int(offset) for offset in index["offset"]]
+        self._chunk_starts = [0]
+        for frames in index["frames"][:-1]:
+            self._chunk_starts.append(self._chunk_starts[-1] + int(frames))
+        self._chunks = {}
+        if len(index):
+            self.times = numpy.concatenate(
+                [self._chunk(offset).times for offset in self._chunk_offsets]
+            )
+        else:
+            self.times = numpy.empty(0)
+
+    def _read_index(self):
+        data = self._data
+        if len(data) < TRACE_FOOTER.size:
+            return None
+        index_offset, end_magic = TRACE_FOOTER.unpack_from(data, len(data) - TRACE_FOOTER.size)
+        if end_magic != TRACE_END_MAGIC:
+            return None
+        magic, count = INDEX_HEADER.unpack_from(data, index_offset)
+        if magic != INDEX_MAGIC:
+            return None
+        return numpy.frombuffer(
+            data, dtype=INDEX_DTYPE, count=count, offset=index_offset + INDEX_HEADER.size
+        )
+
+    def _scan_chunks(self, offset):
+        data = self._data
+        index = []
+        while offset + CHUNK_HEADER.size <= len(data):
+            magic, size, n_frames = CHUNK_HEADER.unpack_from(data, offset)[:3]
+            if magic != CHUNK_MAGIC or offset + size > len(data):
+                break
+            index.append((offset, 0.0, 0.0, n_frames))
+            offset += size
+        return numpy.array(index, dtype=INDEX_DTYPE)
+
+    def _chunk(self, offset):
+        try:
+            return self._chunks[offset]
+        except KeyError:
+            chunk = TraceChunk(self._data, offset)
+            self._chunks[offset] = chunk
+            return chunk
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, frame):
+        """!
+        Get the Snapshot of a frame
+
+        @param self: this object
+        @param frame: frame index
+        @return the Snapshot
+        """
+        if frame < 0:
+            frame += len(self)
+        if not 0 <= frame < len(self):
+            raise IndexError("frame %i out of range" % frame)
+        chunk_number = bisect.bisect_right(self._chunk_starts, frame) - 1
+        chunk = self._chunk(self._chunk_offsets[chunk_number])
+        return chunk.snapshot(frame - self._chunk_starts[chunk_number])
+
+    def position_bounds(self):
+        """!
+        Get the bounding box of all the recorded node positions
+
+        @param self: this object
+        @return (min_x, min_y, max_x, max_y), or None if no position was recorded
+        """
+        bounds = None
+        for offset in self._chunk_offsets:
+            positions = self._chunk(offset).positions
+            x = positions["x"][~numpy.isnan(positions["x"])]
+            y = positions["y"][~numpy.isnan(positions["y"])]
+            if not len(x) or not len(y):
+                continue
+            chunk_bounds = (float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+            if bounds is None:
+                bounds = chunk_bounds
+            else:
+                bounds = (
+                    min(bounds[0], chunk_bounds[0]),
+                    min(bounds[1], chunk_bounds[1]),
+                    max(bounds[2], chunk_bounds[2]),
+                    max(bounds[3], chunk_bounds[3]),
+                )
+        return bounds
+
+    def find_frame(self, time):
+        """!
+        Find the frame shown at a given time
+
+        @param self: this object
+        @param time: simulation time, in seconds
+        @return index of the last frame whose time is not after @p time
+        (0 if @p time is before the first frame)
+        """
+        return max(0, int(numpy.searchsorted(self.times, time, side="right")) - 1)
@@ -16,14 +16,91 @@
 #
 # Authors:  Hao Yin and Sebastien Deronne
 #
-import math
+"""
+Bianchi model of the saturation throughput of 802.11ax, used as reference
+by wifi-bianchi.cc.
+
+The model is solved with NumPy for all the station counts, MCSs and channel
+widths at once.  Running this script writes the bianchi_11ax_difs.txt and
+bianchi_11ax_eifs.txt tables, to be pasted in wifi-bianchi.cc.  Other
+scripts can instead look up the reference throughputs with
+query_throughput(), which reads a cached table (a memory-mapped .npy file in
+$XDG_CACHE_HOME/ns3, computed on first use):
+
+  from bianchi11ax import query_throughput
+  query_throughput(mcs=5, channel_width=40, n_stations=[10, 20], difs=True)
+"""
+
+import os
 
 import numpy as np
 
+## station counts of the tables written by this script
+N_STATIONS = np.linspace(5, 50, 10)
+## channel widths (MHz) of the cached table
+CHANNEL_WIDTHS = (20, 40, 80, 160)
+## largest station count of the cached table, which covers 1 to N_STATIONS_MAX stations
+N_STATIONS_MAX = 100
+## version of the cached table, to be increased when the model changes
+TABLE_VERSION = 1
+## folder of the cached tables, outside of the source tree which may be read-only
+TABLE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "ns3"
+)
 
-def bianchi_ax(data_rate, ack_rate, k, difs):
+
+def bianchi_tau(n, CWmin=15, CWmax=1023, iterations=64):
+    """! Solve the Bianchi fixed point for the transmission probability.
+
+    The fixed point is searched on a grid of 100000 points in [0, 0.1], as
+    the reference tables of wifi-bianchi.cc were computed: the grid points
+    around the fixed point are found by bisection, for all the station counts
+    at once, instead of evaluating the whole grid.
+    @param n Array of station counts.
+    @param CWmin Minimum contention window.
+    @param CWmax Maximum contention window.
+    @param iterations Number of bisection steps; 64 steps reach the float precision.
+    @return array of the probabilities that a station transmits in a slot, one per station count
+    """
+    n = np.asarray(n, dtype=float)
+    W = CWmin + 1
+    m = int(np.log2((CWmax + 1) / (CWmin + 1)))
+    tau1 = np.linspace(0, 0.1, 100000)
+
+    def taup(tau):
+        # transmission probability given the transmission probability of the other stations
+        p = 1 - np.power(1 - tau, n - 1)
+        ps = sum(np.power(2 * p, i) for i in range(m))
+        return 2.0 / (1 + W + p * W * ps)
+
+    # tau - taup(tau) increases with tau; bisect for its root
+    low = np.zeros_like(n)
+    high = np.ones_like(n)
+    for _ in range(iterations):
+        tau = (low + high) / 2
+        above = tau > taup(tau)
+        high = np.where(above, tau, high)
+        low = np.where(above, low, tau)
+
+    # closest grid point to the fixed point, among the two around the root
+    b = np.clip(np.searchsorted(tau1, low), 1, len(tau1) - 1)
+    before = tau1[b - 1]
+    after = tau1[b]
+    use_before = np.abs(before - taup(before)) <= np.abs(after - taup(after))
+    return taup(np.where(use_before, before, after))
+
+
+def bianchi_ax_batch(data_rates, ack_rates, k, difs, n_stations=N_STATIONS):
+    """! Compute the Bianchi saturation throughput of 802.11ax.
+    @param data_rates Array of data rates (bit/s), one per mode.
+    @param ack_rates Array of ACK rates (bit/s), one per mode.
+    @param k Number of MPDUs per A-MPDU (1 to disable aggregation).
+    @param difs 1 to use DIFS, 0 to use EIFS after collisions.
+    @param n_stations Array of station counts.
+    @return array of throughputs (Mbit/s), of shape (number of modes, number of station counts)
+    """
     # Parameters for 11ax
-    nA = np.linspace(5, 50, 10)
+    nA = np.asarray(n_stations, dtype=float)
     CWmin = 15
     CWmax = 1023
     L_DATA = 1500 * 8  # data size in bits
@@ -53,16 +130,17 @@ def bianchi_ax(data_rate, ack_rate, k, difs):
     if k <= 1:
         Aggregation_Type = "NONE"
 
-    N_DBPS = data_rate * T_SYMBOL_DATA  # number of data bits per OFDM symbol
+    # number of data bits per OFDM symbol, per mode (column vector, broadcast over the station counts)
+    N_DBPS = np.asarray(data_rates, dtype=float).reshape(-1, 1) * T_SYMBOL_DATA
 
     if Aggregation_Type == "NONE":
-        N_SYMBOLS = math.ceil((L_SERVICE + (L_MAC + L_DATA + L_APP_HDR) + L_TAIL) / N_DBPS)
+        N_SYMBOLS = np.ceil((L_SERVICE + (L_MAC + L_DATA + L_APP_HDR) + L_TAIL) / N_DBPS)
         T_DATA = T_PHY_DATA + (T_SYMBOL_DATA * N_SYMBOLS)
         K_MPDU = 1
         K_MSDU = 1
 
     if Aggregation_Type == "A_MSDU":
-        N_SYMBOLS = math.ceil(
+        N_SYMBOLS = np.ceil(
             (
                 L_SERVICE
                 + K_MPDU * (L_MAC + L_MPDU_HEADER + K_MSDU * (L_MSDU_HEADER + L_DATA + L_APP_HDR))
@@ -73,14 +151,14 @@ def bianchi_ax(data_rate, ack_rate, k, difs):
         T_DATA = T_PHY_DATA + (T_SYMBOL_DATA * N_SYMBOLS)
 
     if Aggregation_Type == "A_MPDU":
-        N_SYMBOLS = math.ceil(
+        N_SYMBOLS = np.ceil(
             (L_SERVICE + K_MPDU * (L_MAC + L_MPDU_HEADER + L_DATA + L_APP_HDR) + L_TAIL) / N_DBPS
         )
         T_DATA = T_PHY_DATA + (T_SYMBOL_DATA * N_SYMBOLS)
 
     # Calculate ACK Duration
-    N_DBPS = ack_rate * T_SYMBOL_ACK  # number of data bits per OFDM symbol
-    N_SYMBOLS = math.ceil((L_SERVICE + L_ACK + L_TAIL) / N_DBPS)
+    N_DBPS = np.asarray(ack_rates, dtype=float).reshape(-1, 1) * T_SYMBOL_ACK
+    N_SYMBOLS = np.ceil((L_SERVICE + L_ACK + L_TAIL) / N_DBPS)
     T_ACK = T_PHY_ACK + (T_SYMBOL_ACK * N_SYMBOLS)
 
     T_s = T_DATA + T_SIFS + T_ACK + T_DIFS
@@ -92,36 +170,35 @@ def bianchi_ax(data_rate, ack_rate, k, difs):
 
     T_S = T_s / (1 - B) + T_SLOT
 
-    S_bianchi = np.zeros(len(nA))
-    for j in range(len(nA)):
-        n = nA[j] * 1
-        W = CWmin + 1
-        m = math.log2((CWmax + 1) / (CWmin + 1))
-        tau1 = np.linspace(0, 0.1, 100000)
-        p = 1 - np.power((1 - tau1), (n - 1))
-        ps = p * 0
-
-        for i in range(int(m)):
-            ps = ps + np.power(2 * p, i)
-
-        taup = 2.0 / (1 + W + p * W * ps)
-        b = np.argmin(np.abs(tau1 - taup))
-        tau = taup[b]
-
-        Ptr = 1 - math.pow((1 - tau), int(n))
-        Ps = n * tau * math.pow((1 - tau), int(n - 1)) / Ptr
-
-        S_bianchi[j] = (
-            K_MSDU
-            * K_MPDU
-            * Ps
-            * Ptr
-            * EP
-            / ((1 - Ptr) * T_SLOT + Ptr * Ps * T_S + Ptr * (1 - Ps) * T_C)
-            / 1e6
-        )
+    # The transmission probability only depends on the station count
+    n = nA
+    tau = bianchi_tau(n, CWmin, CWmax)
+
+    Ptr = 1 - np.power((1 - tau), np.floor(n))
+    Ps = n * tau * np.power((1 - tau), np.floor(n - 1)) / Ptr
+
+    S_bianchi = (
+        K_MSDU
+        * K_MPDU
+        * Ps
+        * Ptr
+        * EP
+        / ((1 - Ptr) * T_SLOT + Ptr * Ps * T_S + Ptr * (1 - Ps) * T_C)
+        / 1e6
+    )
+
+    return S_bianchi
 
-    bianchi_result = S_bianchi
+
+def bianchi_ax(data_rate, ack_rate, k, difs):
+    """! Compute the Bianchi saturation throughput of 802.11ax for N_STATIONS stations.
+    @param data_rate Data rate (bit/s).
+    @param ack_rate ACK rate (bit/s).
+    @param k Number of MPDUs per A-MPDU (1 to disable aggregation).
+    @param difs 1 to use DIFS, 0 to use EIFS after collisions.
+    @return array of throughputs (Mbit/s), one per station count
+    """
+    bianchi_result = bianchi_ax_batch([data_rate], [ack_rate], k, difs)[0]
     return bianchi_result
 
 
@@ -197,43 +274,103 @@ data_rates_160MHz = [
 ]
 ack_rates_160MHz = [6e6, 12e6, 12e6, 24e6, 24e6, 24e6, 24e6, 24e6, 24e6, 24e6, 24e6, 24e6]
 
-# Generate results with frame aggregation disabled
-k = 1
-
-difs = 1
-with open("bianchi_11ax_difs.txt", "w", encoding="utf-8") as f:
-    for i in range(len(data_rates_20MHz)):
-        bianchi_result = bianchi_ax(data_rates_20MHz[i], ack_rates_20MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 20)
-        f.write(str_s)
-    for i in range(len(data_rates_40MHz)):
-        bianchi_result = bianchi_ax(data_rates_40MHz[i], ack_rates_40MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 40)
-        f.write(str_s)
-    for i in range(len(data_rates_80MHz)):
-        bianchi_result = bianchi_ax(data_rates_80MHz[i], ack_rates_80MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 80)
-        f.write(str_s)
-    for i in range(len(data_rates_160MHz)):
-        bianchi_result = bianchi_ax(data_rates_160MHz[i], ack_rates_160MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 160)
-        f.write(str_s)
-
-difs = 0
-with open("bianchi_11ax_eifs.txt", "w", encoding="utf-8") as f:
-    for i in range(len(data_rates_20MHz)):
-        bianchi_result = bianchi_ax(data_rates_20MHz[i], ack_rates_20MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 20)
-        f.write(str_s)
-    for i in range(len(data_rates_40MHz)):
-        bianchi_result = bianchi_ax(data_rates_40MHz[i], ack_rates_40MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 40)
-        f.write(str_s)
-    for i in range(len(data_rates_80MHz)):
-        bianchi_result = bianchi_ax(data_rates_80MHz[i], ack_rates_80MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 80)
-        f.write(str_s)
-    for i in range(len(data_rates_160MHz)):
-        bianchi_result = bianchi_ax(data_rates_160MHz[i], ack_rates_160MHz[i], k, difs)
-        str_s = str_result(bianchi_result, i, 160)
-        f.write(str_s)
+## data and ACK rates per channel width, indexed by MCS
+RATES = {
+    20: (data_rates_20MHz, ack_rates_20MHz),
+    40: (data_rates_40MHz, ack_rates_40MHz),
+    80: (data_rates_80MHz, ack_rates_80MHz),
+    160: (data_rates_160MHz, ack_rates_160MHz),
+}
+
+
+def build_throughput_table(k=1):
+    """! Compute the throughputs of all the channel widths, MCSs and station counts.
+    @param k Number of MPDUs per A-MPDU (1 to disable aggregation).
+    @return array of throughputs (Mbit/s), indexed by [EIFS (0) or DIFS (1), index of the channel
+    width in CHANNEL_WIDTHS, MCS, number of stations - 1]
+    """
+    data_rates = np.concatenate([RATES[bw][0] for bw in CHANNEL_WIDTHS])
+    ack_rates = np.concatenate([RATES[bw][1] for bw in CHANNEL_WIDTHS])
+    n_stations = np.arange(1, N_STATIONS_MAX + 1)
+    return np.stack(
+        [
+            bianchi_ax_batch(data_rates, ack_rates, k, difs, n_stations).reshape(
+                len(CHANNEL_WIDTHS), -1, len(n_stations)
+            )
+            for difs in (0, 1)
+        ]
+    )
+
+
+def load_throughput_table(k=1, table_dir=None):
+    """! Get the table of build_throughput_table(), memory-mapped from its cache file, which is
+    written on first use; the table is kept in memory if the cache file cannot be written.
+    @param k Number of MPDUs per A-MPDU (1 to disable aggregation).
+    @param table_dir Folder of the cache file (default TABLE_DIR).
+    @return read-only array of throughputs (Mbit/s), see build_throughput_table()
+    """
+    fname = os.path.join(
+        table_dir or TABLE_DIR,
+        "bianchi_11ax_k{:d}_n{:d}_v{:d}.npy".format(k, N_STATIONS_MAX, TABLE_VERSION),
+    )
+    try:
+        return np.load(fname, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    table = build_throughput_table(k)
+    table.flags.writeable = False
+    # write to a temporary file first, so that concurrent readers never see a partial table
+    tmp_fname = "{}.{:d}.tmp".format(fname, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        with open(tmp_fname, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp_fname, fname)
+    except OSError:
+        try:
+            os.remove(tmp_fname)
+        except OSError:
+            pass
+        return table
+    return np.load(fname, mmap_mode="r")
+
+
+def query_throughput(mcs, channel_width, n_stations, difs=True, k=1):
+    """! Look up the Bianchi saturation throughput of 802.11ax.
+    @param mcs HE MCS (0 to 11), or array of MCSs.
+    @param channel_width Channel width (20, 40, 80 or 160 MHz), or array of channel widths.
+    @param n_stations Number of stations (1 to N_STATIONS_MAX), or array of station counts.
+    @param difs Whether DIFS (True) or EIFS (False) follows collisions, or array of them.
+    @param k Number of MPDUs per A-MPDU (1 to disable aggregation).
+    @return throughput (Mbit/s), or array of throughputs, with the broadcast shape of the arguments
+    """
+    table = load_throughput_table(k)
+    width_index = np.searchsorted(CHANNEL_WIDTHS, channel_width)
+    if np.any(np.take(CHANNEL_WIDTHS, width_index, mode="clip") != channel_width):
+        raise ValueError("Channel width must be one of {}".format(CHANNEL_WIDTHS))
+    mcs = np.asarray(mcs)
+    n_mcs = table.shape[2]
+    if np.any((mcs < 0) | (mcs >= n_mcs)):
+        raise ValueError("MCS must be between 0 and {:d}".format(n_mcs - 1))
+    n_stations = np.asarray(n_stations)
+    if np.any((n_stations < 1) | (n_stations > N_STATIONS_MAX)):
+        raise ValueError("Number of stations must be between 1 and {:d}".format(N_STATIONS_MAX))
+    return table[np.asarray(difs, dtype=int), width_index, mcs, n_stations - 1][()]
+
+
+def main():
+    # Generate results with frame aggregation disabled
+    k = 1
+
+    for difs, fname in ((1, "bianchi_11ax_difs.txt"), (0, "bianchi_11ax_eifs.txt")):
+        with open(fname, "w", encoding="utf-8") as f:
+            for bw in CHANNEL_WIDTHS:
+                data_rates, ack_rates = RATES[bw]
+                bianchi_results = bianchi_ax_batch(data_rates, ack_rates, k, difs)
+                for i, bianchi_result in enumerate(bianchi_results):
+                    str_s = str_result(bianchi_result, i, bw)
+                    f.write(str_s)
+
+
+if __name__ == "__main__":
+    main()
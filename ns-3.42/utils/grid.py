@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
 
-import re
+import argparse
+import json
+import math
+import mmap
+import struct
 import sys
+from array import array
 
 import cairo
-import gtk
+import numpy
+
+try:
+    import gtk
+except ImportError:
+    gtk = None
+
+READ_BUFFER_SIZE = 1 << 24  # bytes buffered when reading timeline files
+BINARY_MAGIC = b"NS3GRID1"  # first bytes of binary timeline files
+## binary file header: magic, index offset, index length
+BINARY_HEADER = struct.Struct("<8sQQ")
 
 
 ## DataRange class
@@ -75,163 +90,278 @@ class EventInt:
         self.value = value
 
 
-def ranges_cmp(a, b):
-    diff = a.start - b.start
-    if diff < 0:
-        return -1
-    elif diff > 0:
-        return +1
-    else:
-        return 0
+## ValueTable class
+class ValueTable:
+    """! Interned string values, shared by all the timelines: ranges and
+    string events store value ids, indices in this table.
+    """
 
+    ## @var values
+    #  value id -> string
+    ## @var __ids
+    #  string -> value id
+    def __init__(self, values=()):
+        """! Initializer
+        @param self this object
+        @param values initial values, in id order
+        """
+        self.values = []
+        self.__ids = {}
+        for value in values:
+            self.get_id(value)
 
-def events_cmp(a, b):
-    diff = a.at - b.at
-    if diff < 0:
-        return -1
-    elif diff > 0:
-        return +1
-    else:
-        return 0
+    def get_id(self, value):
+        """! Get the id of a value, adding it if needed
+        @param self this object
+        @param value string value
+        @return value id
+        """
+        value_id = self.__ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.__ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def get(self, value_id):
+        """! Get a value
+        @param self this object
+        @param value_id value id
+        @return string value
+        """
+        return self.values[value_id]
 
 
 ## TimelineDataRange
 class TimelineDataRange:
+    """! Ranges of a timeline, stored as NumPy columns sorted by start:
+    starts, ends and value ids.  Ranges are appended to growable buffers
+    while parsing, and moved to the columns by sort().
+    """
+
     ## @var name
     #  name
-    ## @var ranges
-    #  ranges
-    def __init__(self, name=""):
+    ## @var value_table
+    #  ValueTable of the range values
+    ## @var starts
+    #  range starts
+    ## @var ends
+    #  range ends
+    ## @var values
+    #  range value ids
+    ## @var max_ends
+    #  running maximum of ends, the interval index used by queries
+    ## @var _value_ids
+    #  sorted array of the value ids in use, or None if not computed yet
+    def __init__(self, name="", value_table=None):
         """! Initializer
         @param self this object
         @param name name
+        @param value_table ValueTable of the range values
         """
         self.name = name
-        self.ranges = []
-        return
-
-    def __search(self, key):
-        """! Search
+        self.value_table = value_table if value_table is not None else ValueTable()
+        self.starts = numpy.zeros(0, dtype=numpy.int64)
+        self.ends = numpy.zeros(0, dtype=numpy.int64)
+        self.values = numpy.zeros(0, dtype=numpy.int32)
+        self.max_ends = self.ends
+        self._value_ids = None
+        self._sorted = True
+        self._new_starts = array("q")
+        self._new_ends = array("q")
+        self._new_values = array("i")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def append(self, start, end, value_id):
+        """! Add a range, by value id
         @param self this object
-        @param key key
-        @return index if found or -1 if not found
+        @param start range start
+        @param end range end
+        @param value_id value id in the value table
+        @return none
         """
-        l = 0
-        u = len(self.ranges) - 1
-        while l <= u:
-            i = int((l + u) / 2)
-            if key >= self.ranges[i].start and key <= self.ranges[i].end:
-                return i
-            elif key < self.ranges[i].start:
-                u = i - 1
-            else:
-                # key > self.ranges[i].end
-                l = i + 1
-        return -1
+        self._new_starts.append(start)
+        self._new_ends.append(end)
+        self._new_values.append(value_id)
+        self._sorted = False
 
     def add_range(self, range):
         """! Add range
         @param self this object
-        @param range range
+        @param range DataRange
         @return none
         """
-        self.ranges.append(range)
+        self.append(range.start, range.end, self.value_table.get_id(range.value))
 
     def get_all(self):
-        """! Get all ranges
+        """! Get all ranges, as DataRange objects; slow on large timelines
         @param self this object
         @return the ranges
         """
-        return self.ranges
+        return [self.get(i) for i in range(len(self))]
+
+    def get(self, index):
+        """! Get a range
+        @param self this object
+        @param index range index
+        @return DataRange
+        """
+        return DataRange(
+            int(self.starts[index]),
+            int(self.ends[index]),
+            self.value_table.get(self.values[index]),
+        )
 
     def get_ranges(self, start, end):
         """! Get selected ranges
         @param self this object
         @param start range start
         @param end range end
-        @return the range or and empty list
-        """
-        s = self.__search(start)
-        e = self.__search(end)
-        if s == -1 and e == -1:
-            return []
-        elif s == -1:
-            return self.ranges[0 : e + 1]
-        elif e == -1:
-            return self.ranges[s : len(self.ranges)]
-        else:
-            return self.ranges[s : e + 1]
+        @return list of DataRange, possibly empty
+        """
+        lo, hi = self.get_ranges_bounds(start, end)
+        return [self.get(i) for i in range(lo, hi)]
 
     def get_ranges_bounds(self, start, end):
-        """! Get ranges bounds
+        """! Get the indices of the ranges overlapping [start, end]
         @param self this object
         @param start range start
         @param end range end
-        @return range
+        @return (lo, hi) index bounds
         """
-        s = self.__search(start)
-        e = self.__search(end)
-        if s == -1 and e == -1:
-            return (0, 0)
-        elif s == -1:
-            return (0, e + 1)
-        elif e == -1:
-            return (s, len(self.ranges))
-        else:
-            return (s, e + 1)
+        lo = int(numpy.searchsorted(self.max_ends, start, side="left"))
+        hi = int(numpy.searchsorted(self.starts, end, side="right"))
+        return (lo, max(lo, hi))
+
+    def get_ranges_decimated(self, start, end, columns):
+        """! Get the indices of the ranges to draw in [start, end], keeping at
+        most one range per pixel column: the first one reaching the column
+        @param self this object
+        @param start range start
+        @param end range end
+        @param columns number of pixel columns
+        @return sorted array of range indices
+        """
+        lo, hi = self.get_ranges_bounds(start, end)
+        if hi - lo <= columns:
+            return numpy.arange(lo, hi)
+        edges = start + (end - start) * numpy.arange(columns) / columns
+        indices = numpy.unique(numpy.searchsorted(self.max_ends, edges, side="left"))
+        return indices[(indices >= lo) & (indices < hi)]
 
     def sort(self):
         """! Sort ranges
         @param self this object
         @return none
         """
-        self.ranges.sort(ranges_cmp)
+        if self._sorted:
+            return
+        if len(self._new_starts):
+            self.starts = numpy.concatenate(
+                (self.starts, numpy.frombuffer(self._new_starts, numpy.int64))
+            )
+            self.ends = numpy.concatenate(
+                (self.ends, numpy.frombuffer(self._new_ends, numpy.int64))
+            )
+            self.values = numpy.concatenate(
+                (self.values, numpy.frombuffer(self._new_values, numpy.int32))
+            )
+            self._new_starts = array("q")
+            self._new_ends = array("q")
+            self._new_values = array("i")
+        order = numpy.argsort(self.starts, kind="stable")
+        self.starts = self.starts[order]
+        self.ends = self.ends[order]
+        self.values = self.values[order]
+        self.max_ends = numpy.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+        self._value_ids = None
+        self._sorted = True
+
+    def get_value_ids(self):
+        """! Get the ids of the values used by the ranges
+        @param self this object
+        @return sorted array of value ids
+        """
+        if self._value_ids is None:
+            self._value_ids = numpy.unique(self.values)
+        return self._value_ids
+
+    def set_columns(self, starts, ends, values, max_ends, value_ids=None):
+        """! Replace the ranges by sorted columns, e.g. mapped from a binary file
+        @param self this object
+        @param starts range starts, sorted
+        @param ends range ends
+        @param values range value ids
+        @param max_ends running maximum of ends
+        @param value_ids sorted ids of the values in use, or None to compute them when needed
+        @return none
+        """
+        self.starts = starts
+        self.ends = ends
+        self.values = values
+        self.max_ends = max_ends
+        self._value_ids = value_ids
+        self._new_starts = array("q")
+        self._new_ends = array("q")
+        self._new_values = array("i")
+        self._sorted = True
 
     def get_bounds(self):
         """! Get bounds
         @param self this object
         @return the bounds
         """
-        if len(self.ranges) > 0:
-            lo = self.ranges[0].start
-            hi = self.ranges[len(self.ranges) - 1].end
-            return (lo, hi)
+        if len(self.starts) > 0:
+            return (int(self.starts[0]), int(self.max_ends[-1]))
         else:
             return (0, 0)
 
 
 ## TimelineEvent class
 class TimelineEvent:
+    """! Events of a timeline, stored as NumPy columns sorted by time: times
+    and values, either integers or value ids of string values.  Events are
+    appended to growable buffers while parsing, and moved to the columns by
+    sort().
+    """
+
     ## @var name
     #  name
-    ## @var events
-    #  events
-    def __init__(self, name=""):
-        """! Get ranges bounds
+    ## @var value_table
+    #  ValueTable of the string values, or None for integer events
+    ## @var times
+    #  event times
+    ## @var values
+    #  event values, or value ids of string events
+    def __init__(self, name="", value_table=None):
+        """! Initializer
         @param self this object
         @param name name
+        @param value_table ValueTable of the string values, or None for integer events
         """
         self.name = name
-        self.events = []
-
-    def __search(self, key):
-        """! Search function
-        @param self this object
-        @param key the key
-        @return event index
-        """
-        l = 0
-        u = len(self.events) - 1
-        while l <= u:
-            i = int((l + u) / 2)
-            if key == self.events[i].at:
-                return i
-            elif key < self.events[i].at:
-                u = i - 1
-            else:
-                # key > self.events[i].at
-                l = i + 1
-        return l
+        self.value_table = value_table
+        self.times = numpy.zeros(0, dtype=numpy.int64)
+        self.values = numpy.zeros(0, dtype=numpy.int64)
+        self._sorted = True
+        self._new_times = array("q")
+        self._new_values = array("q")
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, at, value):
+        """! Add an event, by integer value or value id
+        @param self this object
+        @param at event time
+        @param value integer value, or value id of a string event
+        @return none
+        """
+        self._new_times.append(at)
+        self._new_values.append(value)
+        self._sorted = False
 
     def add_event(self, event):
         """! Add Event
@@ -239,7 +369,30 @@ class TimelineEvent:
         @param event event to add
         @return none
         """
-        self.events.append(event)
+        value = event.value
+        if self.value_table is not None:
+            value = self.value_table.get_id(value)
+        self.append(event.at, value)
+
+    def get_value(self, index):
+        """! Get the value of an event
+        @param self this object
+        @param index event index
+        @return integer or string value
+        """
+        if self.value_table is not None:
+            return self.value_table.get(self.values[index])
+        return int(self.values[index])
+
+    def get(self, index):
+        """! Get an event
+        @param self this object
+        @param index event index
+        @return EventString or EventInt
+        """
+        if self.value_table is not None:
+            return EventString(int(self.times[index]), self.get_value(index))
+        return EventInt(int(self.times[index]), self.get_value(index))
 
     def get_events(self, start, end):
         """! Get Events
@@ -248,37 +401,77 @@ class TimelineEvent:
         @param end ending event
         @return the events
         """
-        s = self.__search(start)
-        e = self.__search(end)
-        return self.events[s : e + 1]
+        lo, hi = self.get_events_bounds(start, end)
+        return [self.get(i) for i in range(lo, hi)]
 
     def get_events_bounds(self, start, end):
-        """! Get Events Bounds
+        """! Get the indices of the events in [start, end]
         @param self this object
         @param start starting event
         @param end ending event
         @return event bounds
         """
-        s = self.__search(start)
-        e = self.__search(end)
-        return (s, e + 1)
+        lo = int(numpy.searchsorted(self.times, start, side="left"))
+        hi = int(numpy.searchsorted(self.times, end, side="right"))
+        return (lo, hi)
+
+    def get_events_decimated(self, start, end, columns):
+        """! Get the indices of the events to draw in [start, end], keeping at
+        most one event per pixel column: the first one in the column
+        @param self this object
+        @param start starting event
+        @param end ending event
+        @param columns number of pixel columns
+        @return sorted array of event indices
+        """
+        lo, hi = self.get_events_bounds(start, end)
+        if hi - lo <= columns:
+            return numpy.arange(lo, hi)
+        edges = start + (end - start) * numpy.arange(columns) / columns
+        indices = numpy.unique(numpy.searchsorted(self.times, edges, side="left"))
+        return indices[(indices >= lo) & (indices < hi)]
 
     def sort(self):
         """! Sort function
         @param self this object
         @return none
         """
-        self.events.sort(events_cmp)
+        if self._sorted:
+            return
+        if len(self._new_times):
+            self.times = numpy.concatenate(
+                (self.times, numpy.frombuffer(self._new_times, numpy.int64))
+            )
+            self.values = numpy.concatenate(
+                (self.values, numpy.frombuffer(self._new_values, numpy.int64))
+            )
+            self._new_times = array("q")
+            self._new_values = array("q")
+        order = numpy.argsort(self.times, kind="stable")
+        self.times = self.times[order]
+        self.values = self.values[order]
+        self._sorted = True
+
+    def set_columns(self, times, values):
+        """! Replace the events by sorted columns, e.g. mapped from a binary file
+        @param self this object
+        @param times event times, sorted
+        @param values event values, or value ids
+        @return none
+        """
+        self.times = times
+        self.values = values
+        self._new_times = array("q")
+        self._new_values = array("q")
+        self._sorted = True
 
     def get_bounds(self):
         """! Get Bounds
         @param self this object
         @return the bounds
         """
-        if len(self.events) > 0:
-            lo = self.events[0].at
-            hi = self.events[-1].at
-            return (lo, hi)
+        if len(self.times) > 0:
+            return (int(self.times[0]), int(self.times[-1]))
         else:
             return (0, 0)
 
@@ -293,15 +486,19 @@ class Timeline:
     #  event string
     ## @var event_int
     #  event int
-    def __init__(self, name=""):
+    ## @var value_table
+    #  ValueTable of the string values
+    def __init__(self, name="", value_table=None):
         """! Initializer
         @param self this object
         @param name name
+        @param value_table ValueTable of the string values
         """
-        self.ranges = []
-        self.event_str = []
-        self.event_int = []
+        self.ranges = {}
+        self.event_str = {}
+        self.event_int = {}
         self.name = name
+        self.value_table = value_table if value_table is not None else ValueTable()
 
     def get_range(self, name):
         """! Get range
@@ -309,11 +506,10 @@ class Timeline:
         @param name name
         @return the range
         """
-        for range in self.ranges:
-            if range.name == name:
-                return range
-        timeline = TimelineDataRange(name)
-        self.ranges.append(timeline)
+        timeline = self.ranges.get(name)
+        if timeline is None:
+            timeline = TimelineDataRange(name, self.value_table)
+            self.ranges[name] = timeline
         return timeline
 
     def get_event_str(self, name):
@@ -322,11 +518,10 @@ class Timeline:
         @param name name
         @return the event string
         """
-        for event_str in self.event_str:
-            if event_str.name == name:
-                return event_str
-        timeline = TimelineEvent(name)
-        self.event_str.append(timeline)
+        timeline = self.event_str.get(name)
+        if timeline is None:
+            timeline = TimelineEvent(name, self.value_table)
+            self.event_str[name] = timeline
         return timeline
 
     def get_event_int(self, name):
@@ -335,11 +530,10 @@ class Timeline:
         @param name name
         @return eevent int
         """
-        for event_int in self.event_int:
-            if event_int.name == name:
-                return event_int
-        timeline = TimelineEvent(name)
-        self.event_int.append(timeline)
+        timeline = self.event_int.get(name)
+        if timeline is None:
+            timeline = TimelineEvent(name)
+            self.event_int[name] = timeline
         return timeline
 
     def get_ranges(self):
@@ -347,32 +541,32 @@ class Timeline:
         @param self this object
         @return the ranges
         """
-        return self.ranges
+        return list(self.ranges.values())
 
     def get_events_str(self):
         """! Get Events string
         @param self this object
         @return event string
         """
-        return self.event_str
+        return list(self.event_str.values())
 
     def get_events_int(self):
         """! Get Events int
         @param self this object
         @return evrnt int
         """
-        return self.event_int
+        return list(self.event_int.values())
 
     def sort(self):
         """! Sort the ranges and events
         @param self this object
         @return none
         """
-        for range in self.ranges:
+        for range in self.ranges.values():
             range.sort()
-        for event in self.event_int:
+        for event in self.event_int.values():
             event.sort()
-        for event in self.event_str:
+        for event in self.event_str.values():
             event.sort()
 
     def get_bounds(self):
@@ -382,24 +576,12 @@ class Timeline:
         """
         lo = 0
         hi = 0
-        for range in self.ranges:
-            (range_lo, range_hi) = range.get_bounds()
-            if range_lo < lo:
-                lo = range_lo
-            if range_hi > hi:
-                hi = range_hi
-        for event_str in self.event_str:
-            (ev_lo, ev_hi) = event_str.get_bounds()
-            if ev_lo < lo:
-                lo = ev_lo
-            if ev_hi > hi:
-                hi = ev_hi
-        for event_int in self.event_int:
-            (ev_lo, ev_hi) = event_int.get_bounds()
-            if ev_lo < lo:
-                lo = ev_lo
-            if ev_hi > hi:
-                hi = ev_hi
+        for timeline in self.get_ranges() + self.get_events_str() + self.get_events_int():
+            t_lo, t_hi = timeline.get_bounds()
+            if t_lo < lo:
+                lo = t_lo
+            if t_hi > hi:
+                hi = t_hi
         return (lo, hi)
 
 
@@ -407,11 +589,15 @@ class Timeline:
 class Timelines:
     ## @var timelines
     #  timelines
-    def __init__(self):
+    ## @var value_table
+    #  ValueTable of the string values of all the timelines
+    def __init__(self, value_table=None):
         """Initializer
         @param self: this object
+        @param value_table: ValueTable of the string values, or None for a new one
         """
-        self.timelines = []
+        self.timelines = {}
+        self.value_table = value_table if value_table is not None else ValueTable()
 
     def get(self, name):
         """! Get Timeline
@@ -419,11 +605,10 @@ class Timelines:
         @param name name
         @return the timeline for the name
         """
-        for timeline in self.timelines:
-            if timeline.name == name:
-                return timeline
-        timeline = Timeline(name)
-        self.timelines.append(timeline)
+        timeline = self.timelines.get(name)
+        if timeline is None:
+            timeline = Timeline(name, self.value_table)
+            self.timelines[name] = timeline
         return timeline
 
     def get_all(self):
@@ -431,14 +616,14 @@ class Timelines:
         @param self this object
         @return all timelines
         """
-        return self.timelines
+        return list(self.timelines.values())
 
     def sort(self):
         """! Sort the timelines
         @param self this object
         @return none
         """
-        for timeline in self.timelines:
+        for timeline in self.timelines.values():
             timeline.sort()
 
     def get_bounds(self):
@@ -448,8 +633,8 @@ class Timelines:
         """
         lo = 0
         hi = 0
-        for timeline in self.timelines:
-            (t_lo, t_hi) = timeline.get_bounds()
+        for timeline in self.timelines.values():
+            t_lo, t_hi = timeline.get_bounds()
             if t_lo < lo:
                 lo = t_lo
             if t_hi > hi:
@@ -461,12 +646,11 @@ class Timelines:
         @param self this object
         @return the keys for all ranges
         """
-        range_values = {}
-        for timeline in self.timelines:
+        used = numpy.zeros(len(self.value_table.values), dtype=bool)
+        for timeline in self.timelines.values():
             for ranges in timeline.get_ranges():
-                for ran in ranges.get_all():
-                    range_values[ran.value] = 1
-        return range_values.keys()
+                used[ranges.get_value_ids()] = True
+        return [self.value_table.get(value_id) for value_id in numpy.flatnonzero(used)]
 
 
 ## Color class
@@ -538,10 +722,17 @@ class Colors:
         @param name name
         @return named color
         """
-        if not self.__colors.has_key(name):
+        if name not in self.__colors:
             self.add(name, self.default_colors.pop())
         return self.__colors.get(name)
 
+    def get_all(self):
+        """! Get all the named colors
+        @param self this object
+        @return dict mapping names to colors
+        """
+        return dict(self.__colors)
+
 
 ## TopLegendRenderer class
 class TopLegendRenderer:
@@ -592,7 +783,7 @@ class TopLegendRenderer:
         total_height = self.__padding
         line_used = self.__padding
         for legend in self.__legends:
-            (t_width, t_height) = ctx.text_extents(legend)[2:4]
+            t_width, t_height = ctx.text_extents(legend)[2:4]
             item_width = self.__padding + self.__padding + t_width + self.__padding
             item_height = t_height + self.__padding
             if item_height > line_height:
@@ -624,7 +815,7 @@ class TopLegendRenderer:
         total_height = self.__padding
         line_used = self.__padding
         for legend in self.__legends:
-            (t_width, t_height) = ctx.text_extents(legend)[2:4]
+            t_width, t_height = ctx.text_extents(legend)[2:4]
             item_width = self.__padding + self.__padding + t_width + self.__padding
             item_height = t_height + self.__padding
             if item_height > line_height:
@@ -798,16 +989,16 @@ class TimelinesRenderer:
             ctx.set_source_rgb(0.9, 0.9, 0.9)
             ctx.fill()
         last_x_drawn = int(x)
-        (lo, hi) = events.get_events_bounds(self.start, self.end)
-        for event in events.events[lo:hi]:
-            real_x = int(x + (event.at - self.start) * width / (self.end - self.start))
+        indices = events.get_events_decimated(self.start, self.end, max(1, int(width)))
+        real_xs = x + (events.times[indices] - self.start) * width / (self.end - self.start)
+        for index, real_x in zip(indices.tolist(), real_xs.astype(int).tolist()):
             if real_x > last_x_drawn + 2:
                 ctx.rectangle(real_x, y, 1, 1)
                 ctx.set_source_rgb(1, 0, 0)
                 ctx.stroke()
                 ctx.move_to(real_x, y + self.max_text_height)
                 ctx.set_source_rgb(0, 0, 0)
-                ctx.show_text(str(event.value))
+                ctx.show_text(str(events.get_value(index)))
                 last_x_drawn = real_x
         self.grey_background += 1
 
@@ -827,17 +1018,20 @@ class TimelinesRenderer:
             ctx.set_source_rgb(0.9, 0.9, 0.9)
             ctx.fill()
         last_x_drawn = int(x - 1)
-        (lo, hi) = ranges.get_ranges_bounds(self.start, self.end)
-        for data_range in ranges.ranges[lo:hi]:
-            s = max(data_range.start, self.start)
-            e = min(data_range.end, self.end)
-            x_start = int(x + (s - self.start) * width / (self.end - self.start))
-            x_end = int(x + (e - self.start) * width / (self.end - self.start))
+        indices = ranges.get_ranges_decimated(self.start, self.end, max(1, int(width)))
+        scale = width / (self.end - self.start)
+        x_starts = x + (numpy.maximum(ranges.starts[indices], self.start) - self.start) * scale
+        x_ends = x + (numpy.minimum(ranges.ends[indices], self.end) - self.start) * scale
+        for x_start, x_end, value_id in zip(
+            x_starts.astype(int).tolist(),
+            x_ends.astype(int).tolist(),
+            ranges.values[indices].tolist(),
+        ):
             if x_end > last_x_drawn:
                 ctx.rectangle(x_start, y, x_end - x_start, 10)
                 ctx.set_source_rgb(0, 0, 0)
                 ctx.stroke_preserve()
-                color = self.colors.lookup(data_range.value)
+                color = self.colors.lookup(ranges.value_table.get(value_id))
                 ctx.set_source_rgb(color.r, color.g, color.b)
                 ctx.fill()
                 last_x_drawn = x_end
@@ -863,11 +1057,11 @@ class TimelinesRenderer:
         self.draw_line(ctx, 0, 0, self.width, 0)
         self.grey_background = 1
         for timeline in self.timelines.get_all():
-            (y_bearing, t_width, t_height) = ctx.text_extents(timeline.name)[1:4]
+            y_bearing, t_width, t_height = ctx.text_extents(timeline.name)[1:4]
             ctx.move_to(left_x_start, cur_y + self.max_text_height - (t_height + y_bearing))
             ctx.show_text(timeline.name)
             for events_int in timeline.get_events_int():
-                (y_bearing, t_width, t_height) = ctx.text_extents(events_int.name)[1:4]
+                y_bearing, t_width, t_height = ctx.text_extents(events_int.name)[1:4]
                 ctx.move_to(right_x_start, cur_y + self.max_text_height - (t_height + y_bearing))
                 ctx.show_text(events_int.name)
                 self.draw_events(
@@ -883,7 +1077,7 @@ class TimelinesRenderer:
                 )
 
             for events_str in timeline.get_events_str():
-                (y_bearing, t_width, t_height) = ctx.text_extents(events_str.name)[1:4]
+                y_bearing, t_width, t_height = ctx.text_extents(events_str.name)[1:4]
                 ctx.move_to(right_x_start, cur_y + self.max_text_height - (t_height + y_bearing))
                 ctx.show_text(events_str.name)
                 self.draw_events(
@@ -898,7 +1092,7 @@ class TimelinesRenderer:
                     0,
                 )
             for ranges in timeline.get_ranges():
-                (y_bearing, t_width, t_height) = ctx.text_extents(ranges.name)[1:4]
+                y_bearing, t_width, t_height = ctx.text_extents(ranges.name)[1:4]
                 ctx.move_to(right_x_start, cur_y + self.max_text_height - (t_height + y_bearing))
                 ctx.show_text(ranges.name)
                 self.draw_ranges(ctx, ranges, data_x_start, cur_y, data_width, 10)
@@ -1037,7 +1231,7 @@ class ScaleRenderer:
             ctx.line_to(real_x, 5 * s)
             ctx.close_path()
             ctx.stroke()
-            (t_y_bearing, t_width, t_height) = ctx.text_extents(str(x))[1:4]
+            t_y_bearing, t_width, t_height = ctx.text_extents(str(x))[1:4]
             if self.__top:
                 text_delta = t_height + t_y_bearing
             else:
@@ -1358,7 +1552,7 @@ class GraphicRenderer:
 
 
 ## GtkGraphicRenderer class
-class GtkGraphicRenderer(gtk.DrawingArea):
+class GtkGraphicRenderer(gtk.DrawingArea if gtk is not None else object):
     ## @var __data
     #  data
     ## @var __moving_left
@@ -1425,7 +1619,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         @param self this object
         @return none
         """
-        (start, end) = self.__data.get_range()
+        start, end = self.__data.get_range()
         self.__data.set_range(start, start + (end - start) * 2)
         self.__force_full_redraw = True
         self.queue_draw()
@@ -1435,7 +1629,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         @param self this object
         @return none
         """
-        (start, end) = self.__data.get_range()
+        start, end = self.__data.get_range()
         self.__data.set_range(start, start + (end - start) / 2)
         self.__force_full_redraw = True
         self.queue_draw()
@@ -1446,12 +1640,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         @param filename file name
         @return none
         """
-        surface = cairo.ImageSurface(
-            cairo.FORMAT_ARGB32, self.__data.get_width(), self.__data.get_height()
-        )
-        ctx = cairo.Context(self.__buffer_surface)
-        self.__data.draw(ctx)
-        surface.write_to_png(filename)
+        export_graphic(self.__data, filename, self.__data.get_width(), self.__data.get_height())
 
     def button_press(self, widget, event):
         """! Button Press
@@ -1460,8 +1649,8 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         @param event event
         @return true if button has been pressed otherwise false
         """
-        (x, y, width, height) = self.__data.get_selection_rectangle()
-        (d_x, d_y, d_width, d_height) = self.__data.get_data_rectangle()
+        x, y, width, height = self.__data.get_selection_rectangle()
+        d_x, d_y, d_width, d_height = self.__data.get_data_rectangle()
         if event.y > y and event.y < y + height:
             if abs(event.x - x) < 5:
                 self.__moving_left = True
@@ -1508,7 +1697,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         if self.__moving_both:
             self.__moving_both = False
             delta = self.__data.scale_selection(self.__moving_both_cur - self.__moving_both_start)
-            (left, right) = self.__data.get_range()
+            left, right = self.__data.get_range()
             self.__data.set_range(left + delta, right + delta)
             self.__force_full_redraw = True
             self.queue_draw()
@@ -1524,7 +1713,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         @param event event
         @return true if moving otherwise false
         """
-        (x, y, width, height) = self.__data.get_selection_rectangle()
+        x, y, width, height = self.__data.get_selection_rectangle()
         if self.__moving_left:
             if event.x <= 0:
                 self.__moving_left_cur = 0
@@ -1557,13 +1746,13 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         if self.__moving_top:
             self.__moving_top_cur = event.x
             delta = self.__data.scale_data(self.__moving_top_start - self.__moving_top_cur)
-            (left, right) = self.__data.get_range()
+            left, right = self.__data.get_range()
             self.__data.set_range(left + delta, right + delta)
             self.__force_full_redraw = True
             self.__moving_top_start = event.x
             self.queue_draw()
             return True
-        (d_x, d_y, d_width, d_height) = self.__data.get_data_rectangle()
+        d_x, d_y, d_width, d_height = self.__data.get_data_rectangle()
         if event.y > y and event.y < y + height:
             if abs(event.x - x) < 5 or abs(event.x - (x + width)) < 5:
                 widget.window.set_cursor(gtk.gdk.Cursor(gtk.gdk.SB_H_DOUBLE_ARROW))
@@ -1610,7 +1799,7 @@ class GtkGraphicRenderer(gtk.DrawingArea):
         ctx.clip()
         ctx.set_source_surface(self.__buffer_surface)
         ctx.paint()
-        (x, y, width, height) = self.__data.get_selection_rectangle()
+        x, y, width, height = self.__data.get_selection_rectangle()
         if self.__moving_left:
             ctx.move_to(max(self.__moving_left_cur, 2), y)
             ctx.rel_line_to(0, height)
@@ -1735,64 +1924,203 @@ class MainWindow:
             widget.hide()
 
 
+def parse_lines(lines, timelines, colors):
+    """! Parse the lines of a timeline file, streaming: each line is added to
+    the column buffers of its timeline as soon as it is read.
+    @param lines iterable of lines, as bytes
+    @param timelines Timelines to fill
+    @param colors Colors to fill
+    @return none
+    """
+    value_table = timelines.value_table
+    # caches keyed by the raw bytes of the names, to skip decoding and the
+    # nested lookups on every line
+    ranges = {}
+    events_str = {}
+    events_int = {}
+    value_ids = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        kind = fields[0]
+        try:
+            if kind == b"range":
+                start = int(fields[4])
+                end = int(fields[5])
+                key = (fields[1], fields[2])
+                rang = ranges.get(key)
+                if rang is None:
+                    rang = timelines.get(fields[1].decode()).get_range(fields[2].decode())
+                    ranges[key] = rang
+                value_id = value_ids.get(fields[3])
+                if value_id is None:
+                    value_id = value_table.get_id(fields[3].decode())
+                    value_ids[fields[3]] = value_id
+                rang.append(start, end, value_id)
+            elif kind == b"event-str":
+                at = int(fields[4])
+                key = (fields[1], fields[2])
+                ev = events_str.get(key)
+                if ev is None:
+                    ev = timelines.get(fields[1].decode()).get_event_str(fields[2].decode())
+                    events_str[key] = ev
+                value_id = value_ids.get(fields[3])
+                if value_id is None:
+                    value_id = value_table.get_id(fields[3].decode())
+                    value_ids[fields[3]] = value_id
+                ev.append(at, value_id)
+            elif kind == b"event-int":
+                value = int(fields[3])
+                at = int(fields[4])
+                key = (fields[1], fields[2])
+                ev = events_int.get(key)
+                if ev is None:
+                    ev = timelines.get(fields[1].decode()).get_event_int(fields[2].decode())
+                    events_int[key] = ev
+                ev.append(at, value)
+        except (IndexError, ValueError):
+            continue
+        if kind == b"color" and len(fields[2]) == 7 and fields[2].startswith(b"#"):
+            try:
+                rgb = bytes.fromhex(fields[2][1:].decode())
+            except ValueError:
+                continue
+            colors.add(fields[1].decode(), Color(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255))
+
+
 ## read_data function
 def read_data(filename):
+    with open(filename, "rb") as fh:
+        magic = fh.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return read_binary(filename)
     timelines = Timelines()
     colors = Colors()
-    m1 = re.compile("range ([^ ]+) ([^ ]+) ([^ ]+) ([0-9]+) ([0-9]+)")
-    m2 = re.compile("event-str ([^ ]+) ([^ ]+) ([^ ]+) ([0-9]+)")
-    m3 = re.compile("event-int ([^ ]+) ([^ ]+) ([0-9]+) ([0-9]+)")
-    m4 = re.compile("color ([^ ]+) #([a-fA-F0-9]{2,2})([a-fA-F0-9]{2,2})([a-fA-F0-9]{2,2})")
-
-    with open(filename, encoding="utf-8") as fh:
-        for line in fh.readlines():
-            m = m1.match(line)
-            if m:
-                line_name = m.group(1)
-                timeline = timelines.get(m.group(1))
-                rang = timeline.get_range(m.group(2))
-                data_range = DataRange()
-                data_range.value = m.group(3)
-                data_range.start = int(m.group(4))
-                data_range.end = int(m.group(5))
-                rang.add_range(data_range)
-                continue
-            m = m2.match(line)
-            if m:
-                line_name = m.group(1)
-                timeline = timelines.get(m.group(1))
-                ev = timeline.get_event_str(m.group(2))
-                event = EventString()
-                event.value = m.group(3)
-                event.at = int(m.group(4))
-                ev.add_event(event)
-                continue
-            m = m3.match(line)
-            if m:
-                line_name = m.group(1)
-                timeline = timelines.get(m.group(1))
-                ev = timeline.get_event_int(m.group(2))
-                event = EventInt()
-                event.value = int(m.group(3))
-                event.at = int(m.group(4))
-                ev.add_event(event)
-                continue
-
-            m = m4.match(line)
-            if m:
-                r = int(m.group(2), 16)
-                g = int(m.group(3), 16)
-                b = int(m.group(4), 16)
-                color = Color(r / 255, g / 255, b / 255)
-                colors.add(m.group(1), color)
-                continue
+    with open(filename, "rb", buffering=READ_BUFFER_SIZE) as fh:
+        parse_lines(fh, timelines, colors)
     timelines.sort()
     return (colors, timelines)
 
 
-def main():
-    (colors, timelines) = read_data(sys.argv[1])
-    (lower_bound, upper_bound) = timelines.get_bounds()
+def write_binary(filename, colors, timelines):
+    """! Write timelines in the binary format.
+
+    The file starts with BINARY_HEADER, followed by the columns of every
+    timeline, each a little-endian array aligned on 8 bytes, and ends with a
+    JSON index holding the string table of the values, the colors, and the
+    name, length and column offsets of every timeline.
+    @param filename output file name
+    @param colors Colors
+    @param timelines sorted Timelines
+    @return none
+    """
+
+    def write_column(fh, column, dtype):
+        offset = fh.tell()
+        numpy.ascontiguousarray(column, dtype=dtype).tofile(fh)
+        fh.write(b"\0" * (-fh.tell() % 8))
+        return offset
+
+    index = {
+        "values": timelines.value_table.values,
+        "colors": dict(
+            (name, "#%02x%02x%02x" % (int(c.r * 255), int(c.g * 255), int(c.b * 255)))
+            for name, c in colors.get_all().items()
+        ),
+        "timelines": [],
+    }
+    with open(filename, "wb") as fh:
+        fh.write(BINARY_HEADER.pack(BINARY_MAGIC, 0, 0))
+        for timeline in timelines.get_all():
+            entry = {"name": timeline.name, "ranges": [], "event_str": [], "event_int": []}
+            for ranges in timeline.get_ranges():
+                entry["ranges"].append(
+                    {
+                        "name": ranges.name,
+                        "count": len(ranges),
+                        "starts": write_column(fh, ranges.starts, "<i8"),
+                        "ends": write_column(fh, ranges.ends, "<i8"),
+                        "max_ends": write_column(fh, ranges.max_ends, "<i8"),
+                        "values": write_column(fh, ranges.values, "<i4"),
+                        "value_ids": ranges.get_value_ids().tolist(),
+                    }
+                )
+            for kind, events_list in (
+                ("event_str", timeline.get_events_str()),
+                ("event_int", timeline.get_events_int()),
+            ):
+                for events in events_list:
+                    entry[kind].append(
+                        {
+                            "name": events.name,
+                            "count": len(events),
+                            "times": write_column(fh, events.times, "<i8"),
+                            "values": write_column(fh, events.values, "<i8"),
+                        }
+                    )
+            index["timelines"].append(entry)
+        index_offset = fh.tell()
+        index_data = json.dumps(index).encode()
+        fh.write(index_data)
+        fh.seek(0)
+        fh.write(BINARY_HEADER.pack(BINARY_MAGIC, index_offset, len(index_data)))
+
+
+def read_binary(filename):
+    """! Read timelines in the binary format written by write_binary().
+
+    The file is mapped in memory and the columns are NumPy views of the
+    map, so that only the pages needed by the queries of the rendered
+    window are read.
+    @param filename file name
+    @return (colors, timelines)
+    """
+    with open(filename, "rb") as fh:
+        data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, index_offset, index_length = BINARY_HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC or index_offset == 0:
+        raise ValueError("%s: not a complete binary timeline file" % filename)
+    index = json.loads(data[index_offset : index_offset + index_length].decode())
+
+    def column(offset, dtype, count):
+        return numpy.frombuffer(data, dtype=dtype, count=count, offset=offset)
+
+    colors = Colors()
+    for name, value in index["colors"].items():
+        rgb = bytes.fromhex(value[1:])
+        colors.add(name, Color(rgb[0] / 255, rgb[1] / 255, rgb[2] / 255))
+    timelines = Timelines(ValueTable(index["values"]))
+    for entry in index["timelines"]:
+        timeline = timelines.get(entry["name"])
+        for r in entry["ranges"]:
+            count = r["count"]
+            timeline.get_range(r["name"]).set_columns(
+                column(r["starts"], "<i8", count),
+                column(r["ends"], "<i8", count),
+                column(r["values"], "<i4", count),
+                column(r["max_ends"], "<i8", count),
+                numpy.array(r["value_ids"], dtype=numpy.int32),
+            )
+        for kind, get_events in (
+            ("event_str", timeline.get_event_str),
+            ("event_int", timeline.get_event_int),
+        ):
+            for e in entry[kind]:
+                count = e["count"]
+                get_events(e["name"]).set_columns(
+                    column(e["times"], "<i8", count), column(e["values"], "<i8", count)
+                )
+    return (colors, timelines)
+
+
+def create_graphic(colors, timelines):
+    """! Create the renderers of timelines
+    @param colors Colors
+    @param timelines Timelines
+    @return GraphicRenderer showing the whole timelines
+    """
+    lower_bound, upper_bound = timelines.get_bounds()
     graphic = GraphicRenderer(lower_bound, upper_bound)
     top_legend = TopLegendRenderer()
     range_values = timelines.get_all_range_values()
@@ -1804,6 +2132,72 @@ def main():
     data = TimelinesRenderer()
     data.set_timelines(timelines, colors)
     graphic.set_data(data)
+    return graphic
+
+
+def export_graphic(graphic, filename, width, height=None):
+    """! Render a graphic to a PNG or SVG file, without GTK
+    @param graphic GraphicRenderer, with its range set
+    @param filename output file name; SVG if it ends with '.svg', PNG otherwise
+    @param width image width, in pixels
+    @param height image height, in pixels, or None to fit the content
+    @return none
+    """
+    graphic.layout(width, height or 1)
+    if height is None:
+        x, y, selection_width, selection_height = graphic.get_selection_rectangle()
+        height = int(math.ceil(y + selection_height))
+        graphic.layout(width, height)
+    if filename.endswith(".svg"):
+        surface = cairo.SVGSurface(filename, width, height)
+    else:
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    graphic.draw(ctx)
+    if filename.endswith(".svg"):
+        surface.finish()
+    else:
+        surface.write_to_png(filename)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show timelines")
+    parser.add_argument("file", help="timeline file, text or binary")
+    parser.add_argument(
+        "--convert",
+        metavar="OUTPUT",
+        help="convert the timeline file to the binary format, instead of showing it",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="OUTPUT",
+        help="render to a PNG or SVG file (by extension), without GTK, instead of showing it",
+    )
+    parser.add_argument("--start", type=float, help="start of the rendered range (default: all)")
+    parser.add_argument("--end", type=float, help="end of the rendered range (default: all)")
+    parser.add_argument("--width", type=int, default=1024, help="rendered image width")
+    parser.add_argument(
+        "--height", type=int, help="rendered image height (default: fit the content)"
+    )
+    args = parser.parse_args()
+
+    colors, timelines = read_data(args.file)
+    if args.convert:
+        write_binary(args.convert, colors, timelines)
+        return
+    graphic = create_graphic(colors, timelines)
+    lower_bound, upper_bound = timelines.get_bounds()
+
+    if args.output:
+        graphic.set_range(
+            lower_bound if args.start is None else args.start,
+            upper_bound if args.end is None else args.end,
+        )
+        export_graphic(graphic, args.output, args.width, args.height)
+        return
+
+    if gtk is None:
+        sys.exit("grid.py: PyGTK is needed to show timelines; use --output to render to a file")
 
     # default range
     range_mid = (upper_bound - lower_bound) / 2
@@ -1816,4 +2210,5 @@ def main():
     main_window.run(graphic)
 
 
-main()
+if __name__ == "__main__":
+    main()